@@ -18,6 +18,8 @@ sys.path.append('/Users/ruginaileana/src')
 from exop import main as exopmain
 import scipy.stats as ss
 
+import mockdata
+
 from binary_classification_helper import find_km_clusters, plot_confusion_matrix, compute_distance
 from plotting_helpers import visualize_1d, visualize_2d, visualize_just_clustering_2d
 
@@ -107,18 +109,29 @@ def train_cnn_autoencoder(light_curves, autoencoder, patience=50, verbose = Fals
 		plt.plot(range(0, len(val_loss)),  val_loss, linewidth=2)
 		plt.savefig(rel_path + filename + '.pdf')
 
-def mock_data_compute_cfms(encoding_dim, no_filters, kernel_size, pool_size, dept, nois, numbtime, no_iterations = 5 ):
+def mock_data_common_random_numbers(numbtime, no_iterations = 5):
+	"""
+	draws the common random numbers (unit noise and unit-depth transits) of each iteration, shared by all SNR values;
+	time is in units of the cadence, so that transits span several samples and recur within the time series
+	"""
+	dictdist = {'peri': ['unif', numbtime / 4., numbtime / 2.], 'dura': ['unif', 3., 10.]}
+	return [mockdata.retr_datamockcomm(numbplan=100, numbnois=100, numbtime=numbtime, cade=1., dictdist=dictdist, seed=n) for n in range(0, no_iterations)]
+
+def mock_data_compute_cfms(encoding_dim, no_filters, kernel_size, pool_size, dept, nois, numbtime, no_iterations = 5, listdictcomm = None):
 	"""
 	no_iterations do:
-		get mock data from exop; timeseries of length numbtime
+		get mock data from exop, or from the common random numbers listdictcomm if given; timeseries of length numbtime
 		reduce its dimensionality
 		apply kmeans 
 		look at confusion matrix
 	return mean and standard deviation of confusion matrix
 	"""
 	autoencoder_cfms = []
-	for _ in range(0, no_iterations):
-		light_curves, labels, _ = exopmain.retr_datamock(numbplan=100, numbnois=100, numbtime = numbtime, dept = dept, nois = nois)
+	for n in range(0, no_iterations):
+		if listdictcomm is None:
+			light_curves, labels, _ = exopmain.retr_datamock(numbplan=100, numbnois=100, numbtime = numbtime, dept = dept, nois = nois)
+		else:
+			_, light_curves, labels, _ = mockdata.retr_datamockgrid(listdictcomm[n], dept, nois)
 		nrow, ncol = light_curves.shape
 		light_curves = np.reshape(light_curves, (nrow, ncol, 1))
 
@@ -143,13 +156,17 @@ def mock_data_snr_plots(dept_range, nois_range, encoding_dim = 2, no_filters = 4
 	tn_res_arr = [];  fp_res_arr = [];  fn_res_arr = [];  tp_res_arr = []; 
 	tn_std_arr = [];  fp_std_arr = [];  fn_std_arr = [];  tp_std_arr = []; 
 
+	#draw the noise and transits once, and scale them for each SNR value
+	listdictcomm = mock_data_common_random_numbers(numbtime)
+
 	#print architecture to file
 	_, _, filename = model_cnn_autoencoder(ncol = numbtime, no_filters = no_filters, kernel_size = kernel_size, pool_size = pool_size, 
 		encoding_dim = encoding_dim, activation_function = 'relu', verbose = True, rel_path = rel_path)
 
 	for i in range(0, len(dept_range)):
 		dept = dept_range[i]; nois = nois_range[i];
-		autoencoder_result, autoencoder_std = mock_data_compute_cfms(encoding_dim, no_filters, kernel_size, pool_size, dept, nois, numbtime)
+		autoencoder_result, autoencoder_std = mock_data_compute_cfms(encoding_dim, no_filters, kernel_size, pool_size, dept, nois, numbtime, \
+			listdictcomm = listdictcomm)
 		print ('done with one SNR value')
 		tn_res, fp_res, fn_res, tp_res = autoencoder_result.ravel()
 		tn_std, fp_std, fn_std, tp_std = autoencoder_std.ravel()
@@ -0,0 +1,84 @@
+import sys
+
+import numpy as np
+
+from predlog import retr_auc
+
+import flbn
+import modlspec
+import modlnump
+import distmodl
+import prunmodl
+
+
+"""
+Benchmark of the variants of the global branch of exonet (see modlspec.retr_listlayrglob)
+
+The global branch of exonet runs ten convolutions over the 2000 bins of the global view and dominates the cost of the model. Each
+variant replaces it by a cheaper branch with the same input:
+    sepa: depthwise-separable convolutions
+    dilt: a single dilated convolution per stage, with the receptive field of the two original convolutions
+    stde: a first stage replaced by a single convolution with a stride of 4
+Each variant is trained on the same training data samples as the original and its number of parameters, FLOPs per sample,
+throughput and area under the ROC curve on the test data samples are reported. The benchmark is meant to be run once on the
+mock data set and once on the TESS data set, whose views are exported by expoflbn.
+"""
+
+
+# variants of the global branch, the first of which is the reference
+liststrgvaridefa = ['orig', 'sepa', 'dilt', 'stde']
+
+
+def retr_repovari(strgvari, inpttran, labltran, inpttest, labltest, numbepoc=10, numbdatabtch=64, seed=0):
+    """
+    Trains exonet with a variant of the global branch and returns its cost and accuracy report on the test data samples
+    """
+
+    spec = modlspec.retr_specexonet(inpttran[0].shape[1], inpttran[1].shape[1], strgvariglob=strgvari)
+    modl = modlspec.retr_modl(spec, seed=seed)
+
+    modl.fit(inpttran, labltran, epochs=numbepoc, batch_size=numbdatabtch, verbose=1)
+
+    repo = {'strg': strgvari}
+    repo['numbpara'] = int(modl.count_params())
+    repo['flop'] = prunmodl.retr_flop(modlnump.retr_grapmodl(modl), inpttest)
+    repo['late'] = distmodl.retr_late(lambda inpt: modl.predict(inpt, batch_size=modlnump.numbdatablok), inpttest)
+    repo['auc'] = retr_auc(modl.predict(inpttest).flatten(), labltest)[0]
+
+    return repo
+
+
+def prnt_repovari(listrepo):
+    """
+    Prints the reports of the variants, with the speedup relative to the first variant
+    """
+
+    print('%8s %12s %12s %18s %8s %8s' % ('Variant', 'Parameters', 'FLOPs', 'Throughput [1/s]', 'Speedup', 'AUC'))
+    for repo in listrepo:
+        print('%8s %12d %12.4g %18.4g %8.3g %8.4g' % (repo['strg'], repo['numbpara'], repo['flop'], 1e6 / repo['late'], \
+                                                                                listrepo[0]['late'] / repo['late'], repo['auc']))
+
+
+def main(pathdata, numbepoc=10, fractest=flbn.fractestdefa, strgvari=None):
+    """
+    Benchmarks the variants of the global branch
+
+    pathdata: .npz file of the views and labels of the data samples, the first fractest of which are used as the test data samples
+              (see flbn.read_view)
+    strgvari: comma-separated variants to benchmark, defaulting to all of them
+    """
+
+    liststrgvari = liststrgvaridefa if strgvari is None else strgvari.split(',')
+
+    inpttest, labltest, inpttran, labltran = flbn.read_view(pathdata, fractest=fractest)
+
+    listrepo = []
+    for strgvari in liststrgvari:
+        listrepo.append(retr_repovari(strgvari, inpttran, labltran, inpttest, labltest, numbepoc=int(numbepoc)))
+    prnt_repovari(listrepo)
+
+    return listrepo
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:5])
@@ -0,0 +1,259 @@
+import os, json, re
+import multiprocessing
+
+import numpy as np
+
+from keras.models import model_from_json, load_model
+from keras.callbacks import Callback
+from keras import optimizers
+
+import modlspec
+import modlnump
+from checweig import strgarch, strgbase, strgindx, numbbestdefa, numbpernddefa, numblastdefa, retr_hash, read_indx, writ_indx, \
+                            read_npzf, retr_delt, writ_weig, retr_epoclast, read_weig, retr_indxkeep, prun_stor, conv_weig, retr_listpathstor, \
+                            compact_weig
+
+
+"""
+Checkpoint store with retention policies
+
+Instead of writing a full HDF5 model at every epoch, the architecture and the compile arguments of the model are written once to
+base files in the folder of the run, and each epoch only writes the weights. The weights of the first checkpoint are the base
+weights of the run, and the weights of every checkpoint are stored as the compressed bitwise XOR of their float32 values with the
+base weights. Since the weights change little from one epoch to the next, most high bits of the XOR are zero, such that the deltas
+compress well and the weights are reconstructed exactly. Weight files are named by the hash of the weights, so that identical
+weights (e.g., when training has stalled or the layers are frozen) are stored only once. After each epoch, the retention policy
+deletes the checkpoints that are no longer needed.
+
+Layout of the folder of a run:
+    arch.json         -- architecture of the model (base file)
+    comp.json         -- arguments of compile (base file)
+    base.npz          -- base weights
+    indx.json         -- list of retained checkpoints, each with epoch index, monitored value and weight hash
+    delt_<hash>.npz   -- weights of a checkpoint, as the XOR with the base weights
+    weig_<hash>.npz   -- full weights of a checkpoint written by earlier versions, converted to deltas by compact_stor
+"""
+
+
+# name of the file of the compile arguments in the folder of a run
+strgcomp = 'comp.json'
+
+
+def writ_arch(pathstor, modl):
+
+    patharch = pathstor + strgarch
+    if not os.path.exists(patharch):
+        print('Writing to %s...' % patharch)
+        with open(patharch, 'w') as objtfile:
+            objtfile.write(modl.to_json())
+
+
+def retr_strgfunc(func):
+
+    if isinstance(func, str):
+        return func
+
+    return func.__name__
+
+
+def retr_dictcomp(modl):
+    """
+    Returns the arguments of compile of a compiled model
+    """
+
+    dictcomp = {}
+    dictcomp['loss'] = retr_strgfunc(modl.loss)
+    dictcomp['optimizer'] = optimizers.serialize(modl.optimizer)
+    dictcomp['metrics'] = [retr_strgfunc(metr) for metr in modl.metrics]
+
+    return dictcomp
+
+
+def writ_comp(pathstor, modl):
+
+    pathcomp = pathstor + strgcomp
+    if not os.path.exists(pathcomp) and getattr(modl, 'optimizer', None) is not None:
+        print('Writing to %s...' % pathcomp)
+        with open(pathcomp, 'w') as objtfile:
+            json.dump(retr_dictcomp(modl), objtfile, indent=1)
+
+
+def read_comp(pathstor):
+    """
+    Returns the arguments of compile of a run, defaulting to those of modlspec for runs written by earlier versions
+    """
+
+    pathcomp = pathstor + strgcomp
+    if not os.path.exists(pathcomp):
+        return modlspec.dictcompdefa
+
+    with open(pathcomp, 'r') as objtfile:
+        dictcomp = json.load(objtfile)
+
+    return dictcomp
+
+
+def writ_chec(pathstor, modl, epoc, valu=None, listweig=None):
+    """
+    Adds the weights of an epoch to the store, skipping the write if identical weights are already stored
+    """
+
+    os.system('mkdir -p %s' % pathstor)
+    writ_arch(pathstor, modl)
+    writ_comp(pathstor, modl)
+
+    if listweig is None:
+        listweig = modl.get_weights()
+
+    hashweig = retr_hash(listweig)
+    if not os.path.exists(pathstor + 'delt_%s.npz' % hashweig) and not os.path.exists(pathstor + 'weig_%s.npz' % hashweig):
+        writ_weig(pathstor, listweig, hashweig)
+
+    if valu is not None and not np.isfinite(valu):
+        valu = None
+
+    listchec = [chec for chec in read_indx(pathstor) if chec['epoc'] != epoc]
+    listchec.append({'epoc': int(epoc), 'valu': valu, 'hash': hashweig})
+    listchec.sort(key=lambda chec: chec['epoc'])
+    writ_indx(pathstor, listchec)
+
+
+def retr_epocbest(pathstor, strgmode='max'):
+    """
+    Returns the index of the stored epoch with the best monitored value, or None if no value was monitored
+    """
+
+    listchec = [chec for chec in read_indx(pathstor) if chec['valu'] is not None]
+    if len(listchec) == 0:
+        return None
+
+    if strgmode == 'max':
+        chec = max(listchec, key=lambda chec: chec['valu'])
+    else:
+        chec = min(listchec, key=lambda chec: chec['valu'])
+
+    return chec['epoc']
+
+
+def load_chec(pathstor, epoc=None, modl=None):
+    """
+    Loads a checkpoint from the store
+
+    epoc: epoch index to load, defaults to the latest
+    modl: model whose weights will be set; if None, the model is rebuilt from the base architecture file and compiled with the
+          arguments of compile of the run
+    """
+
+    if epoc is None:
+        epoc = retr_epoclast(pathstor)
+
+    if modl is None:
+        with open(pathstor + strgarch, 'r') as objtfile:
+            modl = model_from_json(objtfile.read())
+        modl.compile(**read_comp(pathstor))
+
+    modl.set_weights(read_weig(pathstor, epoc))
+
+    return modl
+
+
+class callchecstor(Callback):
+    """
+    Keras callback that writes a checkpoint to the store at the end of each epoch and applies the retention policy
+    """
+
+    def __init__(self, pathstor, monitor='val_acc', strgmode='max', numbbest=numbbestdefa, numbpernd=numbpernddefa, numblast=numblastdefa):
+
+        super(callchecstor, self).__init__()
+
+        self.pathstor = pathstor
+        self.monitor = monitor
+        self.strgmode = strgmode
+        self.numbbest = numbbest
+        self.numbpernd = numbpernd
+        self.numblast = numblast
+
+    def on_epoch_end(self, epoch, logs=None):
+
+        valu = None
+        if logs is not None and self.monitor in logs:
+            valu = float(logs[self.monitor])
+
+        writ_chec(self.pathstor, self.model, epoch, valu=valu)
+        prun_stor(self.pathstor, numbbest=self.numbbest, numbpernd=self.numbpernd, numblast=self.numblast, strgmode=self.strgmode)
+
+
+def conv_h5fl(pathstor):
+    """
+    Converts the full HDF5 models in the folder of a run (as written by ModelCheckpoint with file names containing the
+    1-based epoch number) into weight-only checkpoints in the store and deletes them
+    """
+
+    regx = re.compile(r'(\d+)\.h5$')
+    for strgfile in sorted(os.listdir(pathstor)):
+        objtmtch = regx.search(strgfile)
+        if objtmtch is None:
+            continue
+        pathfile = pathstor + strgfile
+        print('Converting %s...' % pathfile)
+        modl = load_model(pathfile)
+        writ_chec(pathstor, modl, int(objtmtch.group(1)) - 1)
+        os.remove(pathfile)
+
+
+def conv_h5flbase(pathbase):
+    """
+    Converts the legacy HDF5 models of all runs found in the subfolders of pathbase
+    """
+
+    for pathstor in retr_listpathstor(pathbase):
+        conv_h5fl(pathstor)
+
+
+def compact_stor(pathbase, numbbest=numbbestdefa, numbpernd=numbpernddefa, numblast=numblastdefa, strgmode='max'):
+    """
+    Compacts all runs found in the subfolders of pathbase by converting legacy HDF5 models and full weight files and applying the
+    retention policy
+    """
+
+    conv_h5flbase(pathbase)
+    compact_weig(pathbase, numbbest=numbbest, numbpernd=numbpernd, numblast=numblast, strgmode=strgmode)
+
+
+def compact_stor_back(pathbase, **dictargs):
+    """
+    Runs compact_stor with its NumPy part in a background process and returns the process
+
+    The legacy HDF5 models are converted in the calling process, since they are read with Keras, which is not safe to use in a
+    process forked after Keras and TensorFlow have been initialized. The background process only handles the weight files (see
+    checweig.compact_weig) and is started as a new interpreter rather than forked.
+    """
+
+    conv_h5flbase(pathbase)
+
+    objtproc = multiprocessing.get_context('spawn').Process(target=compact_weig, args=(pathbase, ), kwargs=dictargs)
+    objtproc.start()
+
+    return objtproc
+
+
+def chec_stor(modl, inpt, pathstor, tole=1e-4):
+    """
+    Checks that the checkpoints of a model written to the store pathstor, at the base weights and as a delta, are read back by the
+    NumPy forward pass of modlnump with the outputs of the model
+    """
+
+    listweig = modl.get_weights()
+    listweigpert = [weig + 1e-3 * np.random.default_rng(k).standard_normal(weig.shape).astype(weig.dtype) for k, weig in enumerate(listweig)]
+
+    for epoc, listweigthis in enumerate([listweig, listweigpert]):
+        modl.set_weights(listweigthis)
+        writ_chec(pathstor, modl, epoc)
+        outpkera = modl.predict(inpt)
+        outpnump = modlnump.pred_grap(modlnump.read_grap(pathstor, epoc=epoc), inpt)
+        diffmaxm = np.max(np.abs(outpnump - outpkera))
+        print('Epoch %d: maximum difference of the stored checkpoint from Keras: %g' % (epoc, diffmaxm))
+        if diffmaxm > tole:
+            raise Exception('The checkpoint of epoch %d read from the store differs from the model by %g.' % (epoc, diffmaxm))
+
+    modl.set_weights(listweig)
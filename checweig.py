@@ -0,0 +1,197 @@
+import os, json, hashlib
+
+import numpy as np
+
+
+"""
+NumPy-only reading and writing of the weights of a checkpoint store (see checstor for its layout) and its retention policy, such that
+the store can be read without importing Keras, e.g., by the NumPy forward pass of modlnump, and compacted in a background process
+"""
+
+
+# names of the files in the folder of a run
+strgarch = 'arch.json'
+strgbase = 'base.npz'
+strgindx = 'indx.json'
+
+# default retention policy
+## number of checkpoints with the best monitored values to keep
+numbbestdefa = 3
+## keep every n-th epoch
+numbpernddefa = 10
+## number of latest checkpoints to keep
+numblastdefa = 1
+
+
+def retr_hash(listweig):
+
+    objthash = hashlib.sha1()
+    for weig in listweig:
+        objthash.update(str(weig.shape).encode())
+        objthash.update(np.ascontiguousarray(weig, dtype=np.float32).tobytes())
+
+    return objthash.hexdigest()[:16]
+
+
+def read_indx(pathstor):
+
+    pathindx = pathstor + strgindx
+    if not os.path.exists(pathindx):
+        return []
+
+    with open(pathindx, 'r') as objtfile:
+        listchec = json.load(objtfile)
+
+    return listchec
+
+
+def writ_indx(pathstor, listchec):
+
+    # write to a temporary file first so that an interrupted run does not corrupt the index
+    pathindx = pathstor + strgindx
+    with open(pathindx + '.temp', 'w') as objtfile:
+        json.dump(listchec, objtfile, indent=1)
+    os.replace(pathindx + '.temp', pathindx)
+
+
+def read_npzf(path):
+
+    objtfile = np.load(path)
+
+    return [objtfile['arr_%d' % k] for k in range(len(objtfile.files))]
+
+
+def retr_delt(listweig, listweigbase):
+    """
+    Returns the bitwise XOR of the float32 values of weights with the base weights, which is its own inverse
+    """
+
+    return [np.bitwise_xor(np.ascontiguousarray(weig, dtype=np.float32).view(np.uint32), weigbase.view(np.uint32)).view(np.float32) \
+                                                                                    for weig, weigbase in zip(listweig, listweigbase)]
+
+
+def writ_weig(pathstor, listweig, hashweig):
+    """
+    Writes the weights of a checkpoint as the XOR with the base weights of the run, writing the base weights first if the run
+    has none
+    """
+
+    pathbase = pathstor + strgbase
+    if not os.path.exists(pathbase):
+        np.savez(pathbase, *[np.asarray(weig, dtype=np.float32) for weig in listweig])
+    listweigbase = read_npzf(pathbase)
+
+    if [weigbase.shape for weigbase in listweigbase] != [np.shape(weig) for weig in listweig]:
+        raise Exception('The shapes of the weights differ from those of the base weights of the checkpoint store %s.' % pathstor)
+
+    np.savez_compressed(pathstor + 'delt_%s.npz' % hashweig, *retr_delt(listweig, listweigbase))
+
+
+def retr_epoclast(pathstor):
+    """
+    Returns the index of the latest stored epoch, or None if the store is empty
+    """
+
+    listchec = read_indx(pathstor)
+    if len(listchec) == 0:
+        return None
+
+    return max(chec['epoc'] for chec in listchec)
+
+
+def read_weig(pathstor, epoc):
+
+    for chec in read_indx(pathstor):
+        if chec['epoc'] == epoc:
+            pathweig = pathstor + 'weig_%s.npz' % chec['hash']
+            if os.path.exists(pathweig):
+                return read_npzf(pathweig)
+            return retr_delt(read_npzf(pathstor + 'delt_%s.npz' % chec['hash']), read_npzf(pathstor + strgbase))
+
+    raise Exception('Epoch %d is not in the checkpoint store %s.' % (epoc, pathstor))
+
+
+def retr_indxkeep(listepoc, listvalu, numbbest=numbbestdefa, numbpernd=numbpernddefa, numblast=numblastdefa, strgmode='max'):
+    """
+    Returns the indices of the checkpoints to keep under the retention policy
+
+    listvalu: monitored values, where None or NaN are never considered among the best
+    strgmode: 'max' or 'min', indicating whether larger or smaller monitored values are better
+    """
+
+    listepoc = np.asarray(listepoc)
+    numbchec = listepoc.size
+    boolkeep = np.zeros(numbchec, dtype=bool)
+
+    # latest
+    if numblast > 0:
+        boolkeep[np.argsort(listepoc)[-numblast:]] = True
+
+    # every n-th
+    if numbpernd > 0:
+        boolkeep[(listepoc + 1) % numbpernd == 0] = True
+
+    # best
+    if numbbest > 0:
+        listvalu = np.array([np.nan if valu is None else valu for valu in listvalu], dtype=float)
+        indxgood = np.where(np.isfinite(listvalu))[0]
+        if strgmode == 'max':
+            indxsort = indxgood[np.argsort(-listvalu[indxgood], kind='stable')]
+        else:
+            indxsort = indxgood[np.argsort(listvalu[indxgood], kind='stable')]
+        boolkeep[indxsort[:numbbest]] = True
+
+    return np.where(boolkeep)[0]
+
+
+def prun_stor(pathstor, numbbest=numbbestdefa, numbpernd=numbpernddefa, numblast=numblastdefa, strgmode='max'):
+    """
+    Applies the retention policy to a run, deleting the weight files that are no longer referenced
+    """
+
+    listchec = read_indx(pathstor)
+    if len(listchec) == 0:
+        return
+
+    indxkeep = retr_indxkeep([chec['epoc'] for chec in listchec], [chec['valu'] for chec in listchec], numbbest=numbbest, \
+                                                                    numbpernd=numbpernd, numblast=numblast, strgmode=strgmode)
+    listchec = [listchec[k] for k in indxkeep]
+    writ_indx(pathstor, listchec)
+
+    sethhash = set(chec['hash'] for chec in listchec)
+    for strgfile in os.listdir(pathstor):
+        if (strgfile.startswith('weig_') or strgfile.startswith('delt_')) and strgfile[5:-4] not in sethhash:
+            os.remove(pathstor + strgfile)
+
+
+def conv_weig(pathstor):
+    """
+    Converts the full weight files in the folder of a run, as written by earlier versions, into deltas against the base weights
+    """
+
+    for strgfile in sorted(os.listdir(pathstor)):
+        if not strgfile.startswith('weig_'):
+            continue
+        pathweig = pathstor + strgfile
+        print('Converting %s...' % pathweig)
+        writ_weig(pathstor, read_npzf(pathweig), strgfile[5:-4])
+        os.remove(pathweig)
+
+
+def retr_listpathstor(pathbase):
+    """
+    Returns the paths of the runs found in the subfolders of pathbase
+    """
+
+    return [pathbase + strgrun + '/' for strgrun in sorted(os.listdir(pathbase)) if os.path.isdir(pathbase + strgrun)]
+
+
+def compact_weig(pathbase, numbbest=numbbestdefa, numbpernd=numbpernddefa, numblast=numblastdefa, strgmode='max'):
+    """
+    Compacts the weight files of all runs found in the subfolders of pathbase by applying the retention policy and converting the
+    full weight files into deltas
+    """
+
+    for pathstor in retr_listpathstor(pathbase):
+        prun_stor(pathstor, numbbest=numbbest, numbpernd=numbpernd, numblast=numblast, strgmode=strgmode)
+        conv_weig(pathstor)
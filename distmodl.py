@@ -0,0 +1,171 @@
+import os, sys, time
+
+import numpy as np
+
+from checstor import callchecstor, load_chec
+from predlog import retr_auc, retr_matrconf, retr_metrmatrconf
+
+import mani
+import flbn
+import modlspec
+import modlnump
+
+
+"""
+Knowledge distillation of a trained teacher (e.g., exonet) into a smaller student (e.g., reduced or any model specification of modlspec)
+
+The student is trained on targets that blend the labels with the scores of the teacher, softened by a temperature. The scores of
+the teacher are evaluated once by the NumPy forward pass (see modlnump) from its checkpoint store and cached on the disk, keyed
+by the hash of the weights of the teacher and of the inputs, so that the teacher is never run during the training of the students.
+
+Since the models end in a sigmoid, the soft target of a sample is sigmoid(logit / temp), where logit is the logit of the score of the
+teacher, and the student is trained with the binary cross-entropy on
+    fracsoft * soft target + (1 - fracsoft) * label.
+
+After the training, the area under the ROC curve, the accuracy, the number of parameters and the scoring latency of the teacher and
+the student are reported, so that a student several times faster at a negligible loss of accuracy can be chosen.
+"""
+
+
+# default temperature softening the scores of the teacher
+tempdefa = 2.
+
+# default weight of the soft targets
+fracsoftdefa = 0.5
+
+# clip of the scores of the teacher before their logits are taken
+clipscor = 1e-6
+
+
+def retr_scorteac(pathchecteac, inpt, pathcach, epoc=None):
+    """
+    Returns the scores of the teacher of the checkpoint store pathchecteac for the inputs inpt, reading them from the cache pathcach
+    if they have already been evaluated
+    """
+
+    grap = modlnump.read_grap(pathchecteac, epoc=epoc)
+
+    hashinpt = mani.retr_hasharry(list(inpt) + [np.array(grap['hashweig'])])
+    pathscor = pathcach + 'scorteac_%s.npy' % hashinpt
+    if os.path.exists(pathscor):
+        print('Reading from %s...' % pathscor)
+        return np.load(pathscor)
+
+    scor = modlnump.pred_grap(grap, inpt).flatten()
+
+    os.system('mkdir -p %s' % pathcach)
+    print('Writing to %s...' % pathscor)
+    np.save(pathscor, scor)
+
+    return scor
+
+
+def retr_targsoft(scorteac, labl, temp=tempdefa, fracsoft=fracsoftdefa):
+    """
+    Returns the training targets of the student, blending the labels with the scores of the teacher softened by the temperature
+    """
+
+    scorteac = np.clip(scorteac, clipscor, 1. - clipscor)
+    logt = np.log(scorteac) - np.log1p(-scorteac)
+    scorsoft = 1. / (1. + np.exp(-logt / temp))
+
+    return fracsoft * scorsoft + (1. - fracsoft) * np.asarray(labl).flatten()
+
+
+def trai_dist(spec, inpttran, labltran, scorteactran, numbepoc=10, numbdatabtch=64, temp=tempdefa, fracsoft=fracsoftdefa, \
+                                                                                                seed=None, pathchec=None):
+    """
+    Trains the student of the specification spec on the soft targets of the teacher
+
+    pathchec: if given, the checkpoints of the student are written to this checkpoint store
+
+    Returns the trained student.
+    """
+
+    modl = modlspec.retr_modl(spec, seed=seed)
+
+    targ = retr_targsoft(scorteactran, labltran, temp=temp, fracsoft=fracsoft)
+
+    listcall = []
+    if pathchec is not None:
+        listcall.append(callchecstor(pathchec, monitor='loss', strgmode='min'))
+
+    modl.fit(inpttran, targ, epochs=numbepoc, batch_size=numbdatabtch, verbose=1, callbacks=listcall)
+
+    return modl
+
+
+def retr_late(func, inpt, numbiter=3):
+    """
+    Returns the scoring latency of a model [ms per 1000 samples], as the fastest of numbiter runs
+    """
+
+    listtime = []
+    for k in range(numbiter):
+        timeinit = time.time()
+        func(inpt)
+        listtime.append(time.time() - timeinit)
+
+    return 1e6 * min(listtime) / len(inpt[0])
+
+
+def retr_repo(strgmodl, modl, inpttest, labltest):
+    """
+    Returns the accuracy and latency report of a model on the test data samples
+    """
+
+    grap = modlnump.retr_grapmodl(modl)
+
+    repo = {'strg': strgmodl}
+    scor = modlnump.pred_grap(grap, inpttest).flatten()
+    repo['auc'] = retr_auc(scor, labltest)[0]
+    repo['accu'] = retr_metrmatrconf(retr_matrconf(scor, labltest, [0.5]))[0, 0, 1]
+    repo['numbpara'] = int(modl.count_params())
+    repo['latekera'] = retr_late(lambda inpt: modl.predict(inpt, batch_size=modlnump.numbdatablok), inpttest)
+    repo['latenump'] = retr_late(lambda inpt: modlnump.pred_grap(grap, inpt), inpttest)
+
+    return repo
+
+
+def prnt_repo(listrepo):
+    """
+    Prints the accuracy and latency reports of the models, with the speedup relative to the first model
+    """
+
+    print('%20s %8s %8s %10s %14s %14s %8s' % ('Model', 'AUC', 'Accuracy', 'Parameters', 'Keras [ms/1k]', 'NumPy [ms/1k]', 'Speedup'))
+    for repo in listrepo:
+        print('%20s %8.4g %8.4g %10d %14.4g %14.4g %8.3g' % (repo['strg'], repo['auc'], repo['accu'], repo['numbpara'], \
+                                                    repo['latekera'], repo['latenump'], listrepo[0]['latekera'] / repo['latekera']))
+
+
+def main(pathchecteac, pathdata, pathcach=None, strgspec='reduced', numbepoc=10, temp=tempdefa, fracsoft=fracsoftdefa, fractest=flbn.fractestdefa):
+    """
+    Distills the teacher of the checkpoint store pathchecteac into a student and reports their accuracies and latencies
+
+    pathdata: .npz file of the views and labels of the data samples, the first fractest of which are used as the test data samples
+              (see flbn.read_view)
+    strgspec: name of the specification of the student in modlspec, e.g., 'reduced'
+    """
+
+    if pathcach is None:
+        pathcach = pathchecteac + 'cach/'
+
+    inpttest, labltest, inpttran, labltran = flbn.read_view(pathdata, fractest=fractest)
+
+    scorteactran = retr_scorteac(pathchecteac, inpttran, pathcach)
+
+    spec = getattr(modlspec, 'retr_spec' + strgspec)(inpttran[0].shape[1], inpttran[1].shape[1])
+    modlstud = trai_dist(spec, inpttran, labltran, scorteactran, numbepoc=int(numbepoc), temp=float(temp), fracsoft=float(fracsoft), \
+                                                                                                pathchec=pathchecteac + 'stud%s/' % strgspec)
+
+    # the teacher is loaded into Keras only for its report
+    modlteac = load_chec(pathchecteac)
+
+    listrepo = [retr_repo('teacher', modlteac, inpttest, labltest), retr_repo('student (%s)' % strgspec, modlstud, inpttest, labltest)]
+    prnt_repo(listrepo)
+
+    return listrepo
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:4])
@@ -0,0 +1,274 @@
+import numpy as np
+
+
+"""
+Detection of exact and near duplicate light curves from their folded and binned views
+
+The same target can appear in several sectors and in several data sets (e.g., mock and injected), and its duplicate views should
+neither inflate the training set nor leak between the test and training slices. Each view is standardized and reduced to a 64-bit
+signature whose bits are the signs of random projections (SimHash), such that views with a high correlation differ in few bits.
+The signatures are split into bands, and for each band the views are sorted by their signature rotated to start at the band, such
+that the views of a bucket (with the same band) are adjacent and ordered by the remaining bits. Only the nearest neighbors in this
+order are compared by the correlation of their views, so that the cost is near-linear in the number of views. Views with identical
+values are found by sorting their bytes.
+
+The duplicates are grouped without chaining: a view joins the group of a view only if the two views are duplicates of each other,
+such that a group is the set of direct duplicates of its first view. Grouping by connected components instead would chain views
+that are similar to their neighbors, e.g., the noise-free transits of a mock data set, into a single group of a whole class.
+Groups larger than a fraction of the test slice are not kept on one side of the split, since moving them whole into the test slice
+would deplete the training slice of their class.
+"""
+
+
+# number of bits of the signatures
+numbbitssign = 64
+
+# number of bands of the signatures, each band defining the buckets of one sort
+numbbanddefa = 8
+
+# number of following neighbors in the sort of a band to which each view is compared
+numbwinddefa = 2
+
+# minimum correlation of two views to be near duplicates
+thrscorrdefa = 0.95
+
+# number of pairs of views whose correlation is evaluated at once
+numbpairblok = 1 << 14
+
+# maximum size of a group of duplicates kept on one side of the split, as a fraction of the test slice
+fracgrupmaxmdefa = 0.1
+
+
+def retr_inptstdd(inpt):
+    """
+    Returns the views standardized to zero mean and unit norm, with non-finite bins set to zero, such that the correlation of two
+    views is the dot product of their standardized views
+    """
+
+    inpt = np.asarray(inpt, dtype=np.float32).reshape((len(inpt), -1))
+    boolfini = np.isfinite(inpt)
+    numbfini = np.maximum(np.sum(boolfini, 1), 1)
+
+    inptstdd = np.where(boolfini, inpt, 0.)
+    inptstdd -= (np.sum(inptstdd, 1) / numbfini)[:, None]
+    inptstdd[~boolfini] = 0.
+    norm = np.sqrt(np.sum(inptstdd**2, 1))
+    norm[norm == 0.] = 1.
+    inptstdd /= norm[:, None]
+
+    return inptstdd
+
+
+def retr_sign(inptstdd, seed=0):
+    """
+    Returns the 64-bit signatures of the standardized views, whose bits are the signs of random projections
+    """
+
+    rng = np.random.default_rng(seed)
+    matrproj = rng.standard_normal((inptstdd.shape[1], numbbitssign)).astype(np.float32)
+
+    boolbits = (inptstdd @ matrproj) > 0.
+
+    return np.packbits(boolbits, axis=1, bitorder='big').view('>u8').flatten().astype(np.uint64)
+
+
+def retr_corrpair(inptstdd, indxfrst, indxseco):
+    """
+    Returns the correlations of the pairs of views indxfrst and indxseco, evaluated in blocks
+    """
+
+    corr = np.empty(indxfrst.size, dtype=np.float32)
+    for indxinit in range(0, indxfrst.size, numbpairblok):
+        indxfinl = indxinit + numbpairblok
+        corr[indxinit:indxfinl] = np.einsum('ij,ij->i', inptstdd[indxfrst[indxinit:indxfinl]], inptstdd[indxseco[indxinit:indxfinl]])
+
+    return corr
+
+
+def retr_indxgrup(numbdata, indxfrst, indxseco):
+    """
+    Returns the group of each sample, i.e., the index of the first sample of its group, from the pairs of duplicates indxfrst,
+    indxseco
+
+    In the order of the samples, a sample joins the group of the first of its preceding duplicates that leads a group, and leads a
+    new group otherwise, such that all samples of a group are direct duplicates of its first sample. The order is resolved in rounds,
+    each of which settles the samples whose preceding duplicates are all settled.
+    """
+
+    indxgrup = np.arange(numbdata)
+    if indxfrst.size == 0:
+        return indxgrup
+
+    # pairs ordered such that the preceding sample comes first
+    indxprec = np.minimum(indxfrst, indxseco)
+    indxfolw = np.maximum(indxfrst, indxseco)
+    boolgood = indxprec != indxfolw
+    indxprec = indxprec[boolgood]
+    indxfolw = indxfolw[boolgood]
+
+    # 0: unsettled, 1: leads a group, 2: member of a group
+    stat = np.zeros(numbdata, dtype=int)
+    while True:
+        boolunst = stat == 0
+        if not boolunst.any():
+            break
+
+        # unsettled samples with a preceding duplicate that leads a group join the first such group
+        boolpair = boolunst[indxfolw] & (stat[indxprec] == 1)
+        indxgrupmini = np.full(numbdata, numbdata)
+        np.minimum.at(indxgrupmini, indxfolw[boolpair], indxprec[boolpair])
+        booljoin = boolunst & (indxgrupmini < numbdata)
+        indxgrup[booljoin] = indxgrupmini[booljoin]
+        stat[booljoin] = 2
+
+        # unsettled samples whose preceding duplicates are all settled members lead a new group
+        numbprecunst = np.bincount(indxfolw[stat[indxprec] != 2], minlength=numbdata)
+        stat[(stat == 0) & (numbprecunst == 0)] = 1
+
+    return indxgrup
+
+
+def retr_dupl(inpt, thrscorr=thrscorrdefa, numbband=numbbanddefa, numbwind=numbwinddefa, seed=0):
+    """
+    Finds the exact and near duplicates among the views inpt
+
+    inpt: (numbdata, numbbins) folded and binned views
+    thrscorr: minimum correlation of two views to be near duplicates
+
+    Returns the group of each view (the smallest index of the views it duplicates, or its own index) and the Boolean flags of the
+    views that are exact duplicates of another view.
+    """
+
+    inpt = np.asarray(inpt)
+    numbdata = len(inpt)
+
+    listindxfrst = []
+    listindxseco = []
+
+    # exact duplicates, from the sort of the bytes of the views
+    inptcont = np.ascontiguousarray(inpt.reshape((numbdata, -1)))
+    inptvoid = inptcont.view(np.dtype((np.void, inptcont.dtype.itemsize * inptcont.shape[1]))).flatten()
+    temp, indxuniq, indxinve = np.unique(inptvoid, return_index=True, return_inverse=True)
+    indxinve = indxinve.flatten()
+    booldupl = indxuniq[indxinve] != np.arange(numbdata)
+    listindxfrst.append(np.where(booldupl)[0])
+    listindxseco.append(indxuniq[indxinve][booldupl])
+
+    # near duplicates, from the buckets of the bands of the signatures
+    inptstdd = retr_inptstdd(inpt)
+    sign = retr_sign(inptstdd, seed=seed)
+    numbbitsband = numbbitssign // numbband
+    for b in range(numbband):
+        # rotate the signature such that the band leads
+        numbbitsrota = np.uint64(b * numbbitsband)
+        if b == 0:
+            signrota = sign
+        else:
+            signrota = (sign << numbbitsrota) | (sign >> (np.uint64(numbbitssign) - numbbitsrota))
+        indxsort = np.argsort(signrota, kind='stable')
+        bandsort = signrota[indxsort] >> np.uint64(numbbitssign - numbbitsband)
+        for n in range(1, numbwind + 1):
+            boolbuck = bandsort[n:] == bandsort[:-n]
+            listindxfrst.append(indxsort[n:][boolbuck])
+            listindxseco.append(indxsort[:-n][boolbuck])
+
+    indxfrst = np.concatenate(listindxfrst)
+    indxseco = np.concatenate(listindxseco)
+
+    # keep the exact duplicates and the candidate pairs with a high correlation
+    numbexac = listindxfrst[0].size
+    boolnear = np.ones(indxfrst.size, dtype=bool)
+    boolnear[numbexac:] = retr_corrpair(inptstdd, indxfrst[numbexac:], indxseco[numbexac:]) >= thrscorr
+    indxgrup = retr_indxgrup(numbdata, indxfrst[boolnear], indxseco[boolnear])
+
+    numbgrup = np.unique(indxgrup).size
+    print('Found %d exact duplicates and %d views in %d groups of duplicates among %d views.' % \
+                    (np.sum(booldupl), numbdata - numbgrup, np.sum(np.bincount(indxgrup, minlength=numbdata) > 1), numbdata))
+
+    return indxgrup, booldupl
+
+
+def retr_indxsplt(indxgrup, numbdatatest, fracgrupmaxm=fracgrupmaxmdefa):
+    """
+    Returns the order of the samples such that the leading test slice holds whole groups of duplicates
+
+    The groups are added to the test slice in the order of their first sample until it holds at least numbdatatest samples, so that
+    the split is unchanged if there are no duplicates. Within each slice, the samples keep their order. Groups with more than
+    fracgrupmaxm * numbdatatest samples are rejected, i.e., their samples are split as if they had no duplicates.
+
+    Returns the indices of the samples in the new order and the number of samples of the test slice.
+    """
+
+    numbdata = indxgrup.size
+    numbsampgrup = np.bincount(indxgrup, minlength=numbdata)
+    boolgruprejt = numbsampgrup > max(1, fracgrupmaxm * numbdatatest)
+    if boolgruprejt.any():
+        print('Rejecting %d groups of duplicates with %d views, which are larger than %g of the test slice.' % \
+                                                            (np.sum(boolgruprejt), np.sum(numbsampgrup[boolgruprejt]), fracgrupmaxm))
+        indxgrup = np.where(boolgruprejt[indxgrup], np.arange(numbdata), indxgrup)
+
+    numbsampgrup = np.bincount(indxgrup, minlength=numbdata)
+    numbsampcuml = np.cumsum(numbsampgrup)
+
+    # groups (indexed by their first sample) that start before the test slice is filled
+    boolgruptest = (numbsampcuml - numbsampgrup < numbdatatest) & (numbsampgrup > 0)
+    booltest = boolgruptest[indxgrup]
+
+    indxdata = np.concatenate([np.where(booltest)[0], np.where(~booltest)[0]])
+
+    return indxdata, int(np.sum(booltest))
+
+
+def chec_dupl(numbdata=10000, numbbins=200, numbdupl=500, seed=0):
+    """
+    Checks that noisy and scaled copies of views are found as duplicates of their originals and that distinct views are not
+    """
+
+    rng = np.random.default_rng(seed)
+
+    inpt = rng.standard_normal((numbdata, numbbins))
+    indxorig = rng.choice(numbdata, size=numbdupl, replace=False)
+    indxcopy = rng.choice(np.setdiff1d(np.arange(numbdata), indxorig), size=numbdupl, replace=False)
+    inpt[indxcopy[:numbdupl//2]] = inpt[indxorig[:numbdupl//2]]
+    inpt[indxcopy[numbdupl//2:]] = 2. * inpt[indxorig[numbdupl//2:]] + 1. + 0.2 * rng.standard_normal((numbdupl - numbdupl//2, numbbins))
+
+    indxgrup, booldupl = retr_dupl(inpt)
+
+    fracfind = np.mean(indxgrup[indxcopy] == indxgrup[indxorig])
+    numbgrup = np.unique(indxgrup).size
+    print('Fraction of the copies found: %g, number of groups: %d (expected %d)' % (fracfind, numbgrup, numbdata - numbdupl))
+    if fracfind < 0.99 or numbgrup < numbdata - numbdupl or np.sum(booldupl) != numbdupl // 2:
+        raise Exception('The duplicates are not found correctly.')
+
+    numbdatatest = numbdata // 10
+    indxdata, numbdatatestdupl = retr_indxsplt(indxgrup, numbdatatest)
+    booltest = np.zeros(numbdata, dtype=bool)
+    booltest[indxdata[:numbdatatestdupl]] = True
+    if np.sort(indxdata).tolist() != list(range(numbdata)) or \
+                    np.any(np.bincount(indxgrup[booltest], minlength=numbdata)[np.unique(indxgrup[~booltest])] > 0):
+        raise Exception('The split does not keep the duplicates on the same side.')
+
+
+def chec_splt(numbrele=300, numbirre=300, numbbins=200, dept=0.3, nois=1e-3, fractest=0.3, seed=0):
+    """
+    Checks that the split of a mock data set, whose transits are nearly identical views, keeps both classes in both slices
+    """
+
+    rng = np.random.default_rng(seed)
+
+    numbdata = numbrele + numbirre
+    outp = np.zeros(numbdata, dtype=int)
+    outp[:numbrele] = 1
+    outp = rng.permutation(outp)
+    inpt = 1. + nois * rng.standard_normal((numbdata, numbbins))
+    inpt[outp == 1, numbbins//2-10:numbbins//2+10] -= dept
+
+    indxgrup, booldupl = retr_dupl(inpt)
+    numbdatatest = int(fractest * numbdata)
+    indxdata, numbdatatest = retr_indxsplt(indxgrup, numbdatatest)
+
+    fracreletest = np.mean(outp[indxdata[:numbdatatest]])
+    fracreletran = np.mean(outp[indxdata[numbdatatest:]])
+    print('Fraction of the relevant samples: %g (test), %g (training), with %d test samples' % (fracreletest, fracreletran, numbdatatest))
+    if not (0.25 < fracreletest < 0.75 and 0.25 < fracreletran < 0.75):
+        raise Exception('The split does not keep both classes in both slices.')
@@ -0,0 +1,156 @@
+import sys, time
+
+import numpy as np
+
+from keras.models import Model
+
+from predlog import retr_auc
+
+import flbn
+import modlspec
+
+
+"""
+Ensemble of K small models (e.g., the replicates of a sweep point with different seeds, or reduced with K values of the L1 and L2
+regularization) trained and scored as a single Keras graph
+
+The K models are copies of their specifications (see modlspec) applied to the same inputs, with their layers named with the suffix
+_ense<k>, and each has its own output. Since Keras sums the losses of the outputs, and the layers (and the regularizers) of a model
+only enter its own loss, the gradient of each model is that of the model trained alone, while the K models share a single fit and
+a single predict. For small models, whose training is dominated by the overhead of each step rather than by the arithmetic, the
+K models are thus trained at nearly the cost of one.
+"""
+
+
+def retr_strgsuff(k):
+    """
+    Returns the suffix of the names of the layers of the k-th model of an ensemble
+    """
+
+    return '_ense%02d' % k
+
+
+def bild_ense(listspec):
+    """
+    Builds and compiles the ensemble of the models of a list of specifications, which must have the same inputs
+    """
+
+    for spec in listspec[1:]:
+        if [dictbran['shap'] for dictbran in spec['listbran']] != [dictbran['shap'] for dictbran in listspec[0]['listbran']]:
+            raise Exception('The models of an ensemble must have the same inputs.')
+
+    listinpt = modlspec.retr_listinpt(listspec[0])
+    listoutp = [modlspec.retr_outpspec(spec, listinpt, strgsuff=retr_strgsuff(k)) for k, spec in enumerate(listspec)]
+
+    modl = Model(inputs=listinpt, outputs=listoutp)
+
+    modl.compile(**listspec[0].get('dictcomp', modlspec.dictcompdefa))
+
+    return modl
+
+
+def init_ense(modl, listseed):
+    """
+    Draws new initial weights for the models of an ensemble in place, with the seed listseed[k] for the k-th model, and resets the
+    state of its optimizer
+    """
+
+    for k, seed in enumerate(listseed):
+        listlayr = [layr for layr in modl.layers if layr.name.endswith(retr_strgsuff(k))]
+        listweig = modlspec.retr_weiginit([weig for layr in listlayr for weig in layr.get_weights()], seed=seed)
+        for layr in listlayr:
+            numbweig = len(layr.get_weights())
+            layr.set_weights(listweig[:numbweig])
+            listweig = listweig[numbweig:]
+
+    modlspec.rese_opti(modl)
+
+
+def retr_ense(listspec, listseed=None):
+    """
+    Returns the compiled ensemble of a list of specifications with new initial weights, reusing a cached ensemble of the same
+    specifications
+
+    listseed: seeds of the initial weights of the models, defaulting to their indices in the ensemble
+    """
+
+    if listseed is None:
+        listseed = list(range(len(listspec)))
+
+    hashspec = modlspec.retr_hashspec({'listspecense': listspec})
+
+    if hashspec in modlspec.dictmodlcach:
+        modl = modlspec.dictmodlcach[hashspec]
+    else:
+        if len(modlspec.dictmodlcach) >= modlspec.numbmodlcach:
+            del modlspec.dictmodlcach[next(iter(modlspec.dictmodlcach))]
+        print('Building the ensemble %s of %d models...' % (hashspec, len(listspec)))
+        modl = bild_ense(listspec)
+        modlspec.dictmodlcach[hashspec] = modl
+
+    init_ense(modl, listseed)
+
+    return modl
+
+
+def fit_ense(modl, inpt, labl, **dictargs):
+    """
+    Trains the models of an ensemble on the same data samples in a single fit, returning the history
+    """
+
+    return modl.fit(inpt, [labl] * len(modl.outputs), **dictargs)
+
+
+def pred_ense(modl, inpt, **dictargs):
+    """
+    Returns the (numbdata, numbmodl) scores of the models of an ensemble
+    """
+
+    listscor = modl.predict(inpt, **dictargs)
+    if len(modl.outputs) == 1:
+        listscor = [listscor]
+
+    return np.stack([scor.flatten() for scor in listscor], axis=1)
+
+
+def main(pathdata, numbmodl=8, numbepoc=10, numbdatabtch=64, fractest=flbn.fractestdefa):
+    """
+    Trains numbmodl replicates of reduced one after another and as an ensemble, and compares their training times and AUCs
+
+    pathdata: .npz file of the views and labels of the data samples, the first fractest of which are used as the test data samples
+              (see flbn.read_view)
+    """
+
+    numbmodl = int(numbmodl)
+    numbepoc = int(numbepoc)
+    numbdatabtch = int(numbdatabtch)
+
+    inpttest, labltest, inpttran, labltran = flbn.read_view(pathdata, fractest=fractest)
+
+    spec = modlspec.retr_specreduced(inpttran[0].shape[1], inpttran[1].shape[1])
+
+    timeinit = time.time()
+    listaucsequ = []
+    for k in range(numbmodl):
+        modl = modlspec.retr_modl(spec, seed=k)
+        modl.fit(inpttran, labltran, epochs=numbepoc, batch_size=numbdatabtch, verbose=0)
+        listaucsequ.append(retr_auc(modl.predict(inpttest).flatten(), labltest)[0])
+    timesequ = time.time() - timeinit
+
+    timeinit = time.time()
+    modl = retr_ense([spec] * numbmodl)
+    fit_ense(modl, inpttran, labltran, epochs=numbepoc, batch_size=numbdatabtch, verbose=0)
+    scor = pred_ense(modl, inpttest)
+    listaucense = [retr_auc(scor[:, k], labltest)[0] for k in range(numbmodl)]
+    timeense = time.time() - timeinit
+
+    print('Training and scoring of %d models: %g s (one after another), %g s (ensemble), speedup: %g' % \
+                                                                                    (numbmodl, timesequ, timeense, timesequ / timeense))
+    print('AUC: %g +- %g (one after another), %g +- %g (ensemble), %g (mean score of the ensemble)' % (np.mean(listaucsequ), \
+                    np.std(listaucsequ), np.mean(listaucense), np.std(listaucense), retr_auc(np.mean(scor, axis=1), labltest)[0]))
+
+    return listaucsequ, listaucense
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:6])
@@ -0,0 +1,273 @@
+import sys, json
+
+import numpy as np
+
+import modlspec
+import modlnump
+
+
+"""
+Static estimate of the cost of a model: the number of parameters, the floating-point operations and the memory of the activations,
+per layer and in total, for a given batch size
+
+The shapes of the outputs of the layers are inferred from the shapes of the inputs and the configurations of the layers, without
+building the model or running it. The graph of a model is read either from a specification of modlspec (e.g., retr_specmodl of
+main.py or the specifications behind models.py), such that the cost of a point of a sweep is known before its model is built, or
+from the Keras JSON architecture of a model. The supported layers are those of modlnump.
+
+The floating-point operations are those of the forward pass of a sample, counting a multiply and an add as two operations, and one
+operation per compared element for the pooling layers. The memory of the activations is that of the outputs of all layers (and the
+inputs) of a batch, which are kept for the backward pass of a training step, and the peak memory of the forward pass is that of the
+largest layer with its inputs.
+"""
+
+
+# number of bytes per value (float32)
+numbbyte = 4
+
+
+def retr_grapspec(spec):
+    """
+    Returns the graph of a specification of modlspec, as a list of nodes in the order of evaluation and the shapes of the inputs
+    """
+
+    grap = {'listnode': [], 'liststrginpt': [], 'dictshapinpt': {}}
+
+    def appd_node(strglayr, dictargs, strgprev, strg):
+        conf = dict(dictargs)
+        conf['name'] = strg
+        grap['listnode'].append({'clas': modlspec.dictclaslayr[strglayr].__name__, 'conf': conf, 'strg': strg, 'listinpt': [strgprev]})
+
+    listoutpbran = []
+    for dictbran in spec['listbran']:
+        strgprev = dictbran['strg']
+        grap['liststrginpt'].append(strgprev)
+        grap['dictshapinpt'][strgprev] = tuple(int(numb) for numb in dictbran['shap'])
+        for k, (strglayr, dictargs) in enumerate(dictbran['listlayr']):
+            strg = '%s_%s%02d' % (dictbran['strg'], strglayr, k)
+            appd_node(strglayr, dictargs, strgprev, strg)
+            strgprev = strg
+        listoutpbran.append(strgprev)
+
+    if len(listoutpbran) > 1:
+        strgprev = 'concatenate'
+        grap['listnode'].append({'clas': 'Concatenate', 'conf': {'axis': -1}, 'strg': strgprev, 'listinpt': listoutpbran})
+    else:
+        strgprev = listoutpbran[0]
+    for k, (strglayr, dictargs) in enumerate(spec['listlayrhead']):
+        strg = dictargs.get('name', 'head_%s%02d' % (strglayr, k))
+        appd_node(strglayr, dictargs, strgprev, strg)
+        strgprev = strg
+
+    return grap
+
+
+def retr_graparch(strgarch):
+    """
+    Returns the graph of a Keras JSON architecture, as a list of nodes in the order of evaluation and the shapes of the inputs
+    """
+
+    dictarch = json.loads(strgarch)
+    dictconf = dictarch['config']
+    boolsequ = dictarch['class_name'] == 'Sequential'
+    listdictlayr = dictconf if isinstance(dictconf, list) else dictconf['layers']
+
+    grap = {'listnode': [], 'liststrginpt': [], 'dictshapinpt': {}}
+
+    strgprev = None
+    for dictlayr in listdictlayr:
+        node = {'clas': dictlayr['class_name'], 'conf': dictlayr['config']}
+        node['strg'] = dictlayr['config'].get('name', dictlayr.get('name'))
+
+        if 'batch_input_shape' in node['conf'] and (node['clas'] == 'InputLayer' or strgprev is None):
+            strginpt = node['strg'] if node['clas'] == 'InputLayer' else 'input'
+            grap['liststrginpt'].append(strginpt)
+            grap['dictshapinpt'][strginpt] = tuple(node['conf']['batch_input_shape'][1:])
+            strgprev = strginpt
+        if node['clas'] == 'InputLayer':
+            continue
+
+        if boolsequ:
+            node['listinpt'] = [strgprev]
+        else:
+            node['listinpt'] = [listinbo[0] for listinbo in dictlayr['inbound_nodes'][0]]
+
+        grap['listnode'].append(node)
+        strgprev = node['strg']
+
+    return grap
+
+
+def retr_numbtimeoutp(numbtime, sizewind, stde, strgpadd, dilt=1):
+    """
+    Returns the length of the time axis of the output of a convolution or pooling, following the convention of Keras
+    """
+
+    if strgpadd == 'valid':
+        numbtime = numbtime - (sizewind - 1) * dilt
+
+    return -(-numbtime // stde)
+
+
+def retr_estinode(node, listshapinpt):
+    """
+    Returns the shape of the output (excluding the batch axis), the number of parameters and the floating-point operations per sample
+    of a node for the shapes of its inputs
+    """
+
+    conf = node['conf']
+    shapinpt = listshapinpt[0]
+
+    if node['clas'] in ['Conv1D', 'SeparableConv1D']:
+        sizekern = modlnump.retr_tuplconf(conf['kernel_size'])
+        stde = modlnump.retr_tuplconf(conf.get('strides', 1))
+        dilt = modlnump.retr_tuplconf(conf.get('dilation_rate', 1))
+        numbtimeoutp = retr_numbtimeoutp(shapinpt[0], sizekern, stde, conf.get('padding', 'valid'), dilt=dilt)
+        numbchaninpt = shapinpt[-1]
+        numbfilt = conf['filters']
+        if node['clas'] == 'Conv1D':
+            numbparakern = sizekern * numbchaninpt * numbfilt
+        else:
+            numbmult = conf.get('depth_multiplier', 1)
+            numbparakern = sizekern * numbchaninpt * numbmult + numbchaninpt * numbmult * numbfilt
+        numbpara = numbparakern + numbfilt * conf.get('use_bias', True)
+        return (numbtimeoutp, numbfilt), numbpara, 2 * numbtimeoutp * numbparakern
+
+    if node['clas'] == 'Dense':
+        numbunit = conf['units']
+        numbparakern = shapinpt[-1] * numbunit
+        numbpost = int(np.prod(shapinpt[:-1]))
+        return tuple(shapinpt[:-1]) + (numbunit,), numbparakern + numbunit * conf.get('use_bias', True), 2 * numbpost * numbparakern
+
+    if node['clas'] == 'MaxPooling1D':
+        sizepool = modlnump.retr_tuplconf(conf.get('pool_size', 2))
+        stde = conf.get('strides', None)
+        stde = sizepool if stde is None else modlnump.retr_tuplconf(stde)
+        numbtimeoutp = retr_numbtimeoutp(shapinpt[0], sizepool, stde, conf.get('padding', 'valid'))
+        return (numbtimeoutp, shapinpt[-1]), 0, numbtimeoutp * shapinpt[-1] * sizepool
+
+    if node['clas'] in ['GlobalMaxPool1D', 'GlobalMaxPooling1D']:
+        return (shapinpt[-1],), 0, int(np.prod(shapinpt))
+
+    if node['clas'] == 'Flatten':
+        return (int(np.prod(shapinpt)),), 0, 0
+
+    if node['clas'] == 'Concatenate':
+        if len(set(tuple(shap[:-1]) for shap in listshapinpt)) > 1:
+            raise Exception('The shapes of the inputs of layer %s, %s, cannot be concatenated.' % (node['strg'], listshapinpt))
+        return tuple(shapinpt[:-1]) + (sum(shap[-1] for shap in listshapinpt),), 0, 0
+
+    if node['clas'] == 'Dropout':
+        return tuple(shapinpt), 0, 0
+
+    raise Exception('Layer %s of class %s is not supported.' % (node['strg'], node['clas']))
+
+
+def retr_esti(grap, numbdatabtch=1):
+    """
+    Returns the cost of the model of a graph, per layer and in total, for batches of numbdatabtch samples
+    """
+
+    dictshap = dict(grap['dictshapinpt'])
+    for strg, shap in dictshap.items():
+        if None in shap:
+            raise Exception('The shape of the input %s is not fully defined.' % strg)
+
+    esti = {'listlayr': [], 'numbdatabtch': numbdatabtch}
+    for node in grap['listnode']:
+        listshapinpt = [dictshap[strg] for strg in node['listinpt']]
+        shap, numbpara, flop = retr_estinode(node, listshapinpt)
+        dictshap[node['strg']] = shap
+        layr = {'strg': node['strg'], 'clas': node['clas'], 'shap': shap, 'numbpara': numbpara, 'flop': flop}
+        layr['memo'] = numbbyte * numbdatabtch * int(np.prod(shap))
+        layr['memoinpt'] = numbbyte * numbdatabtch * sum(int(np.prod(shapinpt)) for shapinpt in listshapinpt)
+        esti['listlayr'].append(layr)
+
+    memoinpt = numbbyte * numbdatabtch * sum(int(np.prod(grap['dictshapinpt'][strg])) for strg in grap['liststrginpt'])
+
+    esti['numbpara'] = sum(layr['numbpara'] for layr in esti['listlayr'])
+    esti['flop'] = sum(layr['flop'] for layr in esti['listlayr'])
+    esti['memopara'] = numbbyte * esti['numbpara']
+    esti['memoactv'] = memoinpt + sum(layr['memo'] for layr in esti['listlayr'])
+    esti['memoactvpeak'] = max([memoinpt] + [layr['memo'] + layr['memoinpt'] for layr in esti['listlayr']])
+
+    return esti
+
+
+def retr_estispec(spec, numbdatabtch=1):
+    """
+    Returns the cost of the model of a specification of modlspec
+    """
+
+    return retr_esti(retr_grapspec(spec), numbdatabtch=numbdatabtch)
+
+
+def retr_estimodl(modl, numbdatabtch=1):
+    """
+    Returns the cost of a Keras model
+    """
+
+    return retr_esti(retr_graparch(modl.to_json()), numbdatabtch=numbdatabtch)
+
+
+def retr_boolbudg(esti, maxmflop=None, maxmmemo=None):
+    """
+    Returns True if a model is within the budget
+
+    maxmflop: maximum number of floating-point operations per sample
+    maxmmemo: maximum memory of a training step [bytes], including the parameters and the activations of a batch
+    """
+
+    if maxmflop is not None and esti['flop'] > maxmflop:
+        return False
+
+    if maxmmemo is not None and esti['memopara'] + esti['memoactv'] > maxmmemo:
+        return False
+
+    return True
+
+
+def prnt_esti(esti):
+    """
+    Prints the cost of a model, per layer and in total
+    """
+
+    print('%28s %20s %16s %12s %12s %14s' % ('Layer', 'Class', 'Output shape', 'Parameters', 'FLOPs', 'Memory [MB]'))
+    for layr in esti['listlayr']:
+        print('%28s %20s %16s %12d %12.4g %14.4g' % (layr['strg'], layr['clas'], str(layr['shap']), layr['numbpara'], layr['flop'], \
+                                                                                                                    layr['memo'] / 1e6))
+    print('Total: %d parameters (%.4g MB), %.4g FLOPs per sample' % (esti['numbpara'], esti['memopara'] / 1e6, esti['flop']))
+    print('Memory of the activations of a batch of %d samples: %.4g MB (training step), %.4g MB (peak of the forward pass)' % \
+                                                                (esti['numbdatabtch'], esti['memoactv'] / 1e6, esti['memoactvpeak'] / 1e6))
+
+
+def chec_esti(modl):
+    """
+    Checks the estimated numbers of parameters and shapes of the outputs of a Keras model against those of Keras
+    """
+
+    esti = retr_estimodl(modl)
+
+    if esti['numbpara'] != modl.count_params():
+        raise Exception('The estimated number of parameters, %d, differs from that of Keras, %d.' % (esti['numbpara'], modl.count_params()))
+
+    for layr in esti['listlayr']:
+        shap = tuple(modl.get_layer(layr['strg']).output_shape[1:])
+        if shap != layr['shap']:
+            raise Exception('The estimated shape of the output of layer %s, %s, differs from that of Keras, %s.' % \
+                                                                                                    (layr['strg'], layr['shap'], shap))
+
+
+def main(strgspec, numbbinslocl=201, numbbinsglob=2001, numbdatabtch=64):
+    """
+    Prints the cost of a model of models.py
+
+    strgspec: name of the specification in modlspec, e.g., 'exonet' or 'reduced'
+    """
+
+    spec = getattr(modlspec, 'retr_spec' + strgspec)(int(numbbinslocl), int(numbbinsglob))
+    prnt_esti(retr_estispec(spec, numbdatabtch=int(numbdatabtch)))
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:5])
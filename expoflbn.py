@@ -0,0 +1,75 @@
+import os, sys
+
+import numpy as np
+
+import flbn
+import mockdata
+import ingeete6
+
+
+"""
+Export of the folded and binned views of the mock and TESS data sets to the .npz files read by the benchmarks and tools of the
+classifiers (bencglob, distmodl, prunmodl, quanmodl, ensemodl and modlnump, see flbn.read_view)
+
+The mock views are simulated in phase space (see mockdata.retr_datamockflbn). The TESS views are folded from the curves of a
+labeled ragged store (see ingeete6.labl_stor) on the ephemerides of their planets. In both cases, the data samples are in random
+order, such that the leading test slice of read_view holds the same fraction of relevant samples as the whole set on average.
+The default numbers of bins are those at which the outputs of the local and global branches of exonet can be concatenated.
+"""
+
+
+# default numbers of bins of the local and global views
+numbbinsloclexpo = 201
+numbbinsglobexpo = 2001
+
+
+def writ_viewmock(pathdata, numbplan=1000, numbnois=1000, numbbinslocl=numbbinsloclexpo, numbbinsglob=numbbinsglobexpo, dictdist=None, \
+                                                                                                                            seed=0):
+    """
+    Writes the views of a mock data set of numbplan curves with and numbnois curves without transits to pathdata
+    """
+
+    phaslocl, phasglob, inptlocl, inptglob, outp, dictpara = mockdata.retr_datamockflbn(numbplan=numbplan, numbnois=numbnois, \
+                                                numbbinslocl=numbbinslocl, numbbinsglob=numbbinsglob, dictdist=dictdist, seed=seed)
+
+    flbn.writ_view(pathdata, inptlocl, inptglob, outp)
+
+
+def writ_viewtess(pathdata, pathstor, numbrele=None, numbirre=None, numbbinslocl=numbbinsloclexpo, numbbinsglob=numbbinsglobexpo, seed=0):
+    """
+    Writes the views of the curves of the labeled store pathstor to pathdata
+
+    numbrele, numbirre: numbers of curves with and without planets, drawn at random, defaulting to all
+    """
+
+    phaslocl, phasglob, inptlocl, inptglob, outp, tici, peri = ingeete6.retr_dataete6(pathstor, numbrele=numbrele, numbirre=numbirre, \
+                                                                    numbbinslocl=numbbinslocl, numbbinsglob=numbbinsglob, seed=seed)
+
+    print('%d curves, %d with planets.' % (outp.size, np.sum(outp == 1)))
+    flbn.writ_view(pathdata, inptlocl, inptglob, outp)
+
+
+def main(strgdata='mock', pathdata=None, pathstor=None):
+    """
+    Exports the views of the mock ('mock') or TESS ('tess') data set
+
+    pathdata: .npz file to be written, defaulting to view.npz in the folder of the data set
+    pathstor: labeled ragged store of the TESS curves, defaulting to that of ingefits
+    """
+
+    if pathdata is None:
+        pathdata = os.environ['EXOP_DATA_PATH'] + '/%s/view.npz' % strgdata
+    os.system('mkdir -p %s' % os.path.dirname(pathdata))
+
+    if strgdata == 'mock':
+        writ_viewmock(pathdata)
+    elif strgdata == 'tess':
+        if pathstor is None:
+            pathstor = os.environ['EXOP_DATA_PATH'] + '/tess/stor/'
+        writ_viewtess(pathdata, pathstor)
+    else:
+        raise Exception('Unknown data set %s.' % strgdata)
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:4])
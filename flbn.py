@@ -0,0 +1,155 @@
+import numpy as np
+
+import ragd
+
+
+"""
+Vectorized phase-folding and binning of light curves
+
+A whole batch of curves is folded and binned with a single weighted np.bincount over flattened (curve, bin) indices,
+instead of folding and binning each curve separately with lightkurve. Curves of different lengths can be passed
+in the ragged container of ragd, by giving their offsets.
+"""
+
+
+# total width of the local view, in units of the transit duration
+wdthloclfact = 4.
+
+# default fraction of the data samples of a file of views used as the test data samples (see read_view)
+fractestdefa = 0.3
+
+
+def retr_timefold(time, peri, epoc, offs=None):
+    """
+    Returns the time from the nearest mid-transit, in [-peri / 2, peri / 2)
+
+    time: (numbtime) time grid shared by all curves or (numbdata, numbtime) times of each curve,
+          or the flat times of the ragged curves if offs is not None
+    peri, epoc: (numbdata) period and epoch of each curve
+    offs: offsets of the ragged curves
+    """
+
+    if offs is not None:
+        indxcurv = ragd.retr_indxcurv(offs)
+        peri = peri[indxcurv]
+        epoc = epoc[indxcurv]
+    else:
+        peri = peri[:, None]
+        epoc = epoc[:, None]
+        if time.ndim == 1:
+            time = time[None, :]
+
+    timefold = (time - epoc + 0.5 * peri) % peri - 0.5 * peri
+
+    return timefold
+
+
+def retr_flbn(timefold, flux, wdth, numbbins, boolmask=None, offs=None):
+    """
+    Bins folded curves into numbbins bins spanning [-wdth / 2, wdth / 2) around mid-transit
+
+    timefold: (numbdata, numbtime) time from the nearest mid-transit
+    flux: (numbdata, numbtime) flux
+    wdth: (numbdata) width of the binned window in the units of timefold
+    boolmask: (numbdata, numbtime) samples to include, defaults to all finite samples
+    offs: offsets of the ragged curves, in which case timefold, flux and boolmask are flat
+
+    Returns the (numbdata, numbbins) float32 mean flux in each bin, where empty bins are filled with the mean flux of the
+    curve in the window, and the (numbdata, numbbins) number of samples in each bin.
+    """
+
+    if offs is None:
+        numbdata = flux.shape[0]
+        indxdata = np.broadcast_to(np.arange(numbdata)[:, None], flux.shape)
+        wdth = wdth[:, None]
+    else:
+        numbdata = offs.size - 1
+        indxdata = ragd.retr_indxcurv(offs)
+        wdth = wdth[indxdata]
+
+    # bin index of each sample
+    indxbins = np.floor((timefold / wdth + 0.5) * numbbins).astype(np.int64)
+    boolgood = (indxbins >= 0) & (indxbins < numbbins) & np.isfinite(flux)
+    if boolmask is not None:
+        boolgood &= boolmask
+
+    indxdata = indxdata[boolgood]
+    indxflat = indxdata * numbbins + indxbins[boolgood]
+
+    numbsamp = np.bincount(indxflat, minlength=numbdata * numbbins).reshape((numbdata, numbbins))
+    fluxsumm = np.bincount(indxflat, weights=flux[boolgood], minlength=numbdata * numbbins).reshape((numbdata, numbbins))
+
+    # mean flux in each bin
+    fluxflbn = np.empty((numbdata, numbbins), dtype=np.float32)
+    boolfull = numbsamp > 0
+    fluxflbn[boolfull] = fluxsumm[boolfull] / numbsamp[boolfull]
+
+    # fill the empty bins
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fluxmean = np.sum(fluxsumm, 1) / np.sum(numbsamp, 1)
+    fluxmean[~np.isfinite(fluxmean)] = 1.
+    fluxflbn[~boolfull] = np.broadcast_to(fluxmean[:, None], fluxflbn.shape)[~boolfull]
+
+    return fluxflbn, numbsamp
+
+
+def retr_viewloclglob(time, flux, peri, epoc, dura, numbbinslocl=200, numbbinsglob=2000, wdthlocl=None, boolmask=None, offs=None):
+    """
+    Returns the local and global views of a batch of curves
+
+    The global view spans the full period and the local view spans wdthloclfact transit durations around mid-transit.
+
+    time: (numbtime) time grid shared by all curves or (numbdata, numbtime) times of each curve
+    flux: (numbdata, numbtime) flux
+    peri, epoc, dura: (numbdata) period, epoch and duration of each curve
+    wdthlocl: (numbdata) width of the local view, overriding wdthloclfact * dura
+    offs: offsets of the ragged curves, in which case time, flux and boolmask are flat
+
+    Returns the (numbdata, numbbinslocl) local view, the (numbdata, numbbinsglob) global view and the bin centers of both,
+    in units of the period for the global view and of the local width for the local view.
+    """
+
+    timefold = retr_timefold(time, peri, epoc, offs=offs)
+
+    if wdthlocl is None:
+        wdthlocl = wdthloclfact * dura
+
+    inptlocl, numbsamplocl = retr_flbn(timefold, flux, wdthlocl, numbbinslocl, boolmask=boolmask, offs=offs)
+    inptglob, numbsampglob = retr_flbn(timefold, flux, peri, numbbinsglob, boolmask=boolmask, offs=offs)
+
+    phaslocl = (np.arange(numbbinslocl) + 0.5) / numbbinslocl - 0.5
+    phasglob = (np.arange(numbbinsglob) + 0.5) / numbbinsglob - 0.5
+
+    return inptlocl, inptglob, phaslocl, phasglob
+
+
+def writ_view(pathdata, inptlocl, inptglob, outp):
+    """
+    Writes the local and global views and the labels of the data samples to the .npz file pathdata (see expoflbn)
+    """
+
+    print('Writing to %s...' % pathdata)
+    np.savez(pathdata, locl=np.asarray(inptlocl, dtype=np.float32), glob=np.asarray(inptglob, dtype=np.float32), outp=np.asarray(outp))
+
+
+def read_view(pathdata, fractest=fractestdefa):
+    """
+    Reads the .npz file pathdata of the local and global views (locl and glob) and the labels (outp) of the data samples, as written
+    by writ_view, and splits them into the test data samples, which are the first fractest of the samples, and the training data
+    samples, where the samples of a file without labels (e.g., to be scored) have the label -1
+
+    Returns the inputs of the two-input models (the views with a channel axis) and the labels of the test data samples, and those of
+    the training data samples.
+    """
+
+    objtfile = np.load(pathdata)
+    locl = objtfile['locl'][:, :, None].astype(np.float32)
+    glob = objtfile['glob'][:, :, None].astype(np.float32)
+    if 'outp' in objtfile.files:
+        labl = objtfile['outp']
+    else:
+        labl = np.full(locl.shape[0], -1)
+
+    numbdatatest = int(float(fractest) * labl.size)
+
+    return [locl[:numbdatatest], glob[:numbdatatest]], labl[:numbdatatest], [locl[numbdatatest:], glob[numbdatatest:]], labl[numbdatatest:]
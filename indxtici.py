@@ -0,0 +1,338 @@
+import os, sys
+
+import numpy as np
+
+import ragd
+import mani
+import flbn
+
+
+"""
+Index from TIC IDs to the curves of a ragged store
+
+The index holds the TIC IDs of all curves of the store in sorted order, together with the shard of each curve and the range of its
+samples in the shard. A batch of TIC IDs is looked up with two np.searchsorted calls, and only the samples of the matched curves are
+read from the memory-mapped shards. The index is loaded memory-mapped and is rebuilt only when the shards have changed since it
+was built, as recorded in the manifest of the store.
+
+Layout of the index folder of a store:
+    indxtici/tici.npy        -- sorted TIC IDs of the curves
+    indxtici/indxshrd.npy    -- index of the shard of each curve, in the sorted list of shards of the store
+    indxtici/indxcurv.npy    -- index of each curve in its shard
+    indxtici/offsinit.npy    -- index of the first sample of each curve in its shard
+    indxtici/offsfinl.npy    -- index after the last sample of each curve in its shard
+    indxtici/listpathshrd.txt -- paths of the shards
+"""
+
+
+# name of the index folder in the store
+strgindxtici = 'indxtici'
+
+
+def retr_hashinptindx(pathstor):
+    """
+    Returns the hash of the inputs of the index, i.e., of the paths, sizes and modification times of the shards of the store
+    """
+
+    listpathshrd = ragd.retr_listpathshrd(pathstor)
+    liststrgshrd = []
+    for pathshrd in listpathshrd:
+        entr = mani.retr_statfile(pathshrd)
+        liststrgshrd.append('%s %d %.6f' % (pathshrd, entr['size'], entr['mtime']))
+
+    return mani.retr_hasharry([np.array(liststrgshrd)])
+
+
+def writ_indxtici(pathstor):
+    """
+    Builds the index of the store and writes it to the index folder
+    """
+
+    listpathshrd = ragd.retr_listpathshrd(pathstor)
+
+    listtici = []
+    listindxshrd = []
+    listindxcurv = []
+    listoffs = []
+    for k, pathshrd in enumerate(listpathshrd):
+        tici = np.load(pathshrd + 'tici.npy')
+        offs = np.load(pathshrd + 'offs.npy')
+        listtici.append(tici)
+        listindxshrd.append(np.full(tici.size, k, dtype=np.int32))
+        listindxcurv.append(np.arange(tici.size, dtype=np.int64))
+        listoffs.append(offs)
+
+    dictindx = {}
+    if len(listtici) > 0:
+        tici = np.concatenate(listtici)
+        indxsort = np.argsort(tici, kind='stable')
+        dictindx['tici'] = tici[indxsort]
+        dictindx['indxshrd'] = np.concatenate(listindxshrd)[indxsort]
+        dictindx['indxcurv'] = np.concatenate(listindxcurv)[indxsort]
+        dictindx['offsinit'] = np.concatenate([offs[:-1] for offs in listoffs])[indxsort]
+        dictindx['offsfinl'] = np.concatenate([offs[1:] for offs in listoffs])[indxsort]
+    else:
+        for strg, typedata in [['tici', np.int64], ['indxshrd', np.int32], ['indxcurv', np.int64], ['offsinit', np.int64], \
+                                                                                                        ['offsfinl', np.int64]]:
+            dictindx[strg] = np.empty(0, dtype=typedata)
+
+    pathindx = pathstor + strgindxtici + '/'
+    print('Writing to %s...' % pathindx)
+    os.system('mkdir -p %s' % pathindx)
+    for strg, arry in dictindx.items():
+        np.save(pathindx + strg + '.npy', arry)
+    with open(pathindx + 'listpathshrd.txt', 'w') as objtfile:
+        objtfile.write('\n'.join(listpathshrd))
+
+
+def read_indxtici(pathstor, boolupdt=True):
+    """
+    Loads the index of the store memory-mapped, rebuilding it first if boolupdt is True and the shards have changed
+
+    Returns the index as a dictionary of arrays, together with the list of the paths of the shards under 'listpathshrd'.
+    """
+
+    pathindx = pathstor + strgindxtici + '/'
+
+    if boolupdt:
+        pathmani = pathstor + mani.strgmani
+        dictmani = mani.read_mani(pathmani)
+        hashinpt = retr_hashinptindx(pathstor)
+        if not mani.retr_boolartfcurr(dictmani, pathindx, hashinpt):
+            writ_indxtici(pathstor)
+            mani.writ_artf(dictmani, pathindx, hashinpt, boolhash=False)
+            mani.writ_mani(pathmani, dictmani)
+
+    dictindx = {}
+    for strg in ['tici', 'indxshrd', 'indxcurv', 'offsinit', 'offsfinl']:
+        dictindx[strg] = np.load(pathindx + strg + '.npy', mmap_mode='r')
+    with open(pathindx + 'listpathshrd.txt', 'r') as objtfile:
+        strgpath = objtfile.read()
+    dictindx['listpathshrd'] = strgpath.split('\n') if len(strgpath) > 0 else []
+
+    return dictindx
+
+
+def retr_indxentr(dictindx, listtici):
+    """
+    Looks up a batch of TIC IDs in the index
+
+    Returns the indices of the matched entries of the index and, for each entry, the index of its TIC ID in listtici.
+    A TIC ID with several curves (e.g., sectors) matches several entries, and a TIC ID not in the store matches none.
+    """
+
+    listtici = np.asarray(listtici, dtype=np.int64)
+
+    indxinit = np.searchsorted(dictindx['tici'], listtici, side='left')
+    indxfinl = np.searchsorted(dictindx['tici'], listtici, side='right')
+    numbentr = indxfinl - indxinit
+
+    indxquerentr = np.repeat(np.arange(listtici.size), numbentr)
+    offsentr = np.cumsum(numbentr) - numbentr
+    indxentr = indxinit[indxquerentr] + np.arange(indxquerentr.size) - offsentr[indxquerentr]
+
+    return indxentr, indxquerentr
+
+
+def retr_ragdtici(pathstor, listtici, dictindx=None):
+    """
+    Returns the ragged container of the curves of the TIC IDs listtici, read from the memory-mapped shards of the store
+
+    Returns the ragged container, ordered as listtici (with all curves of a TIC ID in the order of the store), and the index of the
+    TIC ID in listtici of each curve.
+    """
+
+    if dictindx is None:
+        dictindx = read_indxtici(pathstor)
+
+    indxentr, indxquerentr = retr_indxentr(dictindx, listtici)
+    indxshrdentr = np.asarray(dictindx['indxshrd'][indxentr])
+    indxcurvshrd = np.asarray(dictindx['indxcurv'][indxentr])
+    offsinit = np.asarray(dictindx['offsinit'][indxentr])
+
+    # indices of the samples of the matched curves in their shards
+    offs = ragd.retr_offs(np.asarray(dictindx['offsfinl'][indxentr]) - offsinit)
+    indxcurvsamp = ragd.retr_indxcurv(offs)
+    indxsampshrd = offsinit[indxcurvsamp] + np.arange(offs[-1]) - offs[indxcurvsamp]
+
+    # gather the matched curves shard by shard, reading only their samples from the memory-mapped arrays
+    dictragd = {'offs': offs}
+    setstrg = None
+    for indxshrd in np.unique(indxshrdentr):
+        boolcurv = indxshrdentr == indxshrd
+        boolsamp = boolcurv[indxcurvsamp]
+        dictragdshrd, listpath = ragd.read_shrd(dictindx['listpathshrd'][indxshrd])
+        for strg, arry in dictragdshrd.items():
+            if strg == 'offs':
+                continue
+            if strg in ragd.liststrgcurv:
+                if not strg in dictragd:
+                    dictragd[strg] = np.empty(offs.size - 1, dtype=arry.dtype)
+                dictragd[strg][boolcurv] = arry[indxcurvshrd[boolcurv]]
+            else:
+                if not strg in dictragd:
+                    dictragd[strg] = np.empty(offs[-1], dtype=arry.dtype)
+                dictragd[strg][boolsamp] = arry[indxsampshrd[boolsamp]]
+        setstrg = set(dictragdshrd) if setstrg is None else setstrg & set(dictragdshrd)
+
+    # keep only the arrays held by all shards read
+    if setstrg is not None:
+        for strg in list(dictragd):
+            if strg != 'offs' and not strg in setstrg:
+                del dictragd[strg]
+
+    return dictragd, indxquerentr
+
+
+def stit_ragdtici(dictragd, indxquer):
+    """
+    Stitches the sectors of each TIC ID of the curves looked up in the index into a single curve
+
+    Returns the stitched ragged container, with a curve per distinct TIC ID, and the index in the query of the TIC ID of each curve.
+    """
+
+    # keep the curves of the first query of each TIC ID, such that TIC IDs queried more than once are stitched once
+    tici, indxtici = np.unique(dictragd['tici'], return_inverse=True)
+    indxquerfrst = np.full(tici.size, indxquer.max())
+    np.minimum.at(indxquerfrst, indxtici, indxquer)
+    indxcurv = np.where(indxquer == indxquerfrst[indxtici])[0]
+
+    dictragdstit = ragd.stit_ragd(ragd.gath_ragd(dictragd, indxcurv))
+
+    # the stitched curves are in the order of increasing TIC ID
+    return dictragdstit, indxquerfrst
+
+
+def retr_datatici(pathstor, listtici, modl=None, numbbinslocl=200, numbbinsglob=2000, strgview='both', dictindx=None, boolstit=True):
+    """
+    Returns the raw, folded and scored data of the TIC IDs listtici
+
+    The curves are folded on the ephemerides stored with them (e.g., by ingeete6.labl_stor), if available, and scored by the model
+    modl, if given.
+
+    boolstit: Boolean flag to stitch the sectors of each TIC ID into a single curve (see ragd.stit_ragd) before folding, such that
+              the views of a target fold the transits of its whole baseline
+
+    Returns a dictionary with the ragged container of the raw (or stitched) curves ('ragd'), the index of the TIC ID in listtici of
+    each curve ('indxquer'), and, if available, the local and global views ('inptlocl', 'inptglob') and the scores ('scor').
+    """
+
+    dictragd, indxquer = retr_ragdtici(pathstor, listtici, dictindx=dictindx)
+
+    if boolstit and indxquer.size > 0:
+        dictragd, indxquer = stit_ragdtici(dictragd, indxquer)
+
+    dictdata = {'ragd': dictragd, 'indxquer': indxquer}
+
+    if 'peri' in dictragd and indxquer.size > 0:
+        boolephm = np.isfinite(dictragd['peri'])
+        flux = dictragd['flux'] / ragd.retr_mediragd(dictragd['flux'], dictragd['offs'])[ragd.retr_indxcurv(dictragd['offs'])]
+        peri = np.where(boolephm, dictragd['peri'], 1.)
+        epoc = np.where(boolephm, dictragd['epoc'], 0.)
+        dura = np.where(boolephm, dictragd['dura'], 0.1)
+        inptlocl, inptglob, phaslocl, phasglob = flbn.retr_viewloclglob(dictragd['time'], flux, peri, epoc, dura, \
+                                                    numbbinslocl=numbbinslocl, numbbinsglob=numbbinsglob, offs=dictragd['offs'])
+        # curves without ephemerides have no views
+        inptlocl[~boolephm, :] = np.nan
+        inptglob[~boolephm, :] = np.nan
+        dictdata['inptlocl'] = inptlocl
+        dictdata['inptglob'] = inptglob
+
+        if modl is not None:
+            scor = np.full(indxquer.size, np.nan)
+            if boolephm.any():
+                if strgview == 'locl':
+                    inpt = inptlocl[boolephm, :, None]
+                elif strgview == 'glob':
+                    inpt = inptglob[boolephm, :, None]
+                else:
+                    inpt = [inptlocl[boolephm, :, None], inptglob[boolephm, :, None]]
+                scor[boolephm] = modl.predict(inpt).flatten()
+            dictdata['scor'] = scor
+
+    return dictdata
+
+
+def chec_indxtici(pathstor, numbtici=100, seed=0):
+    """
+    Checks the curves looked up in the index against those of the whole store
+    """
+
+    rng = np.random.default_rng(seed)
+
+    dictragdstor, listpath = ragd.read_stor(pathstor)
+    listtici = rng.choice(np.concatenate([np.unique(dictragdstor['tici']), [-2]]), size=numbtici)
+
+    dictragd, indxquer = retr_ragdtici(pathstor, listtici)
+
+    indxcurv = np.concatenate([np.where(dictragdstor['tici'] == tici)[0] for tici in listtici])
+    dictragdtrue = ragd.gath_ragd(dictragdstor, indxcurv)
+
+    for strg, arry in dictragdtrue.items():
+        if not np.array_equal(dictragd[strg], arry, equal_nan=True):
+            raise Exception('The curves looked up in the index differ from those of the store in %s.' % strg)
+
+    print('The curves of %d TIC IDs looked up in the index match those of the store.' % numbtici)
+
+
+def chec_stittici(pathstor, numbtici=100, seed=0, numbbinslocl=200, numbbinsglob=2000):
+    """
+    Checks that the views of the TIC IDs are folded from their stitched curves, which hold the samples of all their sectors
+
+    The views of each TIC ID are compared against the views folded from the concatenation of the median-normalized curves of its
+    sectors, and the mean number of transits per curve is compared before and after the stitching.
+    """
+
+    rng = np.random.default_rng(seed)
+
+    dictindx = read_indxtici(pathstor)
+    listtici = rng.choice(np.unique(dictindx['tici']), size=numbtici, replace=False)
+
+    dictdata = retr_datatici(pathstor, listtici, numbbinslocl=numbbinslocl, numbbinsglob=numbbinsglob, dictindx=dictindx)
+    dictragdstit = dictdata['ragd']
+    dictragd, indxquer = retr_ragdtici(pathstor, listtici, dictindx=dictindx)
+    if not 'peri' in dictragd:
+        raise Exception('The curves of the store %s have no ephemerides.' % pathstor)
+
+    indxcurv = ragd.retr_indxcurv(dictragd['offs'])
+    flux = dictragd['flux'] / ragd.retr_mediragd(dictragd['flux'], dictragd['offs'])[indxcurv]
+    for k, tici in enumerate(dictragdstit['tici']):
+        if not np.isfinite(dictragdstit['peri'][k]):
+            continue
+        boolsamp = dictragd['tici'][indxcurv] == tici
+        indxsort = np.argsort(dictragd['time'][boolsamp], kind='stable')
+        time = dictragd['time'][boolsamp][indxsort]
+        fluxthis = flux[boolsamp][indxsort]
+        boolkeep = np.ones(time.size, dtype=bool)
+        boolkeep[1:] = np.diff(time) >= ragd.toletimedefa
+        fluxthis = fluxthis[boolkeep] / np.nanmedian(fluxthis[boolkeep])
+        inptlocl, inptglob, phaslocl, phasglob = flbn.retr_viewloclglob(time[boolkeep], fluxthis, dictragdstit['peri'][k:k+1], \
+                                dictragdstit['epoc'][k:k+1], dictragdstit['dura'][k:k+1], numbbinslocl=numbbinslocl, \
+                                numbbinsglob=numbbinsglob, offs=np.array([0, boolkeep.sum()]))
+        if not np.allclose(inptglob[0], dictdata['inptglob'][k], equal_nan=True):
+            raise Exception('The global view of TIC %d is not folded from its stitched curve.' % tici)
+
+    def retr_numbtranmean(dictragdthis):
+        offs = dictragdthis['offs']
+        span = dictragdthis['time'][offs[1:] - 1] - dictragdthis['time'][offs[:-1]]
+        boolephm = np.isfinite(dictragdthis['peri']) & (np.diff(offs) > 0)
+        return np.mean(span[boolephm] / dictragdthis['peri'][boolephm])
+
+    print('The views of %d TIC IDs are folded from their stitched curves, with %.3g transits per curve on average, against %.3g per sector.' \
+                                                % (dictragdstit['tici'].size, retr_numbtranmean(dictragdstit), retr_numbtranmean(dictragd)))
+
+
+def main(pathstor=None):
+    """
+    Builds or refreshes the index of the store pathstor
+    """
+
+    if pathstor is None:
+        pathstor = os.environ['EXOP_DATA_PATH'] + '/tess/stor/'
+
+    dictindx = read_indxtici(pathstor)
+    print('%d curves of %d TIC IDs are indexed in %s.' % (dictindx['tici'].size, np.unique(dictindx['tici']).size, pathstor))
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
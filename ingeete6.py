@@ -0,0 +1,181 @@
+import os, sys, csv
+
+import numpy as np
+
+import ragd
+import mani
+import flbn
+import ingefits
+
+
+"""
+Bulk ingestion of the ETE-6 simulated TESS light curves with the labels of the injected signals
+
+The ETE-6 light curves are SPOC-format light-curve files, which are ingested into a ragged store by ingefits. The labels and the
+ephemerides of the injected planets are then joined to the curves of each shard from a local catalog of the injected signals
+(e.g., the ETE-6 planet truth table exported as CSV). The join sorts the TIC IDs of the catalog once and looks up the TIC IDs of all
+curves of a shard with a single np.searchsorted, instead of a dictionary lookup per curve.
+"""
+
+
+# names (or prefixes of the names) of the columns of the catalog
+dictcolmdefa = {'tici': 'TIC ID', 'peri': 'Orbital Period', 'epoc': 'Epoch', 'dura': 'Transit Duration', 'dept': 'Transit Depth'}
+
+# factors converting the columns of the catalog into days and relative flux (duration in hours and depth in ppm)
+dictfactdefa = {'dura': 1. / 24., 'dept': 1e-6}
+
+# names of the labels joined to the curves
+liststrgpara = ['peri', 'epoc', 'dura', 'dept']
+
+
+def read_catl(pathcatl, dictcolm=dictcolmdefa, dictfact=dictfactdefa):
+    """
+    Reads the catalog of the injected signals, skipping the comment lines starting with #
+
+    A column is found as the first column whose name starts with the name given in dictcolm, so that units in the names are ignored.
+
+    Returns a dictionary of the TIC IDs and the ephemerides and depths of the rows.
+    """
+
+    with open(pathcatl, 'r') as objtfile:
+        listline = [line for line in objtfile if len(line.strip()) > 0 and not line.lstrip().startswith('#')]
+
+    listrows = list(csv.reader(listline, skipinitialspace=True))
+    liststrgcolm = [strgcolm.strip() for strgcolm in listrows[0]]
+
+    dictcatl = {}
+    for strg, strgcolm in dictcolm.items():
+        listindx = [k for k, strgcolmtemp in enumerate(liststrgcolm) if strgcolmtemp.startswith(strgcolm)]
+        if len(listindx) == 0:
+            raise Exception('Column %s is not in the catalog %s.' % (strgcolm, pathcatl))
+        if strg == 'tici':
+            dictcatl[strg] = np.array([int(float(rows[listindx[0]])) for rows in listrows[1:]], dtype=np.int64)
+        else:
+            dictcatl[strg] = np.array([float(rows[listindx[0]]) for rows in listrows[1:]]) * dictfact.get(strg, 1.)
+
+    return dictcatl
+
+
+def join_labl(tici, dictcatl):
+    """
+    Joins the catalog to the curves with TIC IDs tici by a sorted-key merge
+
+    If a TIC ID appears in more than one row of the catalog, its first row is used.
+
+    Returns the labels (1 for the curves in the catalog) and a dictionary of the joined ephemerides and depths, which are NaN for
+    the curves not in the catalog.
+    """
+
+    # unique TIC IDs of the catalog and their first rows
+    indxsort = np.argsort(dictcatl['tici'], kind='stable')
+    ticicatl, indxfrst = np.unique(dictcatl['tici'][indxsort], return_index=True)
+    indxrows = indxsort[indxfrst]
+
+    indxcatl = np.zeros(tici.size, dtype=int)
+    boolmtch = np.zeros(tici.size, dtype=bool)
+    if ticicatl.size > 0:
+        indxcatl = np.minimum(np.searchsorted(ticicatl, tici), ticicatl.size - 1)
+        boolmtch = ticicatl[indxcatl] == tici
+
+    outp = boolmtch.astype(float)
+    dictpara = {}
+    for strgpara in liststrgpara:
+        dictpara[strgpara] = np.full(tici.size, np.nan)
+        dictpara[strgpara][boolmtch] = dictcatl[strgpara][indxrows[indxcatl[boolmtch]]]
+
+    return outp, dictpara
+
+
+def labl_stor(pathstor, pathcatl, dictcolm=dictcolmdefa, dictfact=dictfactdefa):
+    """
+    Joins the labels of the catalog pathcatl to the curves of all shards of the store pathstor, writing them as per-curve arrays
+    """
+
+    dictcatl = read_catl(pathcatl, dictcolm=dictcolm, dictfact=dictfact)
+
+    pathmani = pathstor + mani.strgmani
+    dictmani = mani.read_mani(pathmani)
+
+    numbcurv = 0
+    numbrele = 0
+    for pathshrd in ragd.retr_listpathshrd(pathstor):
+        tici = np.load(pathshrd + 'tici.npy')
+        outp, dictpara = join_labl(tici, dictcatl)
+        np.save(pathshrd + 'outp.npy', outp)
+        for strgpara in liststrgpara:
+            np.save(pathshrd + strgpara + '.npy', dictpara[strgpara])
+        numbcurv += tici.size
+        numbrele += int(np.sum(outp))
+
+        # the shard has been modified, so its record is updated
+        if pathshrd in dictmani['artf']:
+            mani.writ_artf(dictmani, pathshrd, dictmani['artf'][pathshrd]['hashinpt'], boolhash=False)
+
+    print('%d of %d curves are in the catalog %s.' % (numbrele, numbcurv, pathcatl))
+
+    dictmani['catl'] = mani.retr_entrfile(pathcatl)
+    print('Writing to %s...' % pathmani)
+    mani.writ_mani(pathmani, dictmani)
+
+
+def retr_dataete6(pathstor, numbrele=None, numbirre=None, numbbinslocl=200, numbbinsglob=2000, seed=None):
+    """
+    Returns the local and global views of the ETE-6 curves of the store
+
+    numbrele, numbirre: numbers of curves with and without injected planets, drawn at random, defaulting to all
+    The curves are normalized by their median and folded on the ephemerides of their injected planets. Curves without injected
+    planets are folded on the ephemerides of a randomly chosen injected planet, so that the period does not give away the label.
+
+    Returns the bin centers of the local and global views, the views, the labels, the TIC IDs and the periods, in random order.
+    """
+
+    rng = np.random.default_rng(seed)
+
+    dictragd, listpath = ragd.read_stor(pathstor)
+    if not 'outp' in dictragd:
+        raise Exception('The store %s has no labels, run labl_stor first.' % pathstor)
+
+    indxrele = np.where(dictragd['outp'] == 1)[0]
+    indxirre = np.where((dictragd['outp'] == 0) & (np.diff(dictragd['offs']) > 0))[0]
+    if numbrele is not None:
+        indxrele = rng.choice(indxrele, size=min(numbrele, indxrele.size), replace=False)
+    if numbirre is not None:
+        indxirre = rng.choice(indxirre, size=min(numbirre, indxirre.size), replace=False)
+    indxcurv = rng.permutation(np.concatenate([indxrele, indxirre]))
+
+    dictragd = ragd.gath_ragd(dictragd, indxcurv)
+
+    # ephemerides of the curves without injected planets
+    boolirre = dictragd['outp'] == 0
+    indxdraw = rng.choice(np.where(~boolirre)[0], size=np.sum(boolirre))
+    for strgpara in ['peri', 'dura']:
+        dictragd[strgpara][boolirre] = dictragd[strgpara][indxdraw]
+    dictragd['epoc'][boolirre] = dictragd['time'][dictragd['offs'][:-1][boolirre]] + \
+                                                            rng.random(np.sum(boolirre)) * dictragd['peri'][boolirre]
+
+    flux = dictragd['flux'] / ragd.retr_mediragd(dictragd['flux'], dictragd['offs'])[ragd.retr_indxcurv(dictragd['offs'])]
+
+    inptlocl, inptglob, phaslocl, phasglob = flbn.retr_viewloclglob(dictragd['time'], flux, dictragd['peri'], dictragd['epoc'], \
+                            dictragd['dura'], numbbinslocl=numbbinslocl, numbbinsglob=numbbinsglob, offs=dictragd['offs'])
+
+    return phaslocl, phasglob, inptlocl, inptglob, dictragd['outp'], dictragd['tici'], dictragd['peri']
+
+
+def main(pathdata=None, pathcatl=None, pathstor=None, numbwork=None):
+    """
+    Prepares the whole ETE-6 set: ingests the light curves under pathdata and joins the labels of the catalog pathcatl
+    """
+
+    if pathdata is None:
+        pathdata = os.environ['CTHC_DATA_PATH'] + '/ete6/fits/'
+    if pathcatl is None:
+        pathcatl = os.environ['CTHC_DATA_PATH'] + '/ete6/ete6_planet_data.csv'
+    if pathstor is None:
+        pathstor = os.environ['CTHC_DATA_PATH'] + '/ete6/stor/'
+
+    ingefits.inge_fitsincr(pathdata, pathstor, numbwork=numbwork)
+    labl_stor(pathstor, pathcatl)
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:4])
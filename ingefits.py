@@ -0,0 +1,266 @@
+import os, sys, fnmatch, shutil
+import multiprocessing
+
+import numpy as np
+
+import astropy.io.fits as fits
+
+import ragd
+import mani
+
+
+"""
+Parallel ingestion of local directories of SPOC (TESS) or Kepler light-curve FITS files into a ragged store
+
+The files are split into shards of numbfileshrd files, which are read by a pool of worker processes. Each file is opened with
+memmap=True and only the time, PDCSAP flux and quality columns are copied out of the table. Each worker concatenates the curves of
+its shard into a ragged container, drops the samples with non-finite values or bad quality flags by compacting the container in place,
+and writes it straight into the store (see ragd), so that only the manifest entries of the
+files, rather than the curves, pass between the processes.
+
+The ingestion is incremental: the files and shards are recorded in the manifest of the store (see mani), so that a re-run only
+ingests the new and changed files into new shards, after dropping the stale curves of the changed and removed files from the
+existing shards.
+"""
+
+
+# number of files in a shard of the store
+numbfileshrd = 1000
+
+# pattern of the names of the light-curve files, matching TESS *_lc.fits and Kepler *_llc.fits and *_slc.fits
+strgpattdefa = '*lc.fits'
+
+# default bitmask of the quality flags of the samples to be dropped at ingestion
+## TESS: attitude tweak (1), safe mode (2), coarse pointing (4), Earth pointing (8), momentum dump (32), manual exclude (128)
+bitmaskdefa = 1 | 2 | 4 | 8 | 32 | 128
+
+
+def retr_listpathfits(pathdata, strgpatt=strgpattdefa):
+    """
+    Returns the sorted paths of the light-curve files under pathdata
+    """
+
+    listpath = []
+    for pathroot, listdirc, liststrgfile in os.walk(pathdata):
+        for strgfile in fnmatch.filter(liststrgfile, strgpatt):
+            listpath.append(os.path.join(pathroot, strgfile))
+    listpath.sort()
+
+    return listpath
+
+
+def read_fits(path):
+    """
+    Reads the time, PDCSAP flux and quality columns and the target and sector (or quarter) of a light-curve file
+
+    Returns the time, float32 flux and int32 quality of the samples, the TIC (or KIC) ID and the sector (or quarter).
+    """
+
+    with fits.open(path, memmap=True) as listhdun:
+        headprim = listhdun[0].header
+        data = listhdun[1].data
+
+        # copy the columns out of the memory map before the file is closed
+        time = np.array(data['TIME'], dtype=np.float64)
+        flux = np.array(data['PDCSAP_FLUX'], dtype=np.float32)
+        if 'QUALITY' in data.columns.names:
+            qual = np.array(data['QUALITY'], dtype=np.int32)
+        else:
+            qual = np.array(data['SAP_QUALITY'], dtype=np.int32)
+
+    tici = headprim.get('TICID', headprim.get('KEPLERID', -1))
+    sect = headprim.get('SECTOR', headprim.get('QUARTER', -1))
+
+    return time, flux, qual, tici, sect
+
+
+def inge_shrd(listpath, pathshrd, bitmask=bitmaskdefa):
+    """
+    Reads the light-curve files listpath and writes their good samples (see ragd.retr_boolgood) to the shard pathshrd
+
+    Files that cannot be read are skipped. Returns the manifest entries of the ingested files and the number of samples.
+    """
+
+    listtime = []
+    listflux = []
+    listqual = []
+    listtici = []
+    listsect = []
+    listpathgood = []
+    for path in listpath:
+        try:
+            time, flux, qual, tici, sect = read_fits(path)
+        except (OSError, KeyError, IndexError, ValueError) as expt:
+            print('Skipping %s: %s' % (path, expt))
+            continue
+        listtime.append(time)
+        listflux.append(flux)
+        listqual.append(qual)
+        listtici.append(tici)
+        listsect.append(sect)
+        listpathgood.append(path)
+
+    dictragd = {}
+    dictragd['offs'] = ragd.retr_offs([time.size for time in listtime])
+    dictragd['time'] = np.concatenate(listtime) if len(listtime) > 0 else np.empty(0)
+    dictragd['flux'] = np.concatenate(listflux) if len(listflux) > 0 else np.empty(0, dtype=np.float32)
+    dictragd['qual'] = np.concatenate(listqual) if len(listqual) > 0 else np.empty(0, dtype=np.int32)
+    dictragd['tici'] = np.array(listtici, dtype=np.int64)
+    dictragd['sect'] = np.array(listsect, dtype=np.int32)
+
+    ragd.filt_ragd(dictragd, ragd.retr_boolgood(dictragd, bitmask=bitmask))
+
+    ragd.writ_shrd(pathshrd, dictragd, listpath=listpathgood)
+
+    dictentr = {}
+    for path in listpathgood:
+        dictentr[path] = mani.retr_entrfile(path)
+        dictentr[path]['shrd'] = pathshrd
+
+    return dictentr, int(dictragd['offs'][-1])
+
+
+def inge_shrdargs(listargs):
+
+    return inge_shrd(*listargs)
+
+
+def inge_fits(pathdata, pathstor, numbwork=None, strgpatt=strgpattdefa, listpath=None, indxshrdinit=0, bitmask=bitmaskdefa):
+    """
+    Ingests the light-curve files under pathdata into the ragged store pathstor
+
+    numbwork: number of worker processes, defaults to the number of cores
+    listpath: files to ingest, defaults to all files under pathdata matching strgpatt
+    indxshrdinit: index of the first shard to be written, so that new files can be added to an existing store
+    bitmask: bitmask of the quality flags of the samples to be dropped
+
+    Returns the paths of the written shards and the manifest entries of the ingested files.
+    """
+
+    if listpath is None:
+        listpath = retr_listpathfits(pathdata, strgpatt=strgpatt)
+    if numbwork is None:
+        numbwork = multiprocessing.cpu_count()
+
+    numbfile = len(listpath)
+    listargs = []
+    for indxinit in range(0, numbfile, numbfileshrd):
+        pathshrd = pathstor + 'shrd%06d/' % (indxshrdinit + len(listargs))
+        listargs.append([listpath[indxinit:indxinit+numbfileshrd], pathshrd, bitmask])
+
+    print('Ingesting %d files into %d shards in %s with %d workers...' % (numbfile, len(listargs), pathstor, numbwork))
+    os.system('mkdir -p %s' % pathstor)
+
+    dictentr = {}
+    numbsamp = 0
+    objtpool = multiprocessing.Pool(numbwork)
+    for dictentrshrd, numbsampshrd in objtpool.imap_unordered(inge_shrdargs, listargs):
+        dictentr.update(dictentrshrd)
+        numbsamp += numbsampshrd
+    objtpool.close()
+    objtpool.join()
+
+    print('Ingested %d files with %d samples.' % (len(dictentr), numbsamp))
+
+    return [listargstemp[1] for listargstemp in listargs], dictentr
+
+
+def retr_hashinptshrd(listpath, dictmani):
+    """
+    Returns the hash of the inputs of a shard, i.e., of the content hashes of its files
+    """
+
+    return mani.retr_hasharry([np.array([dictmani['file'][path]['hash'] for path in listpath])])
+
+
+def drop_curvshrd(pathshrd, setpathdrop):
+    """
+    Drops the curves read from the files setpathdrop from a shard, deleting the shard if no curve is left
+
+    Returns the paths of the files of the remaining curves.
+    """
+
+    dictragd, listpath = ragd.read_shrd(pathshrd, boolmemm=False)
+    indxkeep = np.array([k for k, path in enumerate(listpath) if not path in setpathdrop], dtype=int)
+    listpathkeep = [listpath[k] for k in indxkeep]
+
+    if indxkeep.size == 0:
+        print('Removing %s...' % pathshrd)
+        shutil.rmtree(pathshrd)
+    else:
+        ragd.writ_shrd(pathshrd, ragd.gath_ragd(dictragd, indxkeep), listpath=listpathkeep)
+
+    return listpathkeep
+
+
+def inge_fitsincr(pathdata, pathstor, numbwork=None, strgpatt=strgpattdefa, bitmask=bitmaskdefa):
+    """
+    Incrementally ingests the light-curve files under pathdata into the ragged store pathstor, processing only the files that are
+    new or have changed since the last ingestion recorded in the manifest of the store
+
+    If bitmask differs from that of the last ingestion, all files are ingested again.
+
+    Returns the paths of the written shards.
+    """
+
+    pathmani = pathstor + mani.strgmani
+    dictmani = mani.read_mani(pathmani)
+
+    listpath = retr_listpathfits(pathdata, strgpatt=strgpatt)
+    listpathnews, listpathchan, listpathtouc, listpathremo = mani.retr_listpathchan(dictmani, listpath)
+    if dictmani.get('bitmask', bitmask) != bitmask:
+        print('Quality bitmask changed from %d to %d, ingesting all files again...' % (dictmani['bitmask'], bitmask))
+        setpathchan = set(listpathchan)
+        listpathchan += [path for path in listpath if path in dictmani['file'] and not path in setpathchan]
+    dictmani['bitmask'] = bitmask
+    print('%d files: %d new, %d changed, %d touched without a change, %d removed.' % \
+                                    (len(listpath), len(listpathnews), len(listpathchan), len(listpathtouc), len(listpathremo)))
+
+    # drop the stale curves from the existing shards
+    dictsetpathdrop = {}
+    for path in listpathchan + listpathremo:
+        pathshrd = dictmani['file'][path]['shrd']
+        if not pathshrd in dictsetpathdrop:
+            dictsetpathdrop[pathshrd] = set()
+        dictsetpathdrop[pathshrd].add(path)
+    for path in listpathremo:
+        del dictmani['file'][path]
+    for pathshrd, setpathdrop in dictsetpathdrop.items():
+        if not os.path.exists(pathshrd):
+            continue
+        listpathkeep = drop_curvshrd(pathshrd, setpathdrop)
+        if len(listpathkeep) == 0:
+            dictmani['artf'].pop(pathshrd, None)
+        else:
+            mani.writ_artf(dictmani, pathshrd, retr_hashinptshrd(listpathkeep, dictmani), boolhash=False)
+
+    # ingest the new and changed files into new shards
+    listpathshrd = []
+    if len(listpathnews) + len(listpathchan) > 0:
+        listindxshrd = [int(os.path.basename(pathshrd.rstrip('/'))[4:]) for pathshrd in ragd.retr_listpathshrd(pathstor)]
+        indxshrdinit = max(listindxshrd) + 1 if len(listindxshrd) > 0 else 0
+        listpathshrd, dictentr = inge_fits(pathdata, pathstor, numbwork=numbwork, listpath=listpathnews + listpathchan, \
+                                                                                    indxshrdinit=indxshrdinit, bitmask=bitmask)
+        dictmani['file'].update(dictentr)
+        for pathshrd in listpathshrd:
+            listpathshrdfile = [path for path, entr in dictentr.items() if entr['shrd'] == pathshrd]
+            mani.writ_artf(dictmani, pathshrd, retr_hashinptshrd(listpathshrdfile, dictmani), boolhash=False)
+
+    print('Writing to %s...' % pathmani)
+    mani.writ_mani(pathmani, dictmani)
+
+    return listpathshrd
+
+
+def main(pathdata=None, pathstor=None, numbwork=None):
+
+    if pathdata is None:
+        pathdata = os.environ['EXOP_DATA_PATH'] + '/tess/fits/'
+    if pathstor is None:
+        pathstor = os.environ['EXOP_DATA_PATH'] + '/tess/stor/'
+
+    inge_fitsincr(pathdata, pathstor, numbwork=numbwork)
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:3])
@@ -0,0 +1,232 @@
+import os
+
+import numpy as np
+
+import matplotlib
+import matplotlib.pyplot as plt
+
+from exop import main as exopmain
+
+import mockdata
+import flbn
+import ragd
+from checstor import load_chec
+
+
+"""
+Batched injection and recovery of synthetic transits in real TESS light curves
+
+Synthetic transits, whose parameters are drawn into a table, are injected into the real (ragged) light curves returned by
+retr_datatess. Injections are processed in blocks of thousands: the host curves of a block are gathered from the ragged container,
+the transit models are applied to the in-transit samples, and the injected curves are folded and binned in batch on the ephemeris of
+their injections. The views are then scored by the model and the recovery fraction is reported on a grid of depth and period.
+"""
+
+
+# number of injections processed in a single block
+numbinjeblok = 1024
+
+
+def retr_tablinje(time, offs, numbinje, indxhost=None, dictdist=None, seed=None):
+    """
+    Draws the table of injection parameters
+
+    time, offs: ragged container of the host curves
+    numbinje: number of injections
+    indxhost: indices of the curves eligible as hosts, defaults to all curves
+    dictdist: distributions of the transit parameters in the format of mockdata.dictdistdefa
+
+    Returns a dictionary of the transit parameters of each injection together with the index of its host curve, 'indxhost',
+    where the epoch is measured from the first sample of the host.
+    """
+
+    rng = np.random.default_rng(seed)
+
+    if indxhost is None:
+        indxhost = np.arange(offs.size - 1)
+
+    # skip the empty curves
+    indxhost = indxhost[offs[indxhost + 1] > offs[indxhost]]
+
+    dictinje = mockdata.retr_para(rng, numbinje, dictdist=dictdist)
+    dictinje['indxhost'] = rng.choice(indxhost, size=numbinje)
+    dictinje['epoc'] += time[offs[dictinje['indxhost']]]
+
+    return dictinje
+
+
+def retr_fluxinje(time, flux, offs, dictinje, indxinje=None, funcshap=mockdata.retr_shapbox):
+    """
+    Injects transits into their host curves
+
+    time, flux, offs: ragged container of the host curves
+    dictinje: table of injection parameters, as returned by retr_tablinje
+    indxinje: indices of the injections to process, defaults to all
+
+    Returns the ragged container of the injected curves, one curve per injection. The flux of the host is multiplied by
+    one minus the fractional flux decrement of the transit model funcshap, which takes the same arguments as in mockdata.
+    """
+
+    if indxinje is None:
+        indxinje = np.arange(dictinje['indxhost'].size)
+
+    indxsamp, offsinje = ragd.retr_indxgath(offs, dictinje['indxhost'][indxinje])
+    timeinje = time[indxsamp]
+    fluxinje = flux[indxsamp].astype(np.float32)
+
+    # time offset of each sample from the nearest mid-transit of its injection
+    dictpara = dict((strgpara, dictinje[strgpara][indxinje]) for strgpara in ['dept', 'dura', 'peri', 'epoc'])
+    timefold = flbn.retr_timefold(timeinje, dictpara['peri'], dictpara['epoc'], offs=offsinje)
+
+    # in-transit samples
+    indxcurvsamp = ragd.retr_indxcurv(offsinje)
+    boolintr = np.abs(timefold) < 0.5 * dictpara['dura'][indxcurvsamp]
+    indxdatasamp = indxcurvsamp[boolintr]
+    offstime = timefold[boolintr] / (0.5 * dictpara['dura'][indxdatasamp])
+
+    fluxinje[boolintr] *= (1. - funcshap(offstime, dictpara, indxdatasamp)).astype(np.float32)
+
+    return timeinje, fluxinje, offsinje
+
+
+def retr_inptmodl(inptlocl, inptglob, strgview='both'):
+
+    if strgview == 'locl':
+        return inptlocl[:, :, None]
+    if strgview == 'glob':
+        return inptglob[:, :, None]
+
+    return [inptlocl[:, :, None], inptglob[:, :, None]]
+
+
+def retr_scorinje(modl, time, flux, offs, dictinje, numbbinslocl=200, numbbinsglob=2000, strgview='both', \
+                                                            funcshap=mockdata.retr_shapbox, numbdatabtch=256):
+    """
+    Injects, folds, bins and scores all injections, block by block
+
+    Returns the score of each injection.
+    """
+
+    numbinje = dictinje['indxhost'].size
+    scor = np.empty(numbinje)
+    for indxinit in range(0, numbinje, numbinjeblok):
+        indxinje = np.arange(indxinit, min(indxinit + numbinjeblok, numbinje))
+
+        timeinje, fluxinje, offsinje = retr_fluxinje(time, flux, offs, dictinje, indxinje=indxinje, funcshap=funcshap)
+
+        inptlocl, inptglob, phaslocl, phasglob = flbn.retr_viewloclglob(timeinje, fluxinje, dictinje['peri'][indxinje], \
+                                                    dictinje['epoc'][indxinje], dictinje['dura'][indxinje], numbbinslocl=numbbinslocl, \
+                                                    numbbinsglob=numbbinsglob, offs=offsinje)
+
+        scor[indxinje] = modl.predict(retr_inptmodl(inptlocl, inptglob, strgview), batch_size=numbdatabtch).flatten()
+
+    return scor
+
+
+def retr_fracreco(scor, dictinje, binsdept, binsperi, thrs=0.5):
+    """
+    Calculates the fraction of the injections recovered (i.e., with a score larger than thrs) in each bin of depth and period
+
+    Returns the (numbbinsdept, numbbinsperi) recovery fraction, set to NaN in empty bins, and the numbers of injections and
+    recovered injections.
+    """
+
+    numbinje = np.histogram2d(dictinje['dept'], dictinje['peri'], bins=[binsdept, binsperi])[0]
+    boolreco = scor > thrs
+    numbreco = np.histogram2d(dictinje['dept'][boolreco], dictinje['peri'][boolreco], bins=[binsdept, binsperi])[0]
+
+    fracreco = np.full(numbinje.shape, np.nan)
+    fracreco[numbinje > 0] = numbreco[numbinje > 0] / numbinje[numbinje > 0]
+
+    return fracreco, numbinje, numbreco
+
+
+def plot_fracreco(path, fracreco, binsdept, binsperi):
+
+    figr, axis = plt.subplots(figsize=(8, 6))
+    objtimag = axis.pcolormesh(binsperi, binsdept, fracreco, vmin=0., vmax=1., cmap='viridis')
+    axis.set_xlabel('Period [days]')
+    axis.set_ylabel('Depth')
+    axis.set_yscale('log')
+    plt.colorbar(objtimag, ax=axis, label='Recovery fraction')
+    plt.tight_layout()
+    print('Writing to %s...' % path)
+    plt.savefig(path)
+    plt.close()
+
+
+def retr_ragdtess(listtime, listflux):
+    """
+    Returns the ragged container of the light curves returned by retr_datatess, which are lists of curves of different lengths, with
+    each curve normalized by its mean flux
+    """
+
+    time, flux, offs = ragd.retr_ragdlist(listtime, listflux)
+
+    flux = flux / ragd.retr_meanragd(flux, offs)[ragd.retr_indxcurv(offs)]
+
+    return time, flux, offs
+
+
+def chec_ragdtess(numbcurv=100, seed=0):
+    """
+    Checks the ragged container of light curves of different lengths with non-finite samples against a loop over the curves
+    """
+
+    rng = np.random.default_rng(seed)
+
+    listtime = []
+    listflux = []
+    for k in range(numbcurv):
+        numbtime = rng.integers(10, 1000)
+        listtime.append(np.sort(rng.uniform(0., 27., numbtime)))
+        listflux.append(1. + 1e-3 * rng.standard_normal(numbtime))
+        listflux[k][rng.random(numbtime) < 0.05] = np.nan
+
+    time, flux, offs = retr_ragdtess(listtime, listflux)
+
+    if offs.size != numbcurv + 1:
+        raise Exception('The container holds %d curves instead of %d.' % (offs.size - 1, numbcurv))
+    for k in range(numbcurv):
+        boolgood = np.isfinite(listflux[k])
+        fluxthis = listflux[k][boolgood]
+        if not np.array_equal(time[offs[k]:offs[k+1]], listtime[k][boolgood]) or \
+                                                        not np.allclose(flux[offs[k]:offs[k+1]], fluxthis / np.mean(fluxthis)):
+            raise Exception('Curve %d differs from the input.' % k)
+
+    print('The ragged container of %d curves of different lengths matches the input.' % numbcurv)
+
+
+def main(pathstor, numbinje=10000, numbbinslocl=200, numbbinsglob=2000, strgview='both', dictdist=None, \
+                                            numbbinsdept=10, numbbinsperi=10, thrs=0.5, seed=0, funcshap=mockdata.retr_shapbox):
+    """
+    Runs the injection and recovery on the TESS light curves without known transits, using the model stored in the
+    checkpoint store pathstor, and writes the recovery fraction as a function of depth and period
+    """
+
+    time, flux, outp, legdoutp, tici, itoi = exopmain.retr_datatess(False)
+
+    time, flux, offs = retr_ragdtess(time, flux)
+
+    dictinje = retr_tablinje(time, offs, numbinje, indxhost=np.where(np.asarray(outp) == 0)[0], dictdist=dictdist, seed=seed)
+
+    modl = load_chec(pathstor)
+    scor = retr_scorinje(modl, time, flux, offs, dictinje, numbbinslocl=numbbinslocl, numbbinsglob=numbbinsglob, \
+                                                                                            strgview=strgview, funcshap=funcshap)
+
+    binsdept = np.logspace(np.log10(dictinje['dept'].min()), np.log10(dictinje['dept'].max()), numbbinsdept + 1)
+    binsperi = np.linspace(dictinje['peri'].min(), dictinje['peri'].max(), numbbinsperi + 1)
+    fracreco, numbinjegrid, numbrecogrid = retr_fracreco(scor, dictinje, binsdept, binsperi, thrs=thrs)
+
+    print('Overall recovery fraction: %.3g' % np.mean(scor > thrs))
+    for a in range(numbbinsdept):
+        print('Depth %.3g - %.3g: ' % (binsdept[a], binsdept[a+1]) + ' '.join(['%.2f' % frac for frac in fracreco[a, :]]))
+
+    pathinje = pathstor + 'inje/'
+    os.system('mkdir -p %s' % pathinje)
+    path = pathinje + 'fracreco.npz'
+    print('Writing to %s...' % path)
+    np.savez(path, fracreco=fracreco, numbinje=numbinjegrid, numbreco=numbrecogrid, binsdept=binsdept, binsperi=binsperi, scor=scor)
+    plot_fracreco(pathinje + 'fracreco.pdf', fracreco, binsdept, binsperi)
+
+    return fracreco, binsdept, binsperi
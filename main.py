@@ -1,6 +1,6 @@
 import numpy as np
 
-import datetime, os
+import datetime, os, multiprocessing
 
 from keras.models import Sequential
 from keras.layers import Dense, Dropout, Conv1D, MaxPooling1D, Flatten
@@ -23,6 +23,13 @@ sns.set(context='poster', style='ticks', color_codes=True)
 import exop
 from exop import main as exopmain
 
+import mockdata
+import mockstrm
+import ingeete6
+import dupl
+import modlspec
+import estimodl
+
 
 class gdatstrt(object):
     
@@ -32,30 +39,42 @@ class gdatstrt(object):
 
 def appdfcon(gdat):
     
+    listlayr = []
     if gdat.numblayr == 1:
-        gdat.modl.add(Dropout(gdat.fracdrop))
-        gdat.modl.add(Dense(1, input_dim=gdat.numbphas, activation='sigmoid'))
+        listlayr.append(['drop', {'rate': gdat.fracdrop}])
     else:
-        gdat.modl.add(Dropout(gdat.fracdrop))
-        gdat.modl.add(Dense(gdat.numbdimslayr, input_dim=gdat.numbphas, activation='relu'))
+        listlayr.append(['drop', {'rate': gdat.fracdrop}])
+        listlayr.append(['dens', {'units': gdat.numbdimslayr, 'activation': 'relu'}])
         for k in range(gdat.numblayr):
-            gdat.modl.add(Dropout(gdat.fracdrop))
-            gdat.modl.add(Dense(gdat.numbdimslayr, activation= 'relu'))
-        gdat.modl.add(Dropout(gdat.fracdrop))
-        gdat.modl.add(Dense(1, activation='sigmoid'))
+            listlayr.append(['drop', {'rate': gdat.fracdrop}])
+            listlayr.append(['dens', {'units': gdat.numbdimslayr, 'activation': 'relu'}])
+        listlayr.append(['drop', {'rate': gdat.fracdrop}])
+    listlayr.append(modlspec.retr_layrfinl())
+
+    return listlayr
     
 
 def appdcon1(gdat, strgactv='relu'):
     
-    gdat.modl.add(Conv1D(16, kernel_size=5, input_shape=(gdat.numbphas, 1), activation='relu', padding='same'))
-    gdat.modl.add(MaxPooling1D(pool_size=5, strides=2, padding='same'))
-    gdat.modl.add(Conv1D(16, kernel_size=5, activation='relu', padding='same'))
-    gdat.modl.add(MaxPooling1D(pool_size=5, strides=2, padding='same'))
-    gdat.modl.add(Conv1D(16, kernel_size=5, activation='relu', padding='same'))
-    gdat.modl.add(MaxPooling1D(pool_size=5, strides=2, padding='same'))
-    gdat.modl.add(Conv1D(16, kernel_size=5, activation='relu', padding='same'))
-    gdat.modl.add(MaxPooling1D(pool_size=5, strides=2, padding='same'))
-    gdat.modl.add(Flatten())
+    listlayr = []
+    for k in range(4):
+        listlayr.append(['conv', {'filters': 16, 'kernel_size': 5, 'activation': strgactv, 'padding': 'same'}])
+        listlayr.append(['maxm', {'pool_size': 5, 'strides': 2, 'padding': 'same'}])
+    listlayr.append(['flat', {}])
+
+    return listlayr
+
+
+def retr_specmodl(gdat):
+    """
+    Returns the specification of the model of the current point of the sweep, a CNN followed by a fully-connected stack
+    """
+
+    spec = {}
+    spec['listbran'] = [{'strg': 'input', 'shap': [gdat.numbphas, 1], 'listlayr': appdcon1(gdat)}]
+    spec['listlayrhead'] = appdfcon(gdat)
+
+    return spec
 
 
 def retr_metr(gdat, indxvaluthis=None, strgvarbthis=None):     
@@ -73,7 +92,11 @@ def retr_metr(gdat, indxvaluthis=None, strgvarbthis=None):
     for y in gdat.indxepoc:
         print 'Training epoch %d...' % y
         histinpt = gdat.inpttran[:, :, None]
-        hist = gdat.modl.fit(histinpt, gdat.outptran, epochs=1, batch_size=gdat.numbdatabtch, verbose=1)
+        if gdat.datatype == 'strmmock':
+            # train on fresh mock batches synthesized by parallel workers
+            hist = gdat.modl.fit_generator(gdat.strm, epochs=1, workers=gdat.numbwork, use_multiprocessing=True, verbose=1)
+        else:
+            hist = gdat.modl.fit(histinpt, gdat.outptran, epochs=1, batch_size=gdat.numbdatabtch, verbose=1)
         loss[y] = hist.history['loss'][0]
         indxepocloww = max(0, y - numbepocchec)
         
@@ -167,7 +190,9 @@ def expl( \
     gdat.datatype = datatype
     
     # Boolean flag to use light curves folded and binned  by SPOC
-    if datatype == 'tess':
+    # the mock data stream and the folded-domain mock simulator also produce folded and binned light curves directly,
+    # and the ETE-6 curves are folded and binned in batch from the ragged store
+    if datatype == 'tess' or datatype == 'strmmock' or datatype == 'flbnmock' or datatype == 'ete6':
         gdat.boolspocflbn = True
     else:
         gdat.boolspocflbn = False
@@ -181,19 +206,39 @@ def expl( \
     # number of runs for each configuration in order to determine the statistical uncertainty
     gdat.numbruns = 1
 
+    # Boolean flag to build the mock data sets of all depth and noise values of a run from the same random numbers
+    gdat.boolmockcomm = True
+
+    # shape of the mock transits
+    gdat.funcshap = mockdata.retr_shapldqd
+
+    # number of workers synthesizing the mock data (stream), leaving a core for the training
+    gdat.numbwork = max(1, multiprocessing.cpu_count() - 1)
+
+    # Boolean flag to keep the exact and near duplicate light curves (e.g., of the same target in several sectors) on the same side
+    # of the split into the test and training data sets, which is off for the simulated data sets, whose curves are not duplicated
+    gdat.booldupl = not datatype in ['simpmock', 'strmmock', 'flbnmock']
+
+    # budget of the models of the sweep, where the points whose models exceed it are skipped, as estimated statically (see estimodl)
+    ## maximum number of floating-point operations of the forward pass per sample (None for no limit)
+    gdat.maxmflop = None
+    ## maximum memory of the parameters and the activations of a training batch [bytes] (None for no limit)
+    gdat.maxmmemo = 4e9
+
     gdat.indxepoc = np.arange(gdat.numbepoc)
     gdat.indxruns = np.arange(gdat.numbruns)
 
     # a dictionary to hold the variable values for which the training will be repeated
     gdat.listvalu = {}
     # temp
+    # relative flux during the transit, i.e., one minus the fractional transit depth of the mock data generators (see mockdata)
     gdat.listvalu['dept'] = 1 - np.array([1e-3, 3e-3, 1e-2, 3e-2, 1e-1]) 
 
     gdat.listvalu['zoomtype'] = ['locl', 'glob']
     
     gdat.numbtime = 10000
 
-    if gdat.datatype == 'simpmock':
+    if gdat.datatype == 'simpmock' or gdat.datatype == 'strmmock' or gdat.datatype == 'flbnmock':
 
         ## generative parameters of mock data
         #gdat.listvalu['numbphas'] = np.array([1e1, 3e1, 1000, 3e2, 1e3]).astype(int)
@@ -267,6 +312,7 @@ def expl( \
     
     ## path where plots will be generated
     pathplot = os.environ['CTHC_DATA_PATH'] + '/inpt/'
+    pathstorete6 = os.environ['CTHC_DATA_PATH'] + '/ete6/stor/'
     os.system('mkdir -p %s' % pathplot)
     print ('Will generate plots in %s' % pathplot)
     
@@ -283,6 +329,9 @@ def expl( \
     # temp
     gdat.maxmindxvarb = 10
 
+    # common random numbers of the mock data sets, for each run and configuration of the remaining generative parameters
+    gdat.dictdictcomm = {}
+
     # for each run
     for t in gdat.indxruns:
         
@@ -307,17 +356,26 @@ def expl( \
                 
                 strgconf = '%04d_%04d_%04d' % (t, o, i)
                 pathsave = pathplot + 'save_metr_%s.fits' % strgconf
+                
+                for strgvarbtemp in gdat.liststrgvarb:
+                    indx = int(len(gdat.listvalu[strgvarbtemp]) / 2)
+                    setattr(gdat, strgvarbtemp, gdat.listvalu[strgvarbtemp][indx])
+                setattr(gdat, strgvarb, gdat.listvalu[strgvarb][i])
+                
+                # static cost of the model of this point, known before the data are produced and the model is built
+                esti = estimodl.retr_estispec(retr_specmodl(gdat), numbdatabtch=gdat.numbdatabtch)
+                
                 # temp
                 if False and os.path.exists(pathsave):
                     print ('Reading from %s...' % pathsave)
                     listhdun = ap.io.fits.open(pathsave)
                     metr = listhdun[0].data
+                elif not estimodl.retr_boolbudg(esti, maxmflop=gdat.maxmflop, maxmmemo=gdat.maxmmemo):
+                    print 'Skipping the configuration, whose model exceeds the budget...'
+                    estimodl.prnt_esti(esti)
+                    # missing metrics, which are left out of the plots
+                    metr = np.zeros((gdat.numbepoc, 2, 3)) - 1
                 else:
-                    for strgvarbtemp in gdat.liststrgvarb:
-                        indx = int(len(gdat.listvalu[strgvarbtemp]) / 2)
-                        setattr(gdat, strgvarbtemp, gdat.listvalu[strgvarbtemp][indx])
-                    setattr(gdat, strgvarb, gdat.listvalu[strgvarb][i])
-                    
                     if isinstance(gdat.listvalu[strgvarb][i], str):
                         print 'Value: ' + gdat.listvalu[strgvarb][i]
                     else:
@@ -339,10 +397,26 @@ def expl( \
                     # number of training data samples
                     gdat.numbdatatran = gdat.numbdata - gdat.numbdatatest
                     
+                    # fractional transit depth of the mock data generators, from the relative flux during the transit
+                    deptfrac = 1. - gdat.dept
+                    
+                    if (datatype == 'simpmock' or datatype == 'flbnmock') and gdat.boolmockcomm:
+                        # draw the unit noise and unit-depth transits once per run and scale them to the depth and noise of this point
+                        strgcomm = '%s_%04d_%04d_%04d_%04d_%04d' % (datatype, t, gdat.numbrele, gdat.numbirre, gdat.numbtime, gdat.numbphas)
+                        if not strgcomm in gdat.dictdictcomm:
+                            gdat.dictdictcomm[strgcomm] = mockdata.retr_datamockcomm(numbplan=gdat.numbrele, numbnois=gdat.numbirre, \
+                                                    numbtime=gdat.numbtime, seed=t, boolflbn=(datatype == 'flbnmock'), \
+                                                    numbbinslocl=gdat.numbphas, numbbinsglob=gdat.numbphas, funcshap=gdat.funcshap)
+                    
                     if datatype == 'simpmock':
-                        gdat.inptraww, gdat.outp, gdat.peri = exopmain.retr_datamock(numbplan=gdat.numbrele, \
-                                                    numbnois=gdat.numbirre, numbtime=gdat.numbtime, dept=gdat.dept, nois=gdat.nois)
-                        gdat.time = np.tile(np.linspace(0., (gdat.numbtime - 1) / 30. / 24., gdat.numbtime), (gdat.numbdata, 1))
+                        if gdat.boolmockcomm:
+                            time, gdat.inptraww, gdat.outp, dictpara = mockdata.retr_datamockgrid(gdat.dictdictcomm[strgcomm], deptfrac, gdat.nois)
+                        else:
+                            time, gdat.inptraww, gdat.outp, dictpara = mockdata.retr_datamockpara(numbplan=gdat.numbrele, \
+                                                    numbnois=gdat.numbirre, numbtime=gdat.numbtime, seed=t, numbwork=gdat.numbwork, \
+                                                    dictdist={'dept': ['fixd', deptfrac], 'nois': ['fixd', gdat.nois]}, funcshap=gdat.funcshap)
+                        gdat.peri = dictpara['peri']
+                        gdat.time = np.tile(time, (gdat.numbdata, 1))
                         gdat.legdoutp = []
                         for k in gdat.indxdata:
                             legd = '%d, ' % k
@@ -352,8 +426,51 @@ def expl( \
                                 legd += 'I'
                             gdat.legdoutp.append(legd)
 
+                    if datatype == 'strmmock':
+                        # stream of fresh mock batches for the training and a fixed mock data set for the evaluation
+                        gdat.strm = mockstrm.mockstrm(numbdatabtch=gdat.numbdatabtch, numbbtch=max(1, gdat.numbdatatran // gdat.numbdatabtch), \
+                                                    fracplan=gdat.fracrele, numbtime=gdat.numbtime, numbbinslocl=gdat.numbphas, \
+                                                    numbbinsglob=gdat.numbphas, strgview=gdat.zoomtype, funcshap=gdat.funcshap, \
+                                                    dictdist={'dept': ['fixd', deptfrac], 'nois': ['fixd', gdat.nois]})
+                        phas, gdat.inptflbn, gdat.outp = gdat.strm.retr_datafixd(gdat.numbdata)
+                        gdat.phas = np.tile(phas, (gdat.numbdata, 1))
+
+                    if datatype == 'flbnmock':
+                        # simulate the folded and binned light curves directly, skipping the raw light curves
+                        if gdat.boolmockcomm:
+                            phaslocl, phasglob, inptlocl, inptglob, gdat.outp, dictpara = \
+                                                    mockdata.retr_datamockgrid(gdat.dictdictcomm[strgcomm], deptfrac, gdat.nois)
+                        else:
+                            phaslocl, phasglob, inptlocl, inptglob, gdat.outp, dictpara = mockdata.retr_datamockflbn(numbplan=gdat.numbrele, \
+                                                    numbnois=gdat.numbirre, numbtime=gdat.numbtime, numbbinslocl=gdat.numbphas, \
+                                                    numbbinsglob=gdat.numbphas, dictdist={'dept': ['fixd', deptfrac], 'nois': ['fixd', gdat.nois]}, \
+                                                    funcshap=gdat.funcshap)
+                        if gdat.zoomtype == 'locl':
+                            gdat.inptflbn = inptlocl
+                            gdat.phas = np.tile(phaslocl, (gdat.numbdata, 1))
+                        else:
+                            gdat.inptflbn = inptglob
+                            gdat.phas = np.tile(phasglob, (gdat.numbdata, 1))
+
                     if datatype == 'ete6':
-                        gdat.time, gdat.inptraww, gdat.outp, gdat.tici, gdat.peri = exopmain.retr_dataete6(numbdata=gdat.numbdata, nois=gdat.nois)
+                        # ragged store of the ETE-6 curves and labels, prepared by ingeete6.main
+                        phaslocl, phasglob, inptlocl, inptglob, gdat.outp, gdat.tici, gdat.peri = ingeete6.retr_dataete6(pathstorete6, \
+                                                    numbrele=gdat.numbrele, numbirre=gdat.numbirre, numbbinslocl=gdat.numbphas, \
+                                                    numbbinsglob=gdat.numbphas, seed=t)
+                        if gdat.zoomtype == 'locl':
+                            gdat.inptflbn = inptlocl
+                            gdat.phas = np.tile(phaslocl, (gdat.outp.size, 1))
+                        else:
+                            gdat.inptflbn = inptglob
+                            gdat.phas = np.tile(phasglob, (gdat.outp.size, 1))
+                        gdat.legdoutp = ['%d, TIC %d' % (k, tici) for k, tici in enumerate(gdat.tici)]
+                        
+                        # the join of the curves and the labels may return fewer data samples than requested
+                        gdat.numbdata = gdat.outp.size
+                        gdat.fracrele = np.mean(gdat.outp)
+                        gdat.indxdata = np.arange(gdat.numbdata)
+                        gdat.numbdatatest = int(gdat.numbdata * gdat.fractest)
+                        gdat.numbdatatran = gdat.numbdata - gdat.numbdatatest
                     
                     if datatype == 'tess':
                         if gdat.boolspocflbn:
@@ -366,8 +483,8 @@ def expl( \
         
                     if gdat.phastype == 'flbn':
                         if not gdat.boolspocflbn:   
-                            strgsave = '%s_%d_%s_%04d_%04d_%04d' % \
-                                            (datatype, np.log10(gdat.nois) + 5., gdat.zoomtype, gdat.numbphas, gdat.numbrele, gdat.numbirre)
+                            strgsave = '%s_%d_%s_%04d_%04d_%04d_%.3g' % \
+                                            (datatype, np.log10(gdat.nois) + 5., gdat.zoomtype, gdat.numbphas, gdat.numbrele, gdat.numbirre, gdat.dept)
                             pathsaveflbn = pathplot + 'save_flbn_%s' % strgsave + '.dat' 
                             pathsavephas = pathplot + 'save_phas_%s' % strgsave + '.dat' 
                             if not os.path.exists(pathsaveflbn):
@@ -439,22 +556,23 @@ def expl( \
                     #assert np.isfinite(gdat.outp).all()
 
                     # divide the data set into training and test data sets
-                    numbdatatest = int(gdat.fractest * gdat.numbdata)
+                    numbdatatest = int(gdat.fractest * gdat.outp.size)
+                    if gdat.booldupl:
+                        # move whole groups of duplicates into the test slice
+                        indxgrup, booldupl = dupl.retr_dupl(gdat.inpt)
+                        indxdatasplt, numbdatatest = dupl.retr_indxsplt(indxgrup, numbdatatest)
+                        gdat.inpt = gdat.inpt[indxdatasplt]
+                        gdat.outp = gdat.outp[indxdatasplt]
+                        gdat.numbdatatest = numbdatatest
+                        gdat.numbdatatran = gdat.outp.size - numbdatatest
                     gdat.inpttest = gdat.inpt[:numbdatatest]
                     gdat.outptest = gdat.outp[:numbdatatest]
                     gdat.inpttran = gdat.inpt[numbdatatest:]
                     gdat.outptran = gdat.outp[numbdatatest:]   
 
-                    gdat.modl = Sequential()
-
-                    # construct the neural net
-                    # add a CNN
-                    appdcon1(gdat)
-                    
-                    ## add the last output layer
-                    appdfcon(gdat)
-                    
-                    gdat.modl.compile(loss='binary_crossentropy', optimizer='sgd', metrics=['accuracy'])
+                    # construct the neural net, a CNN followed by a fully-connected stack
+                    # the compiled model is reused across the points of the sweep with the same architecture
+                    gdat.modl = modlspec.retr_modl(retr_specmodl(gdat), seed=t)
     
                     pathsave = pathplot + 'modlgrap_%s.png' % strgconf
                     keras.utils.plot_model(gdat.modl, to_file=pathsave)
@@ -495,8 +613,9 @@ def expl( \
                 else:
                     colr = 'g'
                 
+                # values without metrics (e.g., skipped configurations) are left out of the plot
                 indx = []
-                ydat = np.zeros(gdat.numbvalu[o]) - 1.
+                ydat = np.zeros(gdat.numbvalu[o]) + np.nan
                 for i in gdat.indxvalu[o]:
                     indx.append(np.where(gdat.dictmetr[strgvarb][r, l, :, i] != -1)[0])
                     if indx[i].size > 0:
@@ -511,7 +630,8 @@ def expl( \
                     caps.set_markeredgewidth(3)
             
                 for t in gdat.indxruns:
-                    axis.plot(gdat.listvalu[strgvarb], gdat.dictmetr[strgvarb][r, l, t, :], marker='D', ls='', markersize=5, alpha=alph, color=colr)
+                    ydattemp = np.where(gdat.dictmetr[strgvarb][r, l, t, :] == -1, np.nan, gdat.dictmetr[strgvarb][r, l, t, :])
+                    axis.plot(gdat.listvalu[strgvarb], ydattemp, marker='D', ls='', markersize=5, alpha=alph, color=colr)
             
             #axis.set_ylim([-0.1, 1.1])
             if strgvarb == 'numbphas':
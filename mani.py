@@ -0,0 +1,200 @@
+import os, json, hashlib
+
+import numpy as np
+
+
+"""
+Manifest of ingested files and derived artifacts
+
+The manifest records the size, modification time and content hash of every ingested light-curve file and of every derived
+artifact (e.g., the shards of a ragged store or the binned views). An artifact also records the hash of the inputs it was
+derived from. When the ingestion or binning is run again, only the files that are new or whose content has changed are
+processed, and an artifact is rebuilt only if its inputs have changed or the artifact itself has been modified.
+
+Layout of the manifest (JSON):
+    {'file': {path: {'size', 'mtime', 'hash', ...}}, 'artf': {path: {'size', 'mtime', 'hash', 'hashinpt'}}, ...}
+where further items may record the settings of the stage that wrote the manifest.
+"""
+
+
+# name of the manifest file in a store
+strgmani = 'mani.json'
+
+# size of the blocks in which the files are hashed [bytes]
+sizeblokhash = 1 << 20
+
+
+def retr_listpathdirc(path):
+    """
+    Returns the sorted paths of the files in a folder artifact (e.g., a shard), or the path itself if it is a file
+    """
+
+    if not os.path.isdir(path):
+        return [path]
+
+    return [os.path.join(path, strgfile) for strgfile in sorted(os.listdir(path))]
+
+
+def retr_hashfile(path):
+    """
+    Returns the hash of the content of a file, or of all files in a folder
+    """
+
+    objthash = hashlib.sha1()
+    for pathfile in retr_listpathdirc(path):
+        with open(pathfile, 'rb') as objtfile:
+            while True:
+                blok = objtfile.read(sizeblokhash)
+                if len(blok) == 0:
+                    break
+                objthash.update(blok)
+
+    return objthash.hexdigest()[:16]
+
+
+def retr_hasharry(listarry):
+    """
+    Returns the hash of a list of arrays (or scalars), e.g., the inputs of an artifact
+    """
+
+    objthash = hashlib.sha1()
+    for arry in listarry:
+        arry = np.ascontiguousarray(arry)
+        objthash.update(str(arry.dtype).encode())
+        objthash.update(str(arry.shape).encode())
+        objthash.update(arry.tobytes())
+
+    return objthash.hexdigest()[:16]
+
+
+def retr_hashmani(mani):
+    """
+    Returns the hash of the entries of the files of a manifest and of the settings of the stage that wrote it (e.g., the quality
+    bitmask of the ingestion), such that it changes whenever a file is added, changed or removed or a setting is changed
+    """
+
+    listentr = []
+    for path in sorted(mani['file']):
+        entr = mani['file'][path]
+        listentr.append('%s %d %r %s' % (path, entr['size'], entr['mtime'], entr['hash']))
+    for strg in sorted(mani):
+        if strg != 'file' and strg != 'artf':
+            listentr.append('%s %s' % (strg, json.dumps(mani[strg], sort_keys=True)))
+
+    return retr_hasharry([np.array(listentr, dtype=str)])
+
+
+def retr_statfile(path):
+    """
+    Returns the size and modification time of a file, or the total size and latest modification time of the files in a folder
+    """
+
+    listobjtstat = [os.stat(pathfile) for pathfile in retr_listpathdirc(path)]
+
+    return {'size': int(sum(objtstat.st_size for objtstat in listobjtstat)), \
+            'mtime': float(max([objtstat.st_mtime for objtstat in listobjtstat] + [0.]))}
+
+
+def retr_entrfile(path, boolhash=True):
+    """
+    Returns the manifest entry of a file
+
+    boolhash: if False, the content is not hashed, e.g., for large artifacts whose modification is detected from their size and
+              modification time
+    """
+
+    entr = retr_statfile(path)
+    if boolhash:
+        entr['hash'] = retr_hashfile(path)
+    else:
+        entr['hash'] = None
+
+    return entr
+
+
+def read_mani(pathmani):
+
+    if not os.path.exists(pathmani):
+        return {'file': {}, 'artf': {}}
+
+    with open(pathmani, 'r') as objtfile:
+        mani = json.load(objtfile)
+
+    return mani
+
+
+def writ_mani(pathmani, mani):
+
+    # write to a temporary file first so that an interrupted run does not corrupt the manifest
+    with open(pathmani + '.temp', 'w') as objtfile:
+        json.dump(mani, objtfile)
+    os.replace(pathmani + '.temp', pathmani)
+
+
+def retr_boolstatcurr(entr, path):
+    """
+    Returns True if the size and modification time of the file are those recorded in the manifest entry
+    """
+
+    if not os.path.exists(path):
+        return False
+
+    stat = retr_statfile(path)
+
+    return stat['size'] == entr['size'] and stat['mtime'] == entr['mtime']
+
+
+def retr_listpathchan(mani, listpath):
+    """
+    Compares the files listpath with those recorded in the manifest
+
+    Files whose size and modification time are unchanged are assumed to be unchanged. Otherwise, their content hash is compared.
+
+    Returns the paths of the new files, of the files whose content has changed, of the files that were touched without a change of
+    their content (whose entries are updated in place) and of the recorded files that no longer exist.
+    """
+
+    listpathnews = []
+    listpathchan = []
+    listpathtouc = []
+    for path in listpath:
+        if not path in mani['file']:
+            listpathnews.append(path)
+            continue
+        entr = mani['file'][path]
+        if retr_boolstatcurr(entr, path):
+            continue
+        entrcurr = retr_entrfile(path)
+        if entrcurr['hash'] == entr['hash']:
+            entr.update(entrcurr)
+            listpathtouc.append(path)
+        else:
+            listpathchan.append(path)
+
+    setpath = set(listpath)
+    listpathremo = [path for path in mani['file'] if not path in setpath]
+
+    return listpathnews, listpathchan, listpathtouc, listpathremo
+
+
+def retr_boolartfcurr(mani, pathartf, hashinpt):
+    """
+    Returns True if the artifact exists, is unmodified since it was recorded and was derived from inputs with the hash hashinpt
+    """
+
+    if not pathartf in mani['artf']:
+        return False
+
+    entr = mani['artf'][pathartf]
+
+    return entr['hashinpt'] == hashinpt and retr_boolstatcurr(entr, pathartf)
+
+
+def writ_artf(mani, pathartf, hashinpt, boolhash=True):
+    """
+    Records an artifact that has just been written, derived from inputs with the hash hashinpt
+    """
+
+    entr = retr_entrfile(pathartf, boolhash=boolhash)
+    entr['hashinpt'] = hashinpt
+    mani['artf'][pathartf] = entr
@@ -0,0 +1,669 @@
+import numpy as np
+
+from concurrent.futures import ThreadPoolExecutor
+
+import flbn
+
+
+"""
+Vectorized generation of mock light curves
+
+All curves are generated in blocks of numbdatablok curves, where each block is produced by a handful of broadcast operations
+over a (numbdatablok, numbtime) slice of a preallocated (optionally memory-mapped) buffer. Transits are then subtracted
+from the in-transit samples only. The generative parameters of each curve are drawn from configurable distributions.
+The noise is white by default, or colored with a given power spectral density, in which case it is drawn in the frequency domain.
+"""
+
+
+# cadence of the mock light curves [days]
+cadedefa = 2. / 60. / 24.
+
+# default distributions of the generative parameters
+## each item is [strgtype, parameters...], where strgtype is
+##     'fixd': fixed value, [valu]
+##     'unif': uniform, [minm, maxm]
+##     'logt': log-uniform, [minm, maxm]
+##     'gaus': Gaussian, [mean, stdv]
+dictdistdefa = {
+                # fractional transit depth
+                'dept': ['logt', 1e-3, 1e-1], \
+                # transit duration [days]
+                'dura': ['unif', 1. / 24., 6. / 24.], \
+                # orbital period [days]
+                'peri': ['unif', 1., 10.], \
+                # phase of the epoch of the first transit, in units of the period
+                'phas': ['unif', 0., 1.], \
+                # standard deviation of the white noise
+                'nois': ['logt', 1e-3, 1e-2], \
+               }
+
+# names of the generative parameters
+## additional parameters used by custom transit shapes or noise spectra (e.g., 'alphnois' of retr_psddpowr) can be given in dictdist
+## and are drawn after these
+liststrgpara = ['dept', 'dura', 'peri', 'phas', 'nois']
+
+# default power-law index of the power spectral density of the colored noise
+alphnoisdefa = 1.
+
+# default quadratic limb-darkening coefficients and impact parameter of the limb-darkened transits
+## can be drawn per curve by giving 'ldc1', 'ldc2' and 'impa' in dictdist
+ldc1defa = 0.4
+ldc2defa = 0.25
+impadefa = 0.
+
+# number of curves generated in a single broadcast operation
+numbdatablok = 256
+
+# number of curves in a shard of the parallel generation
+## shards, and hence the generated data set, do not depend on the number of workers
+numbdatashrd = 4096
+
+# number of points at which the transit profile is averaged within each bin of the folded-domain simulator
+numbsubsbins = 8
+
+
+def retr_dist(rng, listdist, numbdata):
+    """
+    Draws numbdata samples from a distribution given in the format of dictdistdefa
+    """
+
+    strgtype = listdist[0]
+    if strgtype == 'fixd':
+        valu = np.full(numbdata, float(listdist[1]))
+    elif strgtype == 'unif':
+        valu = rng.uniform(listdist[1], listdist[2], size=numbdata)
+    elif strgtype == 'logt':
+        valu = np.exp(rng.uniform(np.log(listdist[1]), np.log(listdist[2]), size=numbdata))
+    elif strgtype == 'gaus':
+        valu = listdist[1] + listdist[2] * rng.standard_normal(numbdata)
+    else:
+        raise Exception('Unrecognized distribution type %s.' % strgtype)
+
+    return valu
+
+
+def retr_para(rng, numbdata, dictdist=None):
+    """
+    Draws the generative parameters of numbdata curves
+
+    dictdist: distributions overriding those in dictdistdefa
+    """
+
+    dictdisttemp = dict(dictdistdefa)
+    if dictdist is not None:
+        dictdisttemp.update(dictdist)
+
+    dictpara = {}
+    for strgpara in liststrgpara:
+        dictpara[strgpara] = retr_dist(rng, dictdisttemp[strgpara], numbdata)
+    for strgpara in dictdisttemp:
+        if not strgpara in liststrgpara:
+            dictpara[strgpara] = retr_dist(rng, dictdisttemp[strgpara], numbdata)
+
+    # epoch of the first transit [days]
+    dictpara['epoc'] = dictpara['phas'] * dictpara['peri']
+
+    return dictpara
+
+
+def retr_outppara(rng, numbplan, numbnois, dictdist=None):
+    """
+    Draws the labels and the generative parameters of the curves
+    """
+
+    numbdata = numbplan + numbnois
+
+    # labels, shuffled so that any slice of the data set has the same fraction of relevant curves on average
+    outp = np.zeros(numbdata)
+    outp[:numbplan] = 1.
+    rng.shuffle(outp)
+
+    dictpara = retr_para(rng, numbdata, dictdist=dictdist)
+    dictpara['dept'][outp == 0] = 0.
+
+    return outp, dictpara
+
+
+def retr_indxtran(cade, numbtime, dictpara, indxdata):
+    """
+    Finds the in-transit samples of the curves indxdata on the uniform time grid cade * np.arange(numbtime)
+
+    Only the in-transit samples are visited, so the cost is proportional to the duty cycle of the transits
+    rather than to the number of samples. Transits are assumed not to overlap, i.e., the duration is shorter than the period.
+
+    Returns, for each in-transit sample, the index of its curve, its time index and its time offset from mid-transit
+    in units of half the duration (between -1 and 1).
+    """
+
+    peri = dictpara['peri'][indxdata]
+    epoc = dictpara['epoc'][indxdata]
+    dura = dictpara['dura'][indxdata]
+    timemaxm = cade * (numbtime - 1)
+
+    # indices of the first and last transits overlapping the time grid
+    indxtranminm = np.ceil((-0.5 * dura - epoc) / peri).astype(int)
+    indxtranmaxm = np.floor((timemaxm + 0.5 * dura - epoc) / peri).astype(int)
+    numbtran = np.maximum(indxtranmaxm - indxtranminm + 1, 0)
+
+    # mid-transit times of all transits
+    indxdatatran = np.repeat(np.arange(indxdata.size), numbtran)
+    offstran = np.cumsum(numbtran) - numbtran
+    indxtran = indxtranminm[indxdatatran] + np.arange(indxdatatran.size) - offstran[indxdatatran]
+    timetran = epoc[indxdatatran] + indxtran * peri[indxdatatran]
+    duratran = dura[indxdatatran]
+
+    # range of the time indices of each transit
+    indxtimeinit = np.maximum(np.ceil((timetran - 0.5 * duratran) / cade).astype(int), 0)
+    indxtimefinl = np.minimum(np.floor((timetran + 0.5 * duratran) / cade).astype(int), numbtime - 1)
+    numbsamp = np.maximum(indxtimefinl - indxtimeinit + 1, 0)
+
+    # expand into in-transit samples
+    indxtransamp = np.repeat(np.arange(indxdatatran.size), numbsamp)
+    offssamp = np.cumsum(numbsamp) - numbsamp
+    indxtimesamp = indxtimeinit[indxtransamp] + np.arange(indxtransamp.size) - offssamp[indxtransamp]
+    indxdatasamp = indxdata[indxdatatran[indxtransamp]]
+    offstime = (cade * indxtimesamp - timetran[indxtransamp]) / (0.5 * duratran[indxtransamp])
+
+    return indxdatasamp, indxtimesamp, offstime
+
+
+def retr_shapbox(offstime, dictpara, indxdatasamp):
+    """
+    Returns the fractional flux decrement of a box-shaped transit at the in-transit samples
+    """
+
+    return dictpara['dept'][indxdatasamp]
+
+
+def retr_paradefa(dictpara, strgpara, valudefa, indxdata):
+
+    if strgpara in dictpara:
+        return dictpara[strgpara][indxdata]
+
+    return np.full(indxdata.size, valudefa)
+
+
+def retr_shapldqd(offstime, dictpara, indxdatasamp):
+    """
+    Returns the fractional flux decrement of a transit across a star with quadratic limb darkening at the in-transit samples,
+    in the small-planet approximation
+
+    The planet is treated as a point occulting the local surface brightness of the star, so that the decrement is the depth
+    times the ratio of the brightness at the projected separation of the planet to the mean brightness of the disk. The depth is
+    that of a planet of the same size across a uniform disk, such that the decrement is linear in the depth (as assumed by the
+    common random numbers of retr_datamockcomm). The duration is that of the chord across the disk at the impact parameter.
+    """
+
+    ldc1 = retr_paradefa(dictpara, 'ldc1', ldc1defa, indxdatasamp)
+    ldc2 = retr_paradefa(dictpara, 'ldc2', ldc2defa, indxdatasamp)
+    impa = np.minimum(np.abs(retr_paradefa(dictpara, 'impa', impadefa, indxdatasamp)), 1.)
+
+    # projected separation in units of the stellar radius
+    sepasqrd = impa**2 + (1. - impa**2) * offstime**2
+    cosi = np.sqrt(np.maximum(1. - sepasqrd, 0.))
+
+    brgt = 1. - ldc1 * (1. - cosi) - ldc2 * (1. - cosi)**2
+    brgtmean = 1. - ldc1 / 3. - ldc2 / 6.
+
+    return dictpara['dept'][indxdatasamp] * brgt / brgtmean
+
+
+def retr_fluxtran(cade, numbtime, dictpara, indxdata=None, funcshap=retr_shapldqd):
+    """
+    Evaluates the noiseless transit light curves of the curves indxdata (all curves by default) on the uniform time grid
+    cade * np.arange(numbtime)
+
+    Only the in-transit samples are evaluated by funcshap, after which they are scattered into the (numbdata, numbtime) grid.
+
+    Returns the (numbdata, numbtime) float32 relative flux.
+    """
+
+    if indxdata is not None:
+        dictpara = dict((strgpara, valu[indxdata]) for strgpara, valu in dictpara.items())
+
+    flux = np.ones((dictpara['dept'].size, numbtime), dtype=np.float32)
+
+    indxdatatran = np.where(dictpara['dept'] > 0)[0]
+    if indxdatatran.size > 0:
+        indxdatasamp, indxtimesamp, offstime = retr_indxtran(cade, numbtime, dictpara, indxdatatran)
+        flux[indxdatasamp, indxtimesamp] -= funcshap(offstime, dictpara, indxdatasamp).astype(np.float32)
+
+    return flux
+
+
+def retr_psddpowr(freq, dictpara, indxdata):
+    """
+    Returns the power spectral density of power-law (1 / f^alphnois) noise, where the index alphnois is taken from the generative
+    parameters if drawn, and is alphnoisdefa otherwise
+    """
+
+    freq = freq.astype(np.float32)
+
+    if 'alphnois' in dictpara:
+        alph = dictpara['alphnois'][indxdata, None].astype(np.float32)
+        psdd = np.zeros((indxdata.size, freq.size), dtype=np.float32)
+        psdd[:, 1:] = freq[None, 1:]**(-alph)
+    else:
+        # the same spectrum for all curves
+        psdd = np.zeros(freq.size, dtype=np.float32)
+        psdd[1:] = freq[1:]**np.float32(-alphnoisdefa)
+
+    return psdd
+
+
+def retr_noiscolr(rng, cade, dictpara, indxdata, numbtime, funcpsdd=retr_psddpowr):
+    """
+    Draws unit-variance colored noise for the curves indxdata
+
+    The Fourier coefficients of all curves are drawn at once as complex Gaussians, shaped by the square root of the power spectral
+    density and transformed back with a single irfft over the (numbdata, numbtime) matrix. This is equivalent to, but cheaper than,
+    shaping the rfft of white noise, since only one transform is needed.
+
+    funcpsdd: function returning the (numbfreq) or (indxdata.size, numbfreq) power spectral density, up to a normalization, given the
+              frequencies of np.fft.rfftfreq [1/days], the generative parameters and the indices of the curves
+
+    Returns the (indxdata.size, numbtime) float32 noise.
+    """
+
+    freq = np.fft.rfftfreq(numbtime, d=cade)
+    numbfreq = freq.size
+
+    psdd = np.asarray(funcpsdd(freq, dictpara, indxdata), dtype=np.float32)
+
+    # variance of each sample is the weighted sum of the powers, where the real-valued zero and Nyquist frequencies count once
+    weig = np.full(numbfreq, 4., dtype=np.float32)
+    weig[0] = 1.
+    if numbtime % 2 == 0:
+        weig[-1] = 1.
+    ampl = np.sqrt(psdd)
+    ampl *= (numbtime / np.sqrt(np.dot(psdd, weig)))[..., None]
+
+    # the coefficients are scaled in place, in float32 throughout
+    coef = rng.standard_normal((indxdata.size, numbfreq, 2), dtype=np.float32).view(np.complex64)[:, :, 0]
+    coef *= ampl
+
+    return np.fft.irfft(coef, n=numbtime, axis=1)
+
+
+def retr_datamock(numbplan=100, numbnois=100, numbtime=20000, cade=cadedefa, dictdist=None, seed=None, pathmemm=None, funcshap=retr_shapbox, \
+                                                                                                                            funcpsdd=None):
+    """
+    Generates mock light curves, a fraction of which contain transits
+
+    numbplan: number of curves with transits (relevant)
+    numbnois: number of curves without transits (irrelevant)
+    numbtime: number of time samples per curve
+    cade: cadence [days]
+    dictdist: distributions of the generative parameters overriding those in dictdistdefa. The depth dept is the fractional
+              transit depth, i.e., one minus the relative flux during the transit, which is the depth of the sweeps of main.py
+              and sup1DCNN.py (e.g., a depth of 1e-2 corresponds to a relative flux of 0.99 during the transit).
+    seed: seed of the random number generator
+    pathmemm: if not None, the curves are written to a memory-mapped .npy file at this path
+    funcshap: function returning the fractional flux decrement at the in-transit samples, given their time offsets from
+              mid-transit in units of half the duration, the generative parameters and the indices of their curves
+    funcpsdd: if not None, the noise is colored with this power spectral density (see retr_noiscolr), and white otherwise.
+              In both cases, its standard deviation is nois.
+
+    Returns the time grid, the (numbdata, numbtime) float32 flux, the labels and a dictionary of the generative parameters of
+    each curve. Curves without transits have zero depth, but retain a period and epoch so that they can be folded.
+    """
+
+    rng = np.random.default_rng(seed)
+
+    numbdata = numbplan + numbnois
+    time = cade * np.arange(numbtime)
+
+    outp, dictpara = retr_outppara(rng, numbplan, numbnois, dictdist=dictdist)
+
+    flux = retr_fluxbuff(numbdata, numbtime, pathmemm=pathmemm)
+
+    fill_fluxmock(rng, flux, dictpara, cade, funcshap=funcshap, funcpsdd=funcpsdd)
+
+    if pathmemm is not None:
+        flux.flush()
+
+    return time, flux, outp, dictpara
+
+
+def retr_fluxbuff(numbdata, numbtime, pathmemm=None):
+    """
+    Allocates the float32 buffer of the flux, memory-mapped to a .npy file if pathmemm is not None
+    """
+
+    if pathmemm is None:
+        flux = np.empty((numbdata, numbtime), dtype=np.float32)
+    else:
+        print('Writing to %s...' % pathmemm)
+        flux = np.lib.format.open_memmap(pathmemm, mode='w+', dtype=np.float32, shape=(numbdata, numbtime))
+
+    return flux
+
+
+def fill_fluxmock(rng, flux, dictpara, cade, funcshap=retr_shapbox, funcpsdd=None):
+    """
+    Fills the (numbdata, numbtime) buffer flux with the mock curves of the generative parameters dictpara, block by block
+    """
+
+    numbdata, numbtime = flux.shape
+
+    for indxinit in range(0, numbdata, numbdatablok):
+        indxdata = np.arange(indxinit, min(indxinit + numbdatablok, numbdata))
+        fluxblok = flux[indxdata[0]:indxdata[-1]+1, :]
+
+        # noise
+        if funcpsdd is None:
+            rng.standard_normal(out=fluxblok, dtype=np.float32)
+        else:
+            fluxblok[:] = retr_noiscolr(rng, cade, dictpara, indxdata, numbtime, funcpsdd=funcpsdd)
+        fluxblok *= dictpara['nois'][indxdata, None].astype(np.float32)
+        fluxblok += 1.
+
+        # transits
+        indxdatatran = indxdata[dictpara['dept'][indxdata] > 0]
+        if indxdatatran.size > 0:
+            indxdatasamp, indxtimesamp, offstime = retr_indxtran(cade, numbtime, dictpara, indxdatatran)
+            fluxblok[indxdatasamp - indxinit, indxtimesamp] -= funcshap(offstime, dictpara, indxdatasamp).astype(np.float32)
+
+
+def retr_datamockpara(numbplan=100, numbnois=100, numbtime=20000, cade=cadedefa, dictdist=None, seed=None, pathmemm=None, \
+                                                                                    funcshap=retr_shapbox, funcpsdd=None, numbwork=1):
+    """
+    Generates mock light curves in parallel, reproducibly for any number of workers
+
+    The data set is split into shards of numbdatashrd curves. Each shard gets its own child stream spawned from the seed,
+    draws its labels and generative parameters, and writes its curves into its slice of the buffer. Since neither the shards
+    nor their streams depend on numbwork, the output is bitwise identical for any number of workers.
+    Workers are threads, as the random number generation and the array arithmetic release the GIL.
+
+    The arguments are the same as those of retr_datamock, where numbwork is the number of workers.
+    Note that, for the same seed, the data set differs from that generated by retr_datamock.
+    """
+
+    numbdata = numbplan + numbnois
+    time = cade * np.arange(numbtime)
+
+    # shards and their numbers of relevant curves
+    numbshrd = max(1, int(np.ceil(numbdata / float(numbdatashrd))))
+    indxdatashrd = np.minimum(np.arange(numbshrd + 1) * numbdatashrd, numbdata)
+    numbplanshrd = np.diff(np.round(np.linspace(0., numbplan, numbshrd + 1)).astype(int))
+
+    listseedshrd = np.random.SeedSequence(seed).spawn(numbshrd)
+
+    flux = retr_fluxbuff(numbdata, numbtime, pathmemm=pathmemm)
+    outp = np.empty(numbdata)
+    dictpara = {}
+
+    def retr_shrd(n):
+        rng = np.random.default_rng(listseedshrd[n])
+        indxinit = indxdatashrd[n]
+        indxfinl = indxdatashrd[n+1]
+        outpshrd, dictparashrd = retr_outppara(rng, numbplanshrd[n], indxfinl - indxinit - numbplanshrd[n], dictdist=dictdist)
+        fill_fluxmock(rng, flux[indxinit:indxfinl, :], dictparashrd, cade, funcshap=funcshap, funcpsdd=funcpsdd)
+        return outpshrd, dictparashrd
+
+    with ThreadPoolExecutor(max_workers=numbwork) as objtexec:
+        listshrd = list(objtexec.map(retr_shrd, range(numbshrd)))
+
+    for n, (outpshrd, dictparashrd) in enumerate(listshrd):
+        outp[indxdatashrd[n]:indxdatashrd[n+1]] = outpshrd
+        for strgpara, valu in dictparashrd.items():
+            if not strgpara in dictpara:
+                dictpara[strgpara] = np.empty(numbdata)
+            dictpara[strgpara][indxdatashrd[n]:indxdatashrd[n+1]] = valu
+
+    if pathmemm is not None:
+        flux.flush()
+
+    return time, flux, outp, dictpara
+
+
+def chec_datamockpara(numbplan=3000, numbnois=3000, numbtime=2000, listnumbwork=[1, 2, 4], seed=0):
+    """
+    Checks that the parallel generation returns bitwise identical data sets for all numbers of workers in listnumbwork
+    """
+
+    listdata = [retr_datamockpara(numbplan=numbplan, numbnois=numbnois, numbtime=numbtime, seed=seed, numbwork=numbwork) \
+                                                                                                for numbwork in listnumbwork]
+
+    boolgood = True
+    for time, flux, outp, dictpara in listdata[1:]:
+        boolgood &= np.array_equal(flux, listdata[0][1]) and np.array_equal(outp, listdata[0][2])
+        for strgpara in dictpara:
+            boolgood &= np.array_equal(dictpara[strgpara], listdata[0][3][strgpara])
+
+    return boolgood
+
+
+def retr_fluxflbndire(rng, dictpara, indxdata, wdth, numbbins, numbsamp, funcshap=retr_shapbox, boolnois=True):
+    """
+    Simulates the binned flux of the folded curves indxdata directly in phase space
+
+    The flux in each bin is the transit profile averaged over numbsubsbins points in the bin, evaluated only in the bins
+    overlapping the transit, plus white noise whose standard deviation is that of a single sample divided by the square root
+    of the number of samples that would fall in the bin.
+
+    wdth: (numbdata) width of the binned window around mid-transit [days]
+    numbsamp: (numbdata) expected number of raw samples per bin
+    """
+
+    dura = dictpara['dura'][indxdata]
+    dept = dictpara['dept'][indxdata]
+
+    # range of the bins overlapping the transit of each curve
+    fracdura = 0.5 * dura / wdth
+    indxbinsinit = np.maximum(np.floor((0.5 - fracdura) * numbbins).astype(int), 0)
+    indxbinsfinl = np.minimum(np.ceil((0.5 + fracdura) * numbbins).astype(int) - 1, numbbins - 1)
+    numbbinstran = np.where(dept > 0, np.maximum(indxbinsfinl - indxbinsinit + 1, 0), 0)
+
+    # expand into the bins overlapping the transits
+    indxdatabins = np.repeat(np.arange(indxdata.size), numbbinstran)
+    offsbins = np.cumsum(numbbinstran) - numbbinstran
+    indxbinstran = indxbinsinit[indxdatabins] + np.arange(indxdatabins.size) - offsbins[indxdatabins]
+
+    # time from mid-transit of the points in these bins, in units of half the duration
+    offstime = ((indxbinstran[:, None] + (np.arange(numbsubsbins)[None, :] + 0.5) / numbsubsbins) / numbbins - 0.5) * \
+                                                                                        (wdth / (0.5 * dura))[indxdatabins, None]
+
+    boolintr = np.abs(offstime) < 1.
+    indxdatasamp = np.broadcast_to(indxdata[indxdatabins, None], offstime.shape)[boolintr]
+    fluxtran = np.zeros(offstime.shape)
+    fluxtran[boolintr] = funcshap(offstime[boolintr], dictpara, indxdatasamp)
+
+    fluxflbn = np.ones((indxdata.size, numbbins), dtype=np.float32)
+    fluxflbn[indxdatabins, indxbinstran] -= np.mean(fluxtran, 1).astype(np.float32)
+
+    if boolnois:
+        # bins would be filled by at least one sample in the raw-then-fold path
+        stdv = dictpara['nois'][indxdata] / np.sqrt(np.maximum(numbsamp, 1.))
+        fluxflbn += (stdv[:, None] * rng.standard_normal((indxdata.size, numbbins))).astype(np.float32)
+
+    return fluxflbn
+
+
+def retr_datamockflbn(numbplan=100, numbnois=100, numbtime=20000, cade=cadedefa, numbbinslocl=200, numbbinsglob=2000, dictdist=None, seed=None, \
+                                                                                                funcshap=retr_shapbox, boolnois=True):
+    """
+    Generates the local and global views of mock light curves directly in phase space, skipping the generation of
+    the raw curves and their folding and binning
+
+    The arguments are the same as those of retr_datamock, where numbtime and cade now only set the baseline,
+    which determines the number of raw samples that would fall in each bin. For the same seed, the labels and the generative
+    parameters are identical to those drawn by retr_datamock.
+
+    Returns the bin centers and the (numbdata, numbbins) float32 views, as returned by flbn.retr_viewloclglob,
+    the labels and a dictionary of the generative parameters of each curve.
+    """
+
+    rng = np.random.default_rng(seed)
+
+    numbdata = numbplan + numbnois
+
+    outp, dictpara = retr_outppara(rng, numbplan, numbnois, dictdist=dictdist)
+
+    inptlocl = np.empty((numbdata, numbbinslocl), dtype=np.float32)
+    inptglob = np.empty((numbdata, numbbinsglob), dtype=np.float32)
+
+    for indxinit in range(0, numbdata, numbdatablok):
+        indxdata = np.arange(indxinit, min(indxinit + numbdatablok, numbdata))
+
+        peri = dictpara['peri'][indxdata]
+        wdthlocl = flbn.wdthloclfact * dictpara['dura'][indxdata]
+
+        # expected number of raw samples per bin
+        numbsampglob = np.full(indxdata.size, numbtime / float(numbbinsglob))
+        numbsamplocl = numbtime * wdthlocl / (peri * numbbinslocl)
+
+        inptlocl[indxdata, :] = retr_fluxflbndire(rng, dictpara, indxdata, wdthlocl, numbbinslocl, numbsamplocl, funcshap=funcshap, boolnois=boolnois)
+        inptglob[indxdata, :] = retr_fluxflbndire(rng, dictpara, indxdata, peri, numbbinsglob, numbsampglob, funcshap=funcshap, boolnois=boolnois)
+
+    phaslocl = (np.arange(numbbinslocl) + 0.5) / numbbinslocl - 0.5
+    phasglob = (np.arange(numbbinsglob) + 0.5) / numbbinsglob - 0.5
+
+    return phaslocl, phasglob, inptlocl, inptglob, outp, dictpara
+
+
+def chec_datamockflbn(numbplan=500, numbnois=500, numbtime=20000, cade=cadedefa, numbbinslocl=200, numbbinsglob=2000, dictdist=None, seed=0, \
+                                                                                                funcshap=retr_shapbox, maxmzsco=5., maxmdevistdv=0.1):
+    """
+    Statistically checks that the folded-domain simulator matches generating the raw curves, then folding and binning them
+
+    Both paths are run with the same seed, hence with the same labels and generative parameters, and their residuals with
+    respect to the noiseless folded-domain profile are compared for each view.
+
+    maxmzsco: maximum allowed z-score of the mean residual
+    maxmdevistdv: maximum allowed fractional deviation of the median ratio of the per-curve standard deviations of the residuals
+
+    Returns True if both views pass and a dictionary of the statistics.
+    """
+
+    time, flux, outp, dictpara = retr_datamock(numbplan=numbplan, numbnois=numbnois, numbtime=numbtime, cade=cade, dictdist=dictdist, \
+                                                                                                        seed=seed, funcshap=funcshap)
+    inptloclraww, inptglobraww, phaslocl, phasglob = flbn.retr_viewloclglob(time, flux, dictpara['peri'], dictpara['epoc'], dictpara['dura'], \
+                                                                                numbbinslocl=numbbinslocl, numbbinsglob=numbbinsglob)
+
+    phaslocl, phasglob, inptlocldire, inptglobdire, outp, dictpara = retr_datamockflbn(numbplan=numbplan, numbnois=numbnois, numbtime=numbtime, \
+                                    cade=cade, numbbinslocl=numbbinslocl, numbbinsglob=numbbinsglob, dictdist=dictdist, seed=seed, funcshap=funcshap)
+
+    phaslocl, phasglob, inptloclmodl, inptglobmodl, outp, dictpara = retr_datamockflbn(numbplan=numbplan, numbnois=numbnois, numbtime=numbtime, \
+                      cade=cade, numbbinslocl=numbbinslocl, numbbinsglob=numbbinsglob, dictdist=dictdist, seed=seed, funcshap=funcshap, boolnois=False)
+
+    boolgood = True
+    dictstat = {}
+    for strgview, inptraww, inptdire, inptmodl in [['locl', inptloclraww, inptlocldire, inptloclmodl], \
+                                                   ['glob', inptglobraww, inptglobdire, inptglobmodl]]:
+        dictstat[strgview] = {}
+        for strgpath, inpt in [['raww', inptraww], ['dire', inptdire]]:
+            resi = inpt.astype(float) - inptmodl
+            dictstat[strgview]['zsco' + strgpath] = np.mean(resi) / (np.std(resi) / np.sqrt(resi.size))
+            dictstat[strgview]['stdv' + strgpath] = np.std(resi, 1)
+        dictstat[strgview]['ratistdv'] = np.median(dictstat[strgview]['stdvraww'] / dictstat[strgview]['stdvdire'])
+
+        boolgoodview = abs(dictstat[strgview]['zscoraww']) < maxmzsco and abs(dictstat[strgview]['zscodire']) < maxmzsco and \
+                                                                                abs(dictstat[strgview]['ratistdv'] - 1.) < maxmdevistdv
+        print('%s view: z-score of the mean residual of the raw-then-fold path: %.3g, of the folded-domain simulator: %.3g, ' \
+                                    'median ratio of the standard deviations: %.3g' % (strgview, dictstat[strgview]['zscoraww'], \
+                                                                    dictstat[strgview]['zscodire'], dictstat[strgview]['ratistdv']))
+        boolgood = boolgood and boolgoodview
+
+    return boolgood, dictstat
+
+
+def retr_datamockcomm(numbplan=100, numbnois=100, numbtime=20000, cade=cadedefa, dictdist=None, seed=None, funcshap=retr_shapbox, \
+                                                        boolflbn=False, numbbinslocl=200, numbbinsglob=2000, pathmemm=None, funcpsdd=None):
+    """
+    Draws the common random numbers of a depth and noise sweep: unit-variance noise and unit-depth transit templates,
+    from which the data set of any grid point is built by retr_datamockgrid with an affine scaling
+
+    The distributions of the depth and noise in dictdist are ignored. The remaining arguments are the same as those of
+    retr_datamock, or of retr_datamockflbn if boolflbn is True, where colored noise (funcpsdd) is only available for raw curves.
+
+    Returns a dictionary holding the common random numbers.
+    """
+
+    dictdisttemp = {}
+    if dictdist is not None:
+        dictdisttemp.update(dictdist)
+    dictdisttemp['dept'] = ['fixd', 1.]
+    dictdisttemp['nois'] = ['fixd', 1.]
+
+    if boolflbn and funcpsdd is not None:
+        raise Exception('Colored noise cannot be drawn in the folded domain.')
+
+    dictcomm = {}
+
+    if boolflbn:
+        # the decrement is linear in the depth, so that the noiseless views with unit depth give the templates
+        # and the difference of the noisy and noiseless views gives the noise
+        for boolnois in [False, True]:
+            phaslocl, phasglob, inptlocl, inptglob, outp, dictpara = retr_datamockflbn(numbplan=numbplan, numbnois=numbnois, numbtime=numbtime, \
+                                            cade=cade, numbbinslocl=numbbinslocl, numbbinsglob=numbbinsglob, dictdist=dictdisttemp, seed=seed, \
+                                                                                                    funcshap=funcshap, boolnois=boolnois)
+            if boolnois:
+                dictcomm['noisunitlocl'] = inptlocl - (1. - dictcomm['tmpllocl'])
+                dictcomm['noisunitglob'] = inptglob - (1. - dictcomm['tmplglob'])
+            else:
+                dictcomm['tmpllocl'] = 1. - inptlocl
+                dictcomm['tmplglob'] = 1. - inptglob
+        dictcomm['phaslocl'] = phaslocl
+        dictcomm['phasglob'] = phasglob
+
+    else:
+        rng = np.random.default_rng(seed)
+
+        numbdata = numbplan + numbnois
+        dictcomm['time'] = cade * np.arange(numbtime)
+
+        outp, dictpara = retr_outppara(rng, numbplan, numbnois, dictdist=dictdisttemp)
+
+        if pathmemm is None:
+            noisunit = np.empty((numbdata, numbtime), dtype=np.float32)
+        else:
+            print('Writing to %s...' % pathmemm)
+            noisunit = np.lib.format.open_memmap(pathmemm, mode='w+', dtype=np.float32, shape=(numbdata, numbtime))
+        for indxinit in range(0, numbdata, numbdatablok):
+            if funcpsdd is None:
+                rng.standard_normal(out=noisunit[indxinit:indxinit+numbdatablok, :], dtype=np.float32)
+            else:
+                indxdata = np.arange(indxinit, min(indxinit + numbdatablok, numbdata))
+                noisunit[indxinit:indxinit+numbdatablok, :] = retr_noiscolr(rng, cade, dictpara, indxdata, numbtime, funcpsdd=funcpsdd)
+        dictcomm['noisunit'] = noisunit
+
+        # in-transit samples of the unit-depth transits
+        indxdatatran = np.where(dictpara['dept'] > 0)[0]
+        indxdatasamp, indxtimesamp, offstime = retr_indxtran(cade, numbtime, dictpara, indxdatatran)
+        dictcomm['indxdatasamp'] = indxdatasamp
+        dictcomm['indxtimesamp'] = indxtimesamp
+        dictcomm['shapunit'] = funcshap(offstime, dictpara, indxdatasamp).astype(np.float32)
+
+    dictcomm['outp'] = outp
+    dictcomm['dictpara'] = dictpara
+
+    return dictcomm
+
+
+def retr_datamockgrid(dictcomm, dept, nois):
+    """
+    Builds the data set of a grid point of a depth and noise sweep from the common random numbers returned by retr_datamockcomm
+
+    dept: fractional transit depth (see retr_datamock)
+
+    Returns the same as retr_datamock, or as retr_datamockflbn if the common random numbers were drawn in the folded domain.
+    """
+
+    outp = dictcomm['outp']
+
+    dictpara = dict(dictcomm['dictpara'])
+    dictpara['dept'] = dept * outp
+    dictpara['nois'] = np.full(outp.size, float(nois))
+
+    if 'noisunit' in dictcomm:
+        flux = np.multiply(dictcomm['noisunit'], np.float32(nois))
+        flux += 1.
+        flux[dictcomm['indxdatasamp'], dictcomm['indxtimesamp']] -= np.float32(dept) * dictcomm['shapunit']
+
+        return dictcomm['time'], flux, outp, dictpara
+
+    inptlocl = 1. - np.float32(dept) * dictcomm['tmpllocl'] + np.float32(nois) * dictcomm['noisunitlocl']
+    inptglob = 1. - np.float32(dept) * dictcomm['tmplglob'] + np.float32(nois) * dictcomm['noisunitglob']
+
+    return dictcomm['phaslocl'], dictcomm['phasglob'], inptlocl, inptglob, outp, dictpara
@@ -0,0 +1,153 @@
+import numpy as np
+
+import keras
+import tensorflow as tf
+
+import mockdata
+import flbn
+
+
+"""
+Infinite stream of mock local and global views
+
+Batches of mock curves are synthesized, folded and binned on demand inside the input pipeline, so that training on
+unlimited mock data uses constant memory. Each batch is generated from its own seed, derived from the seed of the stream,
+the epoch and the batch index, so that the batches do not depend on which worker produces them, and every epoch sees
+fresh data.
+"""
+
+
+class mockstrm(keras.utils.Sequence):
+    """
+    Keras Sequence of mock batches
+
+    numbdatabtch: number of curves in a batch
+    numbbtch: number of batches per epoch
+    fracplan: fraction of curves with transits
+    numbtime: number of time samples of the raw curves
+    numbbinslocl, numbbinsglob: number of bins of the local and global views
+    strgview: 'locl' or 'glob' to return a single view, 'both' to return [locl, glob] for two-input models
+    dictdist: distributions of the generative parameters, see mockdata.dictdistdefa
+    funcshap: transit shape, see mockdata.retr_datamock
+    funcpsdd: power spectral density of the colored noise, see mockdata.retr_noiscolr, or None for white noise
+    seed: seed of the stream
+    """
+
+    def __init__(self, numbdatabtch=64, numbbtch=100, fracplan=0.5, numbtime=20000, numbbinslocl=200, numbbinsglob=2000, \
+                                    strgview='both', dictdist=None, funcshap=mockdata.retr_shapbox, funcpsdd=None, seed=0):
+
+        self.numbdatabtch = numbdatabtch
+        self.numbbtch = numbbtch
+        self.fracplan = fracplan
+        self.numbtime = numbtime
+        self.numbbinslocl = numbbinslocl
+        self.numbbinsglob = numbbinsglob
+        self.strgview = strgview
+        self.dictdist = dictdist
+        self.funcshap = funcshap
+        self.funcpsdd = funcpsdd
+        self.seed = seed
+        self.epoc = 0
+
+    def __len__(self):
+
+        return self.numbbtch
+
+    def retr_btch(self, numbdata, listseed):
+        """
+        Generates, folds and bins numbdata curves with the seed sequence entropy listseed
+        """
+
+        seedseqn = np.random.SeedSequence(listseed)
+        rng = np.random.default_rng(seedseqn)
+
+        numbplan = rng.binomial(numbdata, self.fracplan)
+        time, flux, outp, dictpara = mockdata.retr_datamock(numbplan=numbplan, numbnois=numbdata - numbplan, numbtime=self.numbtime, \
+                                                    dictdist=self.dictdist, seed=seedseqn.spawn(1)[0], \
+                                                                                    funcshap=self.funcshap, funcpsdd=self.funcpsdd)
+
+        inptlocl, inptglob, phaslocl, phasglob = flbn.retr_viewloclglob(time, flux, dictpara['peri'], dictpara['epoc'], dictpara['dura'], \
+                                                                numbbinslocl=self.numbbinslocl, numbbinsglob=self.numbbinsglob)
+
+        return inptlocl, inptglob, phaslocl, phasglob, outp
+
+    def retr_inpt(self, inptlocl, inptglob):
+
+        if self.strgview == 'locl':
+            return inptlocl[:, :, None]
+        if self.strgview == 'glob':
+            return inptglob[:, :, None]
+
+        return [inptlocl[:, :, None], inptglob[:, :, None]]
+
+    def retr_btchepoc(self, epoc, indxbtch):
+
+        inptlocl, inptglob, phaslocl, phasglob, outp = self.retr_btch(self.numbdatabtch, [self.seed, epoc, indxbtch])
+
+        return self.retr_inpt(inptlocl, inptglob), outp
+
+    def __getitem__(self, indxbtch):
+
+        return self.retr_btchepoc(self.epoc, indxbtch)
+
+    def on_epoch_end(self):
+
+        # move on to fresh batches
+        self.epoc += 1
+
+    def retr_datafixd(self, numbdata):
+        """
+        Returns a fixed data set of numbdata curves, drawn from a stream independent of the training batches, e.g., for validation
+
+        Returns the bin centers and views of the requested strgview (phas and inpt are lists of [locl, glob] if strgview is 'both')
+        and the labels.
+        """
+
+        inptlocl, inptglob, phaslocl, phasglob, outp = self.retr_btch(numbdata, [self.seed, 2**31 - 1])
+
+        if self.strgview == 'locl':
+            return phaslocl, inptlocl, outp
+        if self.strgview == 'glob':
+            return phasglob, inptglob, outp
+
+        return [phaslocl, phasglob], [inptlocl, inptglob], outp
+
+
+def retr_datatfdt(strm, numbpara=tf.data.experimental.AUTOTUNE):
+    """
+    Returns a tf.data.Dataset that produces the batches of the stream strm in parallel and prefetches them
+
+    numbpara: number of batches produced in parallel
+    """
+
+    def retr_btchnump(indxbtch):
+        # running batch index, where each pass over len(strm) batches is a new epoch of the stream
+        epoc, indxbtch = divmod(int(indxbtch), len(strm))
+        inpt, outp = strm.retr_btchepoc(epoc, indxbtch)
+        if isinstance(inpt, list):
+            return tuple(inpt) + (outp.astype(np.float32), )
+        return inpt, outp.astype(np.float32)
+
+    # static shapes of the outputs, which tf.numpy_function does not infer, such that the models can be built on the dataset
+    if strm.strgview == 'both':
+        listshap = [[strm.numbdatabtch, strm.numbbinslocl, 1], [strm.numbdatabtch, strm.numbbinsglob, 1]]
+    elif strm.strgview == 'locl':
+        listshap = [[strm.numbdatabtch, strm.numbbinslocl, 1]]
+    else:
+        listshap = [[strm.numbdatabtch, strm.numbbinsglob, 1]]
+    listshap.append([strm.numbdatabtch])
+    listtype = [tf.float32] * len(listshap)
+
+    def retr_btchtens(indxbtch):
+        listtens = tf.numpy_function(retr_btchnump, [indxbtch], listtype)
+        for tens, shap in zip(listtens, listshap):
+            tens.set_shape(shap)
+        if strm.strgview == 'both':
+            return (listtens[0], listtens[1]), listtens[2]
+        return listtens[0], listtens[1]
+
+    data = tf.data.Dataset.range(np.iinfo(np.int64).max)
+    data = data.map(retr_btchtens, num_parallel_calls=numbpara)
+    data = data.prefetch(tf.data.experimental.AUTOTUNE)
+
+    return data
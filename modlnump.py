@@ -0,0 +1,343 @@
+import sys, json, time
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+import checweig
+import flbn
+
+
+"""
+NumPy-only forward pass of the classifiers, for scoring on CPU without importing TensorFlow and Keras
+
+The graph of a model is read from its Keras JSON architecture (e.g., the base file of a checkpoint store, see checstor) and its weights
+from the list of arrays returned by get_weights (e.g., a weight file of a checkpoint store). The supported layers are those of the
+models of models.py and main.py: InputLayer, Conv1D, SeparableConv1D, MaxPooling1D, GlobalMaxPool1D, Flatten, Dense, Dropout and Concatenate.
+
+A convolution is evaluated as a single matrix product of the kernel with the windows of its input (im2col), where the windows are
+strided views of the padded input, such that only the reshape of the windows into the rows of the product copies data. The batch
+is scored in blocks of numbdatablok samples so that the windows of a block stay in the cache.
+
+The checkpoint store is read through checweig rather than checstor, which imports Keras.
+"""
+
+
+# number of samples scored at once
+numbdatablok = 256
+
+# activation functions of the layers
+dictfuncactv = { \
+                'linear': lambda x: x, \
+                'relu': lambda x: np.maximum(x, 0.), \
+                'sigmoid': lambda x: 1. / (1. + np.exp(-x)), \
+                'tanh': np.tanh, \
+               }
+
+
+def retr_tuplconf(valu):
+    """
+    Returns the first element of a size or stride of the configuration of a layer, given either as a list or as an integer
+    """
+
+    if isinstance(valu, (list, tuple)):
+        return int(valu[0])
+
+    return int(valu)
+
+
+def retr_padd(numbtime, sizewind, stde, strgpadd):
+    """
+    Returns the numbers of samples padded before and after the time axis, following the convention of TensorFlow
+    """
+
+    if strgpadd == 'valid':
+        return 0, 0
+    if strgpadd == 'causal':
+        return sizewind - 1, 0
+
+    numbtimeoutp = -(-numbtime // stde)
+    numbpadd = max((numbtimeoutp - 1) * stde + sizewind - numbtime, 0)
+
+    return numbpadd // 2, numbpadd - numbpadd // 2
+
+
+def retr_wind(inpt, sizewind, stde, strgpadd, valupadd=0., dilt=1):
+    """
+    Returns the windows of the input along the time axis
+
+    inpt: (numbdata, numbtime, numbchan) input
+    Returns the (numbdata, numbtimeoutp, numbchan, sizewind) strided view of the windows.
+    """
+
+    sizewindeffe = (sizewind - 1) * dilt + 1
+    padd = retr_padd(inpt.shape[1], sizewindeffe, stde, strgpadd)
+    if padd != (0, 0):
+        inpt = np.pad(inpt, ((0, 0), padd, (0, 0)), constant_values=valupadd)
+
+    wind = sliding_window_view(inpt, sizewindeffe, axis=1)[:, ::stde]
+    if dilt > 1:
+        wind = wind[..., ::dilt]
+
+    return wind
+
+
+def eval_conv(inpt, kern, bias, stde=1, strgpadd='valid', dilt=1):
+    """
+    Returns the 1D convolution of the input with the kernel, evaluated as a matrix product of the windows of the input (im2col)
+
+    kern: (sizekern, numbchaninpt, numbchanoutp) kernel, as in Keras
+    """
+
+    sizekern, numbchaninpt, numbchanoutp = kern.shape
+
+    wind = retr_wind(inpt, sizekern, stde, strgpadd, dilt=dilt)
+    numbdata, numbtimeoutp = wind.shape[:2]
+
+    # rows of the windows, ordered as the flattened kernel
+    matrwind = wind.reshape((numbdata * numbtimeoutp, numbchaninpt * sizekern))
+    matrkern = kern.transpose((1, 0, 2)).reshape((numbchaninpt * sizekern, numbchanoutp))
+
+    outp = matrwind @ matrkern
+    if bias is not None:
+        outp += bias
+
+    return outp.reshape((numbdata, numbtimeoutp, numbchanoutp))
+
+
+def eval_sepa(inpt, kerndept, kern, bias, stde=1, strgpadd='valid', dilt=1):
+    """
+    Returns the depthwise-separable 1D convolution of the input, as a depthwise convolution of each channel followed by a pointwise
+    matrix product
+
+    kerndept: (sizekern, numbchaninpt, numbmult) depthwise kernel, as in Keras
+    kern: (1, numbchaninpt * numbmult, numbchanoutp) pointwise kernel, as in Keras
+    """
+
+    wind = retr_wind(inpt, kerndept.shape[0], stde, strgpadd, dilt=dilt)
+    numbdata, numbtimeoutp = wind.shape[:2]
+
+    # the outputs of the depthwise convolution are ordered by input channel and then by multiplier
+    outp = np.einsum('ntck,kcm->ntcm', wind, kerndept).reshape((numbdata, numbtimeoutp, -1)) @ kern[0]
+    if bias is not None:
+        outp += bias
+
+    return outp
+
+
+def eval_maxm(inpt, sizepool, stde, strgpadd='valid'):
+    """
+    Returns the max pooling of the input along the time axis
+    """
+
+    return np.max(retr_wind(inpt, sizepool, stde, strgpadd, valupadd=-np.inf), axis=-1)
+
+
+def retr_grap(strgarch, listweig):
+    """
+    Returns the graph of a model from its Keras JSON architecture and its weights, as a list of nodes in the order of evaluation
+
+    Each node is a dictionary of the class name, the name, the configuration, the names of the input layers and the weights of
+    a layer.
+    """
+
+    dictarch = json.loads(strgarch)
+    dictconf = dictarch['config']
+    boolsequ = dictarch['class_name'] == 'Sequential'
+    if isinstance(dictconf, list):
+        listdictlayr = dictconf
+    else:
+        listdictlayr = dictconf['layers']
+
+    listweig = [np.asarray(weig, dtype=np.float32) for weig in listweig]
+
+    grap = {'listnode': []}
+    if boolsequ:
+        grap['liststrginpt'] = ['input']
+    else:
+        grap['liststrginpt'] = [listinpt[0] for listinpt in dictconf['input_layers']]
+        grap['liststrgoutp'] = [listoutp[0] for listoutp in dictconf['output_layers']]
+
+    indxweig = 0
+    strgprev = 'input'
+    for dictlayr in listdictlayr:
+        node = {'clas': dictlayr['class_name'], 'conf': dictlayr['config']}
+        node['strg'] = dictlayr['config'].get('name', dictlayr.get('name'))
+
+        if node['clas'] == 'InputLayer':
+            if boolsequ:
+                node['strg'] = 'input'
+                strgprev = 'input'
+            continue
+
+        if boolsequ:
+            node['listinpt'] = [strgprev]
+        else:
+            node['listinpt'] = [listinbo[0] for listinbo in dictlayr['inbound_nodes'][0]]
+
+        if node['clas'] in ['Conv1D', 'SeparableConv1D', 'Dense']:
+            if node['clas'] == 'SeparableConv1D':
+                node['kerndept'] = listweig[indxweig]
+                indxweig += 1
+            node['kern'] = listweig[indxweig]
+            indxweig += 1
+            if node['conf'].get('use_bias', True):
+                node['bias'] = listweig[indxweig]
+                indxweig += 1
+            else:
+                node['bias'] = None
+        elif not node['clas'] in ['MaxPooling1D', 'GlobalMaxPool1D', 'GlobalMaxPooling1D', 'Flatten', 'Dropout', 'Concatenate']:
+            raise Exception('Layer %s of class %s is not supported.' % (node['strg'], node['clas']))
+
+        grap['listnode'].append(node)
+        strgprev = node['strg']
+
+    if boolsequ:
+        grap['liststrgoutp'] = [strgprev]
+
+    if indxweig != len(listweig):
+        raise Exception('The graph uses %d weight arrays, while %d were given.' % (indxweig, len(listweig)))
+
+    return grap
+
+
+def eval_node(node, listinpt):
+    """
+    Returns the output of a node for its inputs
+    """
+
+    conf = node['conf']
+
+    if node['clas'] == 'Conv1D':
+        outp = eval_conv(listinpt[0], node['kern'], node['bias'], stde=retr_tuplconf(conf.get('strides', 1)), \
+                                        strgpadd=conf.get('padding', 'valid'), dilt=retr_tuplconf(conf.get('dilation_rate', 1)))
+    elif node['clas'] == 'SeparableConv1D':
+        outp = eval_sepa(listinpt[0], node['kerndept'], node['kern'], node['bias'], stde=retr_tuplconf(conf.get('strides', 1)), \
+                                        strgpadd=conf.get('padding', 'valid'), dilt=retr_tuplconf(conf.get('dilation_rate', 1)))
+    elif node['clas'] == 'Dense':
+        outp = listinpt[0] @ node['kern']
+        if node['bias'] is not None:
+            outp += node['bias']
+    elif node['clas'] == 'MaxPooling1D':
+        sizepool = retr_tuplconf(conf.get('pool_size', 2))
+        stde = conf.get('strides', None)
+        stde = sizepool if stde is None else retr_tuplconf(stde)
+        return eval_maxm(listinpt[0], sizepool, stde, strgpadd=conf.get('padding', 'valid'))
+    elif node['clas'] in ['GlobalMaxPool1D', 'GlobalMaxPooling1D']:
+        return np.max(listinpt[0], axis=1)
+    elif node['clas'] == 'Flatten':
+        return listinpt[0].reshape((listinpt[0].shape[0], -1))
+    elif node['clas'] == 'Concatenate':
+        return np.concatenate(listinpt, axis=conf.get('axis', -1))
+    elif node['clas'] == 'Dropout':
+        return listinpt[0]
+
+    strgactv = conf.get('activation', 'linear')
+    if not strgactv in dictfuncactv:
+        raise Exception('Activation %s of layer %s is not supported.' % (strgactv, node['strg']))
+
+    return dictfuncactv[strgactv](outp)
+
+
+def pred_grap(grap, inpt):
+    """
+    Returns the output of the model for the input
+
+    inpt: input of a single-input model or list of the inputs of the model, in the order of its input layers (e.g., the local and
+          global views), each of shape (numbdata, numbbins, 1) or (numbdata, numbbins)
+    """
+
+    if not isinstance(inpt, (list, tuple)):
+        inpt = [inpt]
+    numbdata = len(inpt[0])
+
+    listoutp = []
+    for indxinit in range(0, numbdata, numbdatablok):
+        dictoutp = retr_outpnode(grap, [inptthis[indxinit:indxinit+numbdatablok] for inptthis in inpt])
+        listoutp.append(dictoutp[grap['liststrgoutp'][0]])
+
+    return np.concatenate(listoutp)
+
+
+def retr_outpnode(grap, inpt):
+    """
+    Returns the outputs of all nodes of the graph for the inputs (list of the inputs of the model), as a dictionary indexed by the
+    names of the nodes
+    """
+
+    dictoutp = {}
+    for strg, inptthis in zip(grap['liststrginpt'], inpt):
+        dictoutp[strg] = np.asarray(inptthis, dtype=np.float32)
+    for node in grap['listnode']:
+        dictoutp[node['strg']] = eval_node(node, [dictoutp[strg] for strg in node['listinpt']])
+
+    return dictoutp
+
+
+def read_grap(pathstor, epoc=None):
+    """
+    Returns the graph of a checkpoint of a checkpoint store, defaulting to the latest epoch
+    """
+
+    with open(pathstor + checweig.strgarch, 'r') as objtfile:
+        strgarch = objtfile.read()
+
+    if epoc is None:
+        epoc = checweig.retr_epoclast(pathstor)
+        if epoc is None:
+            raise Exception('The checkpoint store %s is empty.' % pathstor)
+    listweig = checweig.read_weig(pathstor, epoc)
+
+    grap = retr_grap(strgarch, listweig)
+    # hash of the weights, identifying the checkpoint
+    grap['hashweig'] = [chec['hash'] for chec in checweig.read_indx(pathstor) if chec['epoc'] == epoc][0]
+
+    return grap
+
+
+def retr_grapmodl(modl):
+    """
+    Returns the graph of a Keras model
+    """
+
+    return retr_grap(modl.to_json(), modl.get_weights())
+
+
+def chec_grap(modl, inpt, tole=1e-4):
+    """
+    Checks the output of the NumPy forward pass against that of the Keras model and compares their scoring times
+    """
+
+    grap = retr_grapmodl(modl)
+
+    timeinit = time.time()
+    outpnump = pred_grap(grap, inpt)
+    timenump = time.time() - timeinit
+
+    timeinit = time.time()
+    outpkera = modl.predict(inpt)
+    timekera = time.time() - timeinit
+
+    diffmaxm = np.max(np.abs(outpnump - outpkera))
+    print('Maximum difference from Keras: %g, time: %g s (NumPy), %g s (Keras)' % (diffmaxm, timenump, timekera))
+    if diffmaxm > tole:
+        raise Exception('The NumPy forward pass differs from Keras by %g.' % diffmaxm)
+
+
+def main(pathstor, pathinpt, pathoutp, epoc=None):
+    """
+    Scores the local and global views in the .npz file pathinpt (see flbn.read_view) with a checkpoint and writes the scores to pathoutp
+    """
+
+    timeinit = time.time()
+    grap = read_grap(pathstor, epoc=None if epoc is None else int(epoc))
+    inpt, labl, temp, temp = flbn.read_view(pathinpt, fractest=1.)
+    inpt = inpt[:len(grap['liststrginpt'])]
+    scor = pred_grap(grap, inpt).flatten()
+    print('Scored %d samples in %g s.' % (scor.size, time.time() - timeinit))
+
+    print('Writing to %s...' % pathoutp)
+    np.save(pathoutp, scor)
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:5])
@@ -0,0 +1,313 @@
+import json, hashlib
+
+import numpy as np
+
+import keras
+from keras.models import Model
+from keras.layers import Dense, Dropout, Conv1D, SeparableConv1D, MaxPooling1D, Flatten, Input, GlobalMaxPool1D
+from keras import regularizers
+
+
+"""
+Declarative builder of the classifiers
+
+A model is described by a specification, a JSON-serializable dictionary of its branches, each holding an input and a stack of layers,
+and of the head applied to the concatenated outputs of the branches:
+    {'listbran': [{'strg': <name of the input>, 'shap': <shape of the input>, 'listlayr': <layers>}, ...],
+     'listlayrhead': <layers>,
+     'dictcomp': <arguments of compile>}
+where each layer is a pair [<type of the layer>, <dictionary of its arguments>]. The types of the layers are the keys of dictclaslayr.
+The arguments are those of the Keras layer, except for l1 and l2, which are turned into an L1 activity regularizer and an L2 kernel
+regularizer.
+
+Building and compiling a Keras graph takes much longer than training a small model for an epoch, while most points of a sweep only
+change the data or the training hyperparameters. retr_modl therefore caches the compiled models by the hash of their specification
+and, when a specification is requested again, draws new initial weights for the cached model instead of building a new graph.
+"""
+
+
+# classes of the layer types of the specifications
+dictclaslayr = {'conv': Conv1D, 'sepa': SeparableConv1D, 'maxm': MaxPooling1D, 'gmax': GlobalMaxPool1D, 'flat': Flatten, 'dens': Dense, 'drop': Dropout}
+
+# default arguments of compile
+dictcompdefa = {'loss': 'binary_crossentropy', 'optimizer': 'sgd', 'metrics': ['accuracy']}
+
+# maximum number of compiled models kept in the cache
+numbmodlcach = 16
+
+# compiled models, indexed by the hash of their specification
+dictmodlcach = {}
+
+
+def retr_layr(strglayr, dictargs):
+    """
+    Returns the Keras layer of a layer of a specification
+    """
+
+    dictargs = dict(dictargs)
+    l1 = dictargs.pop('l1', None)
+    l2 = dictargs.pop('l2', None)
+    if l2 is not None:
+        dictargs['kernel_regularizer'] = regularizers.l2(l2)
+    if l1 is not None:
+        dictargs['activity_regularizer'] = regularizers.l1(l1)
+
+    return dictclaslayr[strglayr](**dictargs)
+
+
+def retr_listinpt(spec):
+    """
+    Returns the Keras inputs of a specification
+    """
+
+    return [Input(shape=tuple(dictbran['shap']), dtype='float32', name=dictbran['strg']) for dictbran in spec['listbran']]
+
+
+def retr_outpspec(spec, listinpt, strgsuff=None):
+    """
+    Returns the output of the layers of a specification applied to the Keras inputs listinpt
+
+    strgsuff: if given, all layers are named, with this suffix, such that the layers of several copies of a specification applied to
+              the same inputs can be told apart
+    """
+
+    def retr_layrsuff(strglayr, dictargs, strg):
+        if strgsuff is not None:
+            dictargs = dict(dictargs)
+            dictargs['name'] = dictargs.get('name', strg) + strgsuff
+        return retr_layr(strglayr, dictargs)
+
+    listoutpbran = []
+    for dictbran, inpt in zip(spec['listbran'], listinpt):
+        x = inpt
+        for k, (strglayr, dictargs) in enumerate(dictbran['listlayr']):
+            x = retr_layrsuff(strglayr, dictargs, '%s_%s%02d' % (dictbran['strg'], strglayr, k))(x)
+        listoutpbran.append(x)
+
+    if len(listoutpbran) > 1:
+        z = keras.layers.concatenate(listoutpbran, name=None if strgsuff is None else 'concatenate' + strgsuff)
+    else:
+        z = listoutpbran[0]
+    for k, (strglayr, dictargs) in enumerate(spec['listlayrhead']):
+        z = retr_layrsuff(strglayr, dictargs, 'head_%s%02d' % (strglayr, k))(z)
+
+    return z
+
+
+def bild_modl(spec):
+    """
+    Builds and compiles the model of a specification
+    """
+
+    listinpt = retr_listinpt(spec)
+    z = retr_outpspec(spec, listinpt)
+
+    modl = Model(inputs=listinpt, outputs=[z])
+
+    modl.compile(**spec.get('dictcomp', dictcompdefa))
+
+    return modl
+
+
+def retr_hashspec(spec):
+    """
+    Returns the hash of a specification
+    """
+
+    # NumPy scalars (e.g., the values of a sweep) are serialized as Python scalars
+    return hashlib.sha1(json.dumps(spec, sort_keys=True, default=lambda objt: objt.item()).encode()).hexdigest()[:16]
+
+
+def init_modl(modl, seed=None):
+    """
+    Draws new initial weights for a model in place and resets the state of its optimizer
+
+    The kernels are drawn from the Glorot uniform distribution and the biases are set to zero, as by the default initializers of the
+    Conv1D and Dense layers, but in NumPy, such that no operations are added to the graph.
+    """
+
+    modl.set_weights(retr_weiginit(modl.get_weights(), seed=seed))
+
+    rese_opti(modl)
+
+
+def retr_weiginit(listweig, seed=None):
+    """
+    Returns new initial weights of the shapes of listweig, with the kernels drawn from the Glorot uniform distribution and the biases
+    set to zero
+    """
+
+    rng = np.random.default_rng(seed)
+
+    listweiginit = []
+    for weig in listweig:
+        if weig.ndim >= 2:
+            # fans of the kernel, including the receptive field of a convolution
+            sizerecp = int(np.prod(weig.shape[:-2]))
+            limt = np.sqrt(6. / (sizerecp * (weig.shape[-2] + weig.shape[-1])))
+            listweiginit.append(rng.uniform(-limt, limt, size=weig.shape).astype(weig.dtype))
+        else:
+            listweiginit.append(np.zeros_like(weig))
+
+    return listweiginit
+
+
+def rese_opti(modl):
+    """
+    Resets the state of the optimizer of a model
+    """
+
+    listweigopti = modl.optimizer.get_weights()
+    if len(listweigopti) > 0:
+        modl.optimizer.set_weights([np.zeros_like(weig) for weig in listweigopti])
+
+
+def retr_modl(spec, seed=None):
+    """
+    Returns the compiled model of a specification with new initial weights, reusing a cached model of the same specification
+    """
+
+    hashspec = retr_hashspec(spec)
+
+    if hashspec in dictmodlcach:
+        modl = dictmodlcach[hashspec]
+    else:
+        if len(dictmodlcach) >= numbmodlcach:
+            del dictmodlcach[next(iter(dictmodlcach))]
+        print('Building the model %s...' % hashspec)
+        modl = bild_modl(spec)
+        dictmodlcach[hashspec] = modl
+
+    init_modl(modl, seed=seed)
+
+    return modl
+
+
+def retr_listlayrconv(listnumbfilt, numbconvstag, sizepool, strgpadd, sizekern=5, stdepool=2, strgconv='conv', dilt=1):
+    """
+    Returns the layers of a convolutional stack, with numbconvstag convolutions followed by a max pooling for each number of filters
+
+    strgconv: type of the convolutions, 'conv' or 'sepa' (depthwise-separable)
+    dilt: dilation rate of the convolutions
+    """
+
+    listlayr = []
+    for numbfilt in listnumbfilt:
+        for k in range(numbconvstag):
+            dictargs = {'kernel_size': sizekern, 'filters': numbfilt, 'padding': strgpadd, 'activation': 'relu'}
+            if dilt > 1:
+                dictargs['dilation_rate'] = dilt
+            listlayr.append([strgconv, dictargs])
+        listlayr.append(['maxm', {'pool_size': sizepool, 'strides': stdepool, 'padding': strgpadd}])
+
+    return listlayr
+
+
+def retr_listlayrdens(numblayr, numbdimslayr, fracdrop=0., l1=None, l2=None):
+    """
+    Returns the layers of a fully-connected stack, with a dropout after each layer if fracdrop is positive
+    """
+
+    listlayr = []
+    for k in range(numblayr):
+        listlayr.append(['dens', {'units': numbdimslayr, 'activation': 'relu', 'l1': l1, 'l2': l2}])
+        if fracdrop > 0.:
+            listlayr.append(['drop', {'rate': fracdrop}])
+
+    return listlayr
+
+
+def retr_layrfinl(l1=None, l2=None):
+    """
+    Returns the output layer of the binary classifiers
+    """
+
+    return ['dens', {'units': 1, 'activation': 'sigmoid', 'name': 'finl', 'l1': l1, 'l2': l2}]
+
+
+def retr_listlayrglob(strgvari='orig'):
+    """
+    Returns the layers of the global branch of exonet or of one of its variants with fewer floating-point operations
+
+    strgvari: 'orig' for the original branch of five stages of two convolutions, 'sepa' for depthwise-separable convolutions after
+              the first convolution, 'dilt' for a single convolution with a dilation rate of 2 per stage, with the receptive field of
+              the two original convolutions, or 'stde' for the first two stages replaced by a single convolution with a stride of 4
+    """
+
+    listnumbfilt = [16, 32, 64, 128, 256]
+
+    if strgvari == 'orig':
+        return retr_listlayrconv(listnumbfilt, 2, 5, 'valid')
+
+    if strgvari == 'sepa':
+        # a separable convolution of the single-channel input would not save operations
+        listlayr = retr_listlayrconv(listnumbfilt, 2, 5, 'valid', strgconv='sepa')
+        listlayr[0][0] = 'conv'
+        return listlayr
+
+    if strgvari == 'dilt':
+        return retr_listlayrconv(listnumbfilt, 1, 5, 'valid', dilt=2)
+
+    if strgvari == 'stde':
+        # the kernel spans the receptive field of the first two stages, such that the output has the length of the original branch,
+        # which is concatenated with the local branch
+        return [['conv', {'kernel_size': 37, 'filters': listnumbfilt[1], 'strides': 4, 'padding': 'valid', 'activation': 'relu'}]] + \
+                                                                                    retr_listlayrconv(listnumbfilt[2:], 2, 5, 'valid')
+
+    raise Exception('Variant %s of the global branch is not defined.' % strgvari)
+
+
+def retr_specexonet(numbbinslocl, numbbinsglob, strgvariglob='orig'):
+    """
+    Returns the specification of exonet (astronet), from "Scientific Domain Knowledge Improves Exoplanet Transit Classification with
+    Deep Learning"
+
+    strgvariglob: variant of the global branch (see retr_listlayrglob)
+    """
+
+    spec = {}
+    spec['listbran'] = [ \
+                        {'strg': 'localinput', 'shap': [int(numbbinslocl), 1], \
+                                                        'listlayr': retr_listlayrconv([16, 32], 2, 7, 'same')}, \
+                        {'strg': 'globalinput', 'shap': [int(numbbinsglob), 1], 'listlayr': retr_listlayrglob(strgvariglob)}, \
+                       ]
+    spec['listlayrhead'] = [['flat', {}]] + retr_listlayrdens(4, 512) + [retr_layrfinl()]
+
+    return spec
+
+
+def retr_specreduced(numbbinslocl, numbbinsglob, l1=None, l2=None):
+    """
+    Returns the specification of the reduced model, from "Scientific Domain Knowledge Improves Exoplanet Transit Classification with
+    Deep Learning"
+    """
+
+    listlayrlocl = retr_listlayrconv([16], 1, 2, 'same') + \
+                        [['conv', {'kernel_size': 5, 'filters': 16, 'padding': 'same', 'activation': 'relu'}], ['gmax', {}]]
+    listlayrglob = retr_listlayrconv([16, 16], 1, 2, 'same') + \
+                        [['conv', {'kernel_size': 5, 'filters': 32, 'padding': 'same', 'activation': 'relu'}], ['gmax', {}]]
+
+    spec = {}
+    spec['listbran'] = [ \
+                        {'strg': 'localinput', 'shap': [int(numbbinslocl), 1], 'listlayr': listlayrlocl}, \
+                        {'strg': 'globalinput', 'shap': [int(numbbinsglob), 1], 'listlayr': listlayrglob}, \
+                       ]
+    spec['listlayrhead'] = retr_listlayrdens(1, 1, l1=l1, l2=l2) + [retr_layrfinl(l1=l1, l2=l2)]
+
+    return spec
+
+
+def retr_specdens(listnumbbins, listnumblayr, numbdimslayr, fracdrop=0., numblayrmerg=0, liststrginpt=['localinput', 'globalinput']):
+    """
+    Returns the specification of a fully-connected model with a branch of listnumblayr[k] layers on each flat input of listnumbbins[k]
+    bins, merged by numblayrmerg further layers
+    """
+
+    spec = {}
+    spec['listbran'] = []
+    for k in range(len(listnumbbins)):
+        spec['listbran'].append({'strg': liststrginpt[k], 'shap': [int(listnumbbins[k])], \
+                                                        'listlayr': retr_listlayrdens(listnumblayr[k], numbdimslayr, fracdrop=fracdrop)})
+    spec['listlayrhead'] = retr_listlayrdens(numblayrmerg, numbdimslayr) + [retr_layrfinl()]
+
+    return spec
@@ -0,0 +1,238 @@
+import os
+
+import numpy as np
+
+from sklearn.metrics import roc_auc_score
+
+from keras.callbacks import Callback
+
+
+"""
+Per-epoch prediction log
+
+The scores of the model on the test (and optionally training) data samples are appended to the log at the end of each epoch
+as a single float32 row. Together with the labels, this is all that is needed to recompute the threshold metrics,
+precision-recall curves and confusion matrices of any epoch without loading or running the model again.
+
+Layout of the log folder, for each data split strgsplt ('test' or 'tran'):
+    scor<strgsplt>.dat -- raw float32 matrix of scores, one row per logged epoch
+    epoc<strgsplt>.dat -- raw int32 vector of the epoch indices of the rows
+    labl<strgsplt>.npy -- labels of the data samples
+"""
+
+
+# names of the data splits that can be logged
+liststrgsplt = ['test', 'tran']
+
+
+def retr_pathsplt(pathlogg, strgsplt):
+
+    pathscor = pathlogg + 'scor%s.dat' % strgsplt
+    pathepoc = pathlogg + 'epoc%s.dat' % strgsplt
+    pathlabl = pathlogg + 'labl%s.npy' % strgsplt
+
+    return pathscor, pathepoc, pathlabl
+
+
+def init_predlog(pathlogg, strgsplt, labl, boolover=False):
+    """
+    Prepares the log of a data split for writing
+
+    boolover: if True, or if the labels on the disk do not match labl, previously logged epochs are discarded.
+              Otherwise, new epochs are appended, e.g., when the training is resumed from a checkpoint.
+    """
+
+    pathscor, pathepoc, pathlabl = retr_pathsplt(pathlogg, strgsplt)
+
+    os.system('mkdir -p %s' % pathlogg)
+
+    labl = np.asarray(labl).flatten()
+    if not boolover and os.path.exists(pathlabl):
+        labldisk = np.load(pathlabl)
+        if labldisk.shape == labl.shape and (labldisk == labl).all():
+            trim_predlog(pathlogg, strgsplt, labl.size)
+            return
+        print('Labels in %s do not match, starting a new log...' % pathlabl)
+
+    for path in [pathscor, pathepoc]:
+        if os.path.exists(path):
+            os.remove(path)
+
+    print('Writing to %s...' % pathlabl)
+    np.save(pathlabl, labl)
+
+
+def trim_predlog(pathlogg, strgsplt, numbdata):
+    """
+    Truncates the log of a data split to its whole rows, dropping a row that was only partially written when the training was
+    interrupted, such that the rows appended afterwards stay aligned with their epochs
+    """
+
+    pathscor, pathepoc, pathlabl = retr_pathsplt(pathlogg, strgsplt)
+
+    numbbyterowsscor = 4 * numbdata
+    sizescor = os.path.getsize(pathscor) if os.path.exists(pathscor) else 0
+    sizeepoc = os.path.getsize(pathepoc) if os.path.exists(pathepoc) else 0
+    numbepoc = min(sizescor // numbbyterowsscor, sizeepoc // 4)
+
+    for path, size in [[pathscor, numbepoc * numbbyterowsscor], [pathepoc, numbepoc * 4]]:
+        if os.path.exists(path) and os.path.getsize(path) != size:
+            print('Truncating %s to %d complete epochs...' % (path, numbepoc))
+            with open(path, 'r+b') as objtfile:
+                objtfile.truncate(size)
+
+
+def writ_predlog(pathlogg, strgsplt, epoc, scor):
+    """
+    Appends the scores of a single epoch to the log
+    """
+
+    pathscor, pathepoc, pathlabl = retr_pathsplt(pathlogg, strgsplt)
+
+    with open(pathscor, 'ab') as objtfile:
+        objtfile.write(np.ascontiguousarray(scor, dtype=np.float32).flatten().tobytes())
+    with open(pathepoc, 'ab') as objtfile:
+        objtfile.write(np.array([epoc], dtype=np.int32).tobytes())
+
+
+def read_predlog(pathlogg, strgsplt='test'):
+    """
+    Reads the log of a data split
+
+    Returns the epoch indices, the (numbepoc, numbdata) float32 matrix of scores and the labels.
+    If an epoch was logged more than once (e.g., after resuming the training), only its last entry is returned.
+    """
+
+    pathscor, pathepoc, pathlabl = retr_pathsplt(pathlogg, strgsplt)
+
+    labl = np.load(pathlabl)
+    numbdata = labl.size
+
+    epoc = np.fromfile(pathepoc, dtype=np.int32)
+    numbepoc = epoc.size
+
+    # guard against a row that was only partially written when the training was interrupted
+    scor = np.memmap(pathscor, dtype=np.float32, mode='r')[:numbepoc * numbdata].reshape((-1, numbdata))
+    numbepoc = scor.shape[0]
+    epoc = epoc[:numbepoc]
+
+    # keep the last entry of each epoch
+    epocuniq, indxlast = np.unique(epoc[::-1], return_index=True)
+    indxlast = numbepoc - 1 - indxlast
+    if indxlast.size < numbepoc:
+        scor = scor[indxlast, :]
+        epoc = epocuniq
+
+    return epoc, scor, labl
+
+
+def retr_boolpredlog(pathlogg, strgsplt='test'):
+
+    pathscor, pathepoc, pathlabl = retr_pathsplt(pathlogg, strgsplt)
+
+    return os.path.exists(pathlabl) and os.path.exists(pathepoc)
+
+
+def retr_matrconf(scor, labl, thresh):
+    """
+    Calculates the elements of the confusion matrix for each epoch and threshold
+
+    A data sample is predicted to be relevant if its score is larger than the threshold.
+
+    Returns an array of shape (numbepoc, numbthrs, 4) holding [IN THIS ORDER] trne, flpo, flne, trpo
+    """
+
+    scor = np.atleast_2d(scor)
+    thresh = np.asarray(thresh)
+    boolrele = np.asarray(labl).flatten() == 1
+
+    numbrele = np.sum(boolrele)
+    numbirre = boolrele.size - numbrele
+
+    # sort the scores of the relevant and irrelevant samples once, then count against all thresholds
+    scorrele = np.sort(scor[:, boolrele], axis=1)
+    scorirre = np.sort(scor[:, ~boolrele], axis=1)
+
+    numbepoc = scor.shape[0]
+    matrconf = np.empty((numbepoc, thresh.size, 4))
+    for y in range(numbepoc):
+        trne = np.searchsorted(scorirre[y, :], thresh, side='right')
+        flne = np.searchsorted(scorrele[y, :], thresh, side='right')
+        matrconf[y, :, 0] = trne
+        matrconf[y, :, 1] = numbirre - trne
+        matrconf[y, :, 2] = flne
+        matrconf[y, :, 3] = numbrele - flne
+
+    return matrconf
+
+
+def retr_metrmatrconf(matrconf):
+    """
+    Calculates precision, accuracy and recall from the elements of the confusion matrix (in the last axis of matrconf)
+
+    Returns an array of the same shape as matrconf, but with 3 elements in the last axis, where undefined metrics are set to -1
+    """
+
+    trne = matrconf[..., 0]
+    flpo = matrconf[..., 1]
+    flne = matrconf[..., 2]
+    trpo = matrconf[..., 3]
+
+    metr = np.zeros(matrconf.shape[:-1] + (3,)) - 1
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # precision
+        metr[..., 0] = np.where(trpo + flpo > 0, trpo / (trpo + flpo), -1.)
+        # accuracy
+        metr[..., 1] = np.where(trpo + flpo + trne + flne > 0, (trpo + trne) / (trpo + flpo + trne + flne), -1.)
+        # recall
+        metr[..., 2] = np.where(trpo + flne > 0, trpo / (trpo + flne), -1.)
+
+    return metr
+
+
+def retr_auc(scor, labl):
+    """
+    Calculates the area under the ROC curve for each epoch, set to 0 when undefined
+    """
+
+    scor = np.atleast_2d(scor)
+    labl = np.asarray(labl).flatten()
+
+    auc = np.zeros(scor.shape[0])
+    if np.unique(labl).size < 2:
+        return auc
+
+    for y in range(scor.shape[0]):
+        auc[y] = roc_auc_score(labl, scor[y, :])
+
+    return auc
+
+
+class callpredlog(Callback):
+    """
+    Keras callback that logs the scores of the model at the end of each epoch
+
+    inpttest, inpttran: model inputs (e.g., [locl, glob]) of the test and training data samples
+    labltest, labltran: labels of the test and training data samples
+    The training data samples are logged only if inpttran is provided.
+    """
+
+    def __init__(self, pathlogg, inpttest, labltest, inpttran=None, labltran=None, numbdatabtch=256, boolover=False):
+
+        super(callpredlog, self).__init__()
+
+        self.pathlogg = pathlogg
+        self.numbdatabtch = numbdatabtch
+
+        self.dictinpt = {'test': inpttest}
+        init_predlog(pathlogg, 'test', labltest, boolover=boolover)
+        if inpttran is not None:
+            self.dictinpt['tran'] = inpttran
+            init_predlog(pathlogg, 'tran', labltran, boolover=boolover)
+
+    def on_epoch_end(self, epoch, logs=None):
+
+        for strgsplt, inpt in self.dictinpt.items():
+            scor = self.model.predict(inpt, batch_size=self.numbdatabtch)
+            writ_predlog(self.pathlogg, strgsplt, epoch, scor)
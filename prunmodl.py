@@ -0,0 +1,216 @@
+import sys, json
+
+import numpy as np
+
+from keras.models import model_from_json
+
+from checstor import load_chec, writ_chec
+from predlog import retr_auc
+
+import flbn
+import modlspec
+import modlnump
+import distmodl
+
+
+"""
+Structured pruning and fine-tuning of the classifiers (e.g., exonet, whose parameters are mostly in its four Dense(512) layers)
+
+In each round, the filters of the Conv1D layers and the units of the Dense layers (except the output layer) are ranked by their
+magnitude (the L1 norm of their kernel) or by their mean activation on a calibration sample, and the lowest fracprun of each layer
+are removed. The removal is structural: the kernels and biases of the kept units and the rows of the kernels of the consumer layers
+that read them are cut out, and the architecture of the model is rewritten with the smaller numbers of filters and units, such that
+the pruned model is a smaller Keras model rather than a masked one. The kept units are traced through the max pooling, dropout,
+concatenation and flattening layers, which do not change the channels. The pruned model is then fine-tuned for a few epochs.
+
+The number of parameters, the FLOPs per sample, the scoring latency and the area under the ROC curve on the test data samples are
+reported after each pruning and each fine-tuning.
+"""
+
+
+# default fraction of the filters and units removed in each round
+fracprundefa = 0.5
+
+# number of samples of the calibration sample for the activations
+numbdatacali = 512
+
+
+def retr_scorunit(kern, outp, strgcrit='magn'):
+    """
+    Returns the importance of the units (filters) of a Conv1D or Dense node
+
+    strgcrit: 'magn' for the L1 norm of the kernel of each unit, or 'actv' for the mean absolute activation of each unit on the
+              calibration sample
+    """
+
+    if strgcrit == 'magn':
+        return np.sum(np.abs(kern.reshape((-1, kern.shape[-1]))), axis=0)
+    if strgcrit == 'actv':
+        return np.mean(np.abs(outp.reshape((-1, outp.shape[-1]))), axis=0)
+
+    raise Exception('Criterion %s is not defined.' % strgcrit)
+
+
+def prun_arch(strgarch, listweig, inptcali, fracprun=fracprundefa, strgcrit='magn'):
+    """
+    Removes the lowest ranked fracprun of the filters and units of each layer of a model
+
+    strgarch: Keras JSON architecture of the model
+    listweig: weights of the model, as returned by get_weights
+    inptcali: calibration inputs of the model, used for the activations and the shapes of the outputs of the layers
+
+    Returns the architecture and the weights of the pruned model.
+    """
+
+    grap = modlnump.retr_grap(strgarch, listweig)
+    dictoutp = modlnump.retr_outpnode(grap, inptcali)
+
+    dictarch = json.loads(strgarch)
+    dictconf = dictarch['config']
+    listdictlayr = dictconf if isinstance(dictconf, list) else dictconf['layers']
+    dictdictlayr = {}
+    for dictlayr in listdictlayr:
+        dictdictlayr[dictlayr['config'].get('name', dictlayr.get('name'))] = dictlayr
+
+    # Boolean flags of the kept channels of the output of each node
+    dictbool = {}
+    for strg in grap['liststrginpt']:
+        dictbool[strg] = np.ones(dictoutp[strg].shape[-1], dtype=bool)
+
+    listweigprun = []
+    for node in grap['listnode']:
+        listboolinpt = [dictbool[strg] for strg in node['listinpt']]
+
+        if node['clas'] in ['Conv1D', 'Dense']:
+            # rows of the kernel reading the kept channels of the input
+            kern = node['kern'][..., listboolinpt[0], :]
+            numbunit = kern.shape[-1]
+            boolkeep = np.ones(numbunit, dtype=bool)
+            if not node['strg'] in grap['liststrgoutp']:
+                scor = retr_scorunit(kern, dictoutp[node['strg']], strgcrit=strgcrit)
+                numbkeep = max(1, int(round((1. - fracprun) * numbunit)))
+                boolkeep[:] = False
+                boolkeep[np.argsort(-scor, kind='stable')[:numbkeep]] = True
+                strgconf = 'filters' if node['clas'] == 'Conv1D' else 'units'
+                dictdictlayr[node['strg']]['config'][strgconf] = numbkeep
+            listweigprun.append(kern[..., boolkeep])
+            if node['bias'] is not None:
+                listweigprun.append(node['bias'][boolkeep])
+        elif node['clas'] == 'SeparableConv1D':
+            raise Exception('Pruning of layer %s of class %s is not supported.' % (node['strg'], node['clas']))
+        elif node['clas'] == 'Concatenate':
+            boolkeep = np.concatenate(listboolinpt)
+        elif node['clas'] == 'Flatten' and dictoutp[node['listinpt'][0]].ndim == 3:
+            # the flattened output is ordered by time and then by channel
+            boolkeep = np.tile(listboolinpt[0], dictoutp[node['listinpt'][0]].shape[1])
+        else:
+            boolkeep = listboolinpt[0]
+
+        dictbool[node['strg']] = boolkeep
+
+    return json.dumps(dictarch), listweigprun
+
+
+def retr_flop(grap, inpt):
+    """
+    Returns the number of floating-point operations per sample of the Conv1D, SeparableConv1D and Dense layers of the graph, counting
+    a multiply and an add as two operations
+    """
+
+    dictoutp = modlnump.retr_outpnode(grap, [inptthis[:1] for inptthis in inpt])
+
+    flop = 0
+    for node in grap['listnode']:
+        if node['clas'] in ['Conv1D', 'SeparableConv1D', 'Dense']:
+            numbpost = int(np.prod(dictoutp[node['strg']].shape[1:-1]))
+            flop += 2 * numbpost * node['kern'].size
+            if node['clas'] == 'SeparableConv1D':
+                flop += 2 * numbpost * node['kerndept'].size
+
+    return flop
+
+
+def retr_modlprun(strgarch, listweig):
+    """
+    Returns the compiled Keras model of an architecture with the weights listweig
+    """
+
+    modl = model_from_json(strgarch)
+    modl.compile(**modlspec.dictcompdefa)
+    modl.set_weights(listweig)
+
+    return modl
+
+
+def retr_repoprun(strgstag, modl, inpttest, labltest):
+    """
+    Returns the size, cost and accuracy report of a model on the test data samples
+    """
+
+    grap = modlnump.retr_grapmodl(modl)
+
+    repo = {'strg': strgstag}
+    repo['numbpara'] = int(modl.count_params())
+    repo['flop'] = retr_flop(grap, inpttest)
+    repo['late'] = distmodl.retr_late(lambda inpt: modl.predict(inpt, batch_size=modlnump.numbdatablok), inpttest)
+    repo['auc'] = retr_auc(modl.predict(inpttest).flatten(), labltest)[0]
+
+    return repo
+
+
+def prnt_repoprun(listrepo):
+
+    print('%24s %12s %12s %14s %8s' % ('Stage', 'Parameters', 'FLOPs', 'Latency [ms/1k]', 'AUC'))
+    for repo in listrepo:
+        print('%24s %12d %12.4g %14.4g %8.4g' % (repo['strg'], repo['numbpara'], repo['flop'], repo['late'], repo['auc']))
+
+
+def prun_modl(modl, inpttran, labltran, inpttest, labltest, fracprun=fracprundefa, numbroun=3, numbepocfine=3, strgcrit='magn', \
+                                                                                                numbdatabtch=64, pathchec=None):
+    """
+    Prunes and fine-tunes a model for numbroun rounds
+
+    pathchec: if given, the model of each round is written to the checkpoint store pathchec + 'prun<round>/'
+
+    Returns the pruned model of the last round and the reports of all stages.
+    """
+
+    inptcali = [inptthis[:numbdatacali] for inptthis in inpttran]
+
+    listrepo = [retr_repoprun('original', modl, inpttest, labltest)]
+    prnt_repoprun(listrepo)
+    for r in range(1, numbroun + 1):
+        strgarch, listweig = prun_arch(modl.to_json(), modl.get_weights(), inptcali, fracprun=fracprun, strgcrit=strgcrit)
+        modl = retr_modlprun(strgarch, listweig)
+        listrepo.append(retr_repoprun('round %d, pruned' % r, modl, inpttest, labltest))
+
+        modl.fit(inpttran, labltran, epochs=numbepocfine, batch_size=numbdatabtch, verbose=1)
+        listrepo.append(retr_repoprun('round %d, fine-tuned' % r, modl, inpttest, labltest))
+        prnt_repoprun(listrepo)
+
+        if pathchec is not None:
+            writ_chec(pathchec + 'prun%02d/' % r, modl, numbepocfine - 1)
+
+    return modl, listrepo
+
+
+def main(pathchec, pathdata, fracprun=fracprundefa, numbroun=3, numbepocfine=3, strgcrit='magn', fractest=flbn.fractestdefa):
+    """
+    Prunes the model of the checkpoint store pathchec
+
+    pathdata: .npz file of the views and labels of the data samples, the first fractest of which are used as the test data samples
+              (see flbn.read_view)
+    """
+
+    inpttest, labltest, inpttran, labltran = flbn.read_view(pathdata, fractest=fractest)
+
+    modl = load_chec(pathchec)
+
+    modl, listrepo = prun_modl(modl, inpttran, labltran, inpttest, labltest, fracprun=float(fracprun), \
+                                    numbroun=int(numbroun), numbepocfine=int(numbepocfine), strgcrit=strgcrit, pathchec=pathchec)
+
+    return listrepo
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:7])
@@ -0,0 +1,203 @@
+import os, sys
+
+import numpy as np
+
+import tensorflow as tf
+
+from checstor import load_chec
+from predlog import retr_auc, retr_matrconf, retr_metrmatrconf
+
+import flbn
+import modlnump
+import distmodl
+
+
+"""
+Full-integer post-training quantization of the classifiers into TensorFlow Lite, and scoring with the TFLite interpreter on CPU
+
+The weights and activations of the model are quantized to int8, with the ranges of the activations calibrated on a representative
+sample of folded and binned views. The inputs and the output of the quantized model are int8 as well, such that the whole forward
+pass runs in integer arithmetic. The interpreter scores the samples in blocks, with the batch dimension of its inputs resized to the
+block size, and runs the operations of a block with numbthrd threads.
+
+The accuracy drift of the quantized model against the float model (the differences of the scores, the flipped decisions and the area
+under the ROC curve) is reported, so that the quantized model can be used when its loss of accuracy is negligible.
+"""
+
+
+# number of samples of the representative sample used to calibrate the activations
+numbdatacali = 500
+
+# default number of threads of the interpreter
+numbthrddefa = 4
+
+# maximum loss of the area under the ROC curve for which the quantized model is recommended
+toleauc = 1e-3
+
+
+def retr_modltfli(modl, inptcali):
+    """
+    Returns the full-integer quantized TFLite model of a Keras model, calibrated on the inputs inptcali (list of the inputs of the model)
+    """
+
+    if hasattr(tf.lite.TFLiteConverter, 'from_keras_model_file'):
+        # converters of TensorFlow 1 read the model from a file
+        pathtemp = '/tmp/quanmodl_%d.h5' % os.getpid()
+        modl.save(pathtemp)
+        objtconv = tf.lite.TFLiteConverter.from_keras_model_file(pathtemp)
+        os.remove(pathtemp)
+    else:
+        objtconv = tf.lite.TFLiteConverter.from_keras_model(modl)
+
+    def retr_inptcali():
+        for k in range(len(inptcali[0])):
+            yield [np.asarray(inptthis[k:k+1], dtype=np.float32) for inptthis in inptcali]
+
+    objtconv.optimizations = [tf.lite.Optimize.DEFAULT]
+    objtconv.representative_dataset = retr_inptcali
+    objtconv.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    objtconv.inference_input_type = tf.int8
+    objtconv.inference_output_type = tf.int8
+
+    return objtconv.convert()
+
+
+def writ_modltfli(pathtfli, modl, inptcali):
+    """
+    Quantizes a Keras model and writes the TFLite model to pathtfli
+    """
+
+    modltfli = retr_modltfli(modl, inptcali)
+
+    print('Writing to %s...' % pathtfli)
+    with open(pathtfli, 'wb') as objtfile:
+        objtfile.write(modltfli)
+
+
+def retr_intp(pathtfli, numbthrd=numbthrddefa):
+    """
+    Returns the TFLite interpreter of a model
+    """
+
+    return tf.lite.Interpreter(model_path=pathtfli, num_threads=numbthrd)
+
+
+def retr_strginpttfli(strg):
+    """
+    Returns the name of the input layer of an input tensor of the interpreter, stripping the prefix of the serving signature and the
+    index of the output of the tensor
+    """
+
+    if strg.startswith('serving_default_'):
+        strg = strg[len('serving_default_'):]
+    if strg.endswith(':0'):
+        strg = strg[:-len(':0')]
+
+    return strg
+
+
+def pred_tfli(intp, inpt, liststrginpt=None, numbdatablok=modlnump.numbdatablok):
+    """
+    Returns the scores of the quantized model for the inputs inpt (list of the inputs of the model, in the order of its input layers)
+
+    liststrginpt: names of the input layers of the model, used to match the inputs of the interpreter, which are otherwise taken in
+                  the order of their tensors
+    The inputs are quantized and the output is dequantized with the scales and zero points of the model.
+    """
+
+    listdictinpt = sorted(intp.get_input_details(), key=lambda dictinpt: dictinpt['index'])
+    dictoutp = intp.get_output_details()[0]
+
+    if liststrginpt is not None:
+        dictdictinpt = dict((retr_strginpttfli(dictinpt['name']), dictinpt) for dictinpt in listdictinpt)
+        for strg in liststrginpt:
+            if not strg in dictdictinpt:
+                raise Exception('Input %s is not among the inputs of the interpreter, %s.' % (strg, list(dictdictinpt.keys())))
+        listdictinpt = [dictdictinpt[strg] for strg in liststrginpt]
+
+    numbdata = len(inpt[0])
+    scor = np.empty(numbdata, dtype=np.float32)
+    sizeblok = 0
+    for indxinit in range(0, numbdata, numbdatablok):
+        listinptblok = [inptthis[indxinit:indxinit+numbdatablok] for inptthis in inpt]
+        numbdatathis = len(listinptblok[0])
+        if numbdatathis != sizeblok:
+            for dictinpt, inptblok in zip(listdictinpt, listinptblok):
+                intp.resize_tensor_input(dictinpt['index'], [numbdatathis] + list(inptblok.shape[1:]))
+            intp.allocate_tensors()
+            sizeblok = numbdatathis
+        for dictinpt, inptblok in zip(listdictinpt, listinptblok):
+            scal, zeropont = dictinpt['quantization']
+            inptquan = np.clip(np.round(inptblok / scal + zeropont), -128, 127).astype(np.int8)
+            intp.set_tensor(dictinpt['index'], inptquan)
+        intp.invoke()
+        scal, zeropont = dictoutp['quantization']
+        scor[indxinit:indxinit+numbdatathis] = (intp.get_tensor(dictoutp['index']).astype(np.float32).flatten() - zeropont) * scal
+
+    return scor
+
+
+def retr_repodrif(scorfloa, scorquan, labl, thrs=0.5):
+    """
+    Returns the accuracy drift of the quantized model against the float model
+    """
+
+    repo = {}
+    repo['diffmaxm'] = float(np.max(np.abs(scorquan - scorfloa)))
+    repo['diffmean'] = float(np.mean(np.abs(scorquan - scorfloa)))
+    repo['fracflip'] = float(np.mean((scorquan > thrs) != (scorfloa > thrs)))
+    repo['aucfloa'] = retr_auc(scorfloa, labl)[0]
+    repo['aucquan'] = retr_auc(scorquan, labl)[0]
+    repo['accufloa'] = retr_metrmatrconf(retr_matrconf(scorfloa, labl, [thrs]))[0, 0, 1]
+    repo['accuquan'] = retr_metrmatrconf(retr_matrconf(scorquan, labl, [thrs]))[0, 0, 1]
+
+    return repo
+
+
+def main(pathchec, pathdata, numbthrd=numbthrddefa, fractest=flbn.fractestdefa):
+    """
+    Quantizes the model of the checkpoint store pathchec, calibrated on the training data samples, and reports its accuracy drift
+    and latency on the test data samples
+
+    pathdata: .npz file of the views and labels of the data samples, the first fractest of which are used as the test data samples
+              (see flbn.read_view)
+    """
+
+    numbthrd = int(numbthrd)
+
+    inpttest, labltest, inpttran, labltran = flbn.read_view(pathdata, fractest=fractest)
+    indxcali = np.random.default_rng(0).choice(labltran.size, size=min(numbdatacali, labltran.size), replace=False)
+    inptcali = [inptthis[indxcali] for inptthis in inpttran]
+
+    modl = load_chec(pathchec)
+    numbinpt = len(modl.inputs)
+    inpttest = inpttest[:numbinpt]
+    inptcali = inptcali[:numbinpt]
+
+    pathtfli = pathchec + 'modlint8.tflite'
+    writ_modltfli(pathtfli, modl, inptcali)
+
+    funcfloa = lambda inpt: modl.predict(inpt, batch_size=modlnump.numbdatablok).flatten()
+    intp = retr_intp(pathtfli, numbthrd=numbthrd)
+    funcquan = lambda inpt: pred_tfli(intp, inpt, liststrginpt=modl.input_names)
+
+    repo = retr_repodrif(funcfloa(inpttest), funcquan(inpttest), labltest)
+    repo['sizequan'] = os.path.getsize(pathtfli)
+    repo['latefloa'] = distmodl.retr_late(funcfloa, inpttest)
+    repo['latequan'] = distmodl.retr_late(funcquan, inpttest)
+
+    print('Size of the quantized model: %d bytes' % repo['sizequan'])
+    print('Latency [ms per 1000 samples]: %g (float, Keras), %g (int8, TFLite, %d threads)' % (repo['latefloa'], repo['latequan'], numbthrd))
+    print('Difference of the scores: %g (maximum), %g (mean), fraction of flipped decisions: %g' % \
+                                                                                    (repo['diffmaxm'], repo['diffmean'], repo['fracflip']))
+    print('AUC: %g (float), %g (int8), accuracy: %g (float), %g (int8)' % (repo['aucfloa'], repo['aucquan'], repo['accufloa'], repo['accuquan']))
+    if repo['aucfloa'] - repo['aucquan'] < toleauc:
+        print('The loss of AUC is negligible, the quantized model can be used.')
+    else:
+        print('The loss of AUC exceeds %g, the float model should be used.' % toleauc)
+
+    return repo
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:4])
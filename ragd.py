@@ -0,0 +1,338 @@
+import os, shutil
+
+import numpy as np
+
+
+"""
+Ragged container of light curves
+
+Curves of different lengths are stored back to back in flat arrays of time and flux, together with an array of offsets
+of numbcurv + 1 elements, such that the samples of curve k are time[offs[k]:offs[k+1]] and flux[offs[k]:offs[k+1]].
+Operations over all curves are then vectorized over the flat arrays, using the curve index of each sample where needed,
+instead of looping over the curves.
+
+On the disk, a ragged store is a folder of shards, each holding the ragged container of a batch of curves:
+    shrd<indx>/offs.npy          -- offsets of the curves
+    shrd<indx>/<strgsamp>.npy    -- flat per-sample arrays, e.g., time, flux and qual
+    shrd<indx>/<strgcurv>.npy    -- per-curve arrays, e.g., tici and sect
+    shrd<indx>/listpath.txt      -- paths of the files the curves were read from
+"""
+
+
+# names of the per-curve arrays of a ragged container, all other arrays except the offsets being per-sample
+liststrgcurv = ['tici', 'sect', 'numbsegm', 'outp', 'peri', 'epoc', 'dura', 'dept']
+
+# tolerance below which two samples of the same target are considered the same cadence when stitching [days]
+toletimedefa = 1e-5
+
+
+def retr_offs(numbsamp):
+    """
+    Returns the offsets of curves with numbsamp samples each
+    """
+
+    offs = np.zeros(len(numbsamp) + 1, dtype=np.int64)
+    np.cumsum(numbsamp, out=offs[1:])
+
+    return offs
+
+
+def retr_indxcurv(offs):
+    """
+    Returns the curve index of each sample
+    """
+
+    return np.repeat(np.arange(offs.size - 1), np.diff(offs))
+
+
+def retr_ragddens(time, flux):
+    """
+    Converts dense curves into the ragged container, dropping the samples with non-finite time or flux
+
+    time: (numbtime) time grid shared by all curves or (numbcurv, numbtime) times of each curve
+    flux: (numbcurv, numbtime) flux
+
+    Returns the flat time and flux and the offsets.
+    """
+
+    if time.ndim == 1:
+        time = np.broadcast_to(time[None, :], flux.shape)
+
+    boolgood = np.isfinite(time) & np.isfinite(flux)
+
+    offs = retr_offs(np.sum(boolgood, 1))
+    timeragd = time[boolgood]
+    fluxragd = flux[boolgood]
+
+    return timeragd, fluxragd, offs
+
+
+def retr_ragdlist(listtime, listflux):
+    """
+    Converts lists of curves of different lengths (e.g., as returned by retr_datatess) into the ragged container, dropping the
+    samples with non-finite time or flux
+
+    Returns the flat time and flux and the offsets.
+    """
+
+    time = np.concatenate([np.asarray(timethis, dtype=float) for timethis in listtime])
+    flux = np.concatenate([np.asarray(fluxthis, dtype=float) for fluxthis in listflux])
+
+    offs = retr_offs([len(timethis) for timethis in listtime])
+    boolgood = np.isfinite(time) & np.isfinite(flux)
+    offs = retr_offs(np.bincount(retr_indxcurv(offs)[boolgood], minlength=offs.size - 1))
+
+    return time[boolgood], flux[boolgood], offs
+
+
+def retr_indxgath(offs, indxcurv):
+    """
+    Returns the indices of the samples of the curves indxcurv (possibly repeated) and the offsets of the gathered curves,
+    such that time[indxsamp], flux[indxsamp] is the ragged container of the gathered curves
+    """
+
+    numbsamp = offs[indxcurv + 1] - offs[indxcurv]
+    offsgath = retr_offs(numbsamp)
+    indxcurvgath = retr_indxcurv(offsgath)
+    indxsamp = offs[indxcurv][indxcurvgath] + np.arange(offsgath[-1]) - offsgath[indxcurvgath]
+
+    return indxsamp, offsgath
+
+
+def gath_ragd(dictragd, indxcurv):
+    """
+    Returns the ragged container of the curves indxcurv (possibly repeated) of the ragged container dictragd
+    """
+
+    indxsamp, offsgath = retr_indxgath(dictragd['offs'], indxcurv)
+
+    dictragdgath = {'offs': offsgath}
+    for strg, arry in dictragd.items():
+        if strg == 'offs':
+            continue
+        if strg in liststrgcurv:
+            dictragdgath[strg] = arry[indxcurv]
+        else:
+            dictragdgath[strg] = arry[indxsamp]
+
+    return dictragdgath
+
+
+def retr_boolgood(dictragd, bitmask=0):
+    """
+    Returns the Boolean mask of the good samples, whose time and flux are finite and whose quality flags (if available)
+    have none of the bits of bitmask set
+    """
+
+    boolgood = np.isfinite(dictragd['time']) & np.isfinite(dictragd['flux'])
+    if bitmask != 0 and 'qual' in dictragd:
+        boolgood &= (dictragd['qual'] & bitmask) == 0
+
+    return boolgood
+
+
+def filt_ragd(dictragd, boolkeep):
+    """
+    Compacts the ragged container in place, keeping the samples boolkeep
+
+    The kept samples of each per-sample array are moved to the front of its buffer, and the arrays of the container are replaced
+    by views of the compacted fronts, such that no new buffers of the full size are allocated.
+    """
+
+    indxkeep = np.flatnonzero(boolkeep)
+    numbkeep = indxkeep.size
+
+    offs = dictragd['offs']
+    dictragd['offs'] = retr_offs(np.bincount(retr_indxcurv(offs)[indxkeep], minlength=offs.size - 1))
+
+    for strg, arry in dictragd.items():
+        if strg == 'offs' or strg in liststrgcurv:
+            continue
+        # the kept samples are gathered into a temporary of the compacted size and written to the front of the buffer
+        arry[:numbkeep] = arry[indxkeep]
+        dictragd[strg] = arry[:numbkeep]
+
+    return dictragd
+
+
+def retr_meanragd(flux, offs):
+    """
+    Returns the mean flux of each curve, set to 1 for empty curves
+    """
+
+    numbsamp = np.diff(offs)
+    fluxsumm = np.bincount(retr_indxcurv(offs), weights=flux, minlength=offs.size - 1)
+    fluxmean = np.ones(offs.size - 1)
+    fluxmean[numbsamp > 0] = fluxsumm[numbsamp > 0] / numbsamp[numbsamp > 0]
+
+    return fluxmean
+
+
+def retr_listpathshrd(pathstor):
+    """
+    Returns the sorted paths of the shards of a ragged store
+    """
+
+    if not os.path.isdir(pathstor):
+        return []
+
+    return [pathstor + strgshrd + '/' for strgshrd in sorted(os.listdir(pathstor)) \
+                                                if strgshrd.startswith('shrd') and not strgshrd.endswith('.temp')]
+
+
+def writ_shrd(pathshrd, dictragd, listpath=None):
+    """
+    Writes the ragged container dictragd (offs and flat per-sample and per-curve arrays) to a shard
+
+    The shard is first written to a temporary folder and then moved into place, so that an interrupted write never leaves
+    a partial shard in the store.
+    """
+
+    pathtemp = pathshrd.rstrip('/') + '.temp/'
+    if os.path.exists(pathtemp):
+        shutil.rmtree(pathtemp)
+    os.system('mkdir -p %s' % pathtemp)
+
+    for strg, arry in dictragd.items():
+        np.save(pathtemp + strg + '.npy', arry)
+
+    if listpath is not None:
+        with open(pathtemp + 'listpath.txt', 'w') as objtfile:
+            objtfile.write('\n'.join(listpath))
+
+    if os.path.exists(pathshrd):
+        shutil.rmtree(pathshrd)
+    os.replace(pathtemp, pathshrd)
+
+
+def read_shrd(pathshrd, boolmemm=True):
+    """
+    Reads a shard, memory-mapping its arrays if boolmemm is True
+
+    Returns the ragged container as a dictionary of arrays and the list of the paths of the files of the curves.
+    """
+
+    dictragd = {}
+    for strgfile in os.listdir(pathshrd):
+        if strgfile.endswith('.npy'):
+            dictragd[strgfile[:-4]] = np.load(pathshrd + strgfile, mmap_mode='r' if boolmemm else None)
+
+    listpath = []
+    if os.path.exists(pathshrd + 'listpath.txt'):
+        with open(pathshrd + 'listpath.txt', 'r') as objtfile:
+            strgpath = objtfile.read()
+        if len(strgpath) > 0:
+            listpath = strgpath.split('\n')
+
+    return dictragd, listpath
+
+
+def read_stor(pathstor, listpathshrd=None):
+    """
+    Reads and concatenates the shards listpathshrd (all shards by default) of a ragged store into a single ragged container
+
+    Returns the ragged container as a dictionary of arrays and the list of the paths of the files of the curves.
+    """
+
+    if listpathshrd is None:
+        listpathshrd = retr_listpathshrd(pathstor)
+
+    listdictragd = []
+    listpath = []
+    for pathshrd in listpathshrd:
+        dictragd, listpathtemp = read_shrd(pathshrd)
+        listdictragd.append(dictragd)
+        listpath += listpathtemp
+
+    if len(listdictragd) == 0:
+        return {'offs': np.zeros(1, dtype=np.int64)}, listpath
+
+    dictragd = {}
+    numbsamp = [dictragdtemp['offs'][-1] for dictragdtemp in listdictragd]
+    offsshrd = retr_offs(numbsamp)
+    dictragd['offs'] = np.concatenate([np.zeros(1, dtype=np.int64)] + \
+                                [dictragdtemp['offs'][1:] + offsshrd[k] for k, dictragdtemp in enumerate(listdictragd)])
+    for strg in listdictragd[0]:
+        if strg != 'offs':
+            dictragd[strg] = np.concatenate([dictragdtemp[strg] for dictragdtemp in listdictragd])
+
+    return dictragd, listpath
+
+
+def retr_mediragd(flux, offs):
+    """
+    Returns the median of the finite flux of each curve, set to NaN for curves without finite samples
+
+    The medians of all curves are found with a single sort of the samples by curve and flux, after which the median of each curve
+    is read at the middle of its finite samples.
+    """
+
+    indxcurv = retr_indxcurv(offs)
+    numbcurv = offs.size - 1
+
+    boolfini = np.isfinite(flux)
+    numbfini = np.bincount(indxcurv[boolfini], minlength=numbcurv)
+
+    # non-finite samples are sorted to the end of their curve
+    fluxsort = flux[np.lexsort((flux, indxcurv))]
+
+    boolgood = numbfini > 0
+    indxlowr = offs[:-1][boolgood] + (numbfini[boolgood] - 1) // 2
+    indxuppr = offs[:-1][boolgood] + numbfini[boolgood] // 2
+
+    fluxmedi = np.full(numbcurv, np.nan)
+    fluxmedi[boolgood] = 0.5 * (fluxsort[indxlowr].astype(float) + fluxsort[indxuppr])
+
+    return fluxmedi
+
+
+def stit_ragd(dictragd, toletime=toletimedefa):
+    """
+    Stitches the segments (e.g., TESS sectors or Kepler quarters) of each target into a single curve
+
+    The flux of each segment is divided by its median, after which the samples of all segments of a target are concatenated in
+    time order and cadences of overlapping segments closer than toletime to the previous sample are dropped. All targets are
+    processed in one pass over the flat arrays.
+
+    dictragd: ragged container with a curve per segment and the target of each curve in tici
+
+    Returns the ragged container with a curve per target (in the order of increasing tici), where the per-curve array numbsegm
+    holds the number of stitched segments and the per-sample array sectsamp the segment (sect) of each sample, if available. The
+    other per-curve arrays (e.g., the ephemerides of the targets) are taken from the first segment of each target.
+    """
+
+    offs = dictragd['offs']
+    indxcurv = retr_indxcurv(offs)
+
+    # normalize each segment by its median
+    fluxmedi = retr_mediragd(dictragd['flux'], offs)
+    flux = dictragd['flux'] / fluxmedi[indxcurv].astype(dictragd['flux'].dtype)
+
+    # order the samples by target and time
+    tici, indxfrst, indxtici, numbsegm = np.unique(dictragd['tici'], return_index=True, return_inverse=True, return_counts=True)
+    indxticisamp = indxtici[indxcurv]
+    indxsamp = np.lexsort((dictragd['time'], indxticisamp))
+    indxticisamp = indxticisamp[indxsamp]
+    time = dictragd['time'][indxsamp]
+
+    # drop the duplicate cadences of overlapping segments
+    boolkeep = np.ones(indxsamp.size, dtype=bool)
+    boolkeep[1:] = (indxticisamp[1:] != indxticisamp[:-1]) | (np.diff(time) >= toletime)
+    indxsamp = indxsamp[boolkeep]
+
+    dictragdstit = {}
+    dictragdstit['offs'] = retr_offs(np.bincount(indxticisamp[boolkeep], minlength=tici.size))
+    dictragdstit['tici'] = tici
+    dictragdstit['numbsegm'] = numbsegm
+    dictragdstit['flux'] = flux[indxsamp]
+    for strg, arry in dictragd.items():
+        if strg in ['offs', 'flux', 'tici', 'sect', 'numbsegm']:
+            continue
+        if strg in liststrgcurv:
+            dictragdstit[strg] = arry[indxfrst]
+        else:
+            dictragdstit[strg] = arry[indxsamp]
+    if 'sect' in dictragd:
+        dictragdstit['sectsamp'] = dictragd['sect'][indxcurv[indxsamp]]
+
+    return dictragdstit
@@ -25,6 +25,9 @@ import lightkurve
 
 from exop import main as exopmain
 
+import mockdata
+import modlspec
+
 
 widgets = ['Working! ', Percentage(), ' ', Bar(marker='#',left='[',right=']'),
            ' ', ETA(), ' ', FileTransferSpeed()]
@@ -60,6 +63,7 @@ indxepoc = np.arange(numbepoc)
 
 
 # mockdata param
+# 'flbn' simulates the local and global views directly, without generating and folding the raw light curves
 datatype = 'here'
 
 numbtime = 20000 # could maybe need to be 2001 to meet paper's specs
@@ -123,146 +127,15 @@ pathsaveconf = 'conf_' + path_namer_str + '.npy'
 # CONVOLUTIONAL MODELS
 
 # models from "Scientific Domain Knowledge Improves Exoplanet Transit Classification with Deep Learning"
+# the layers of the models are given by their specifications (see modlspec)
 # aka astronet
 def exonet():
-    loclinpt, globlinpt = 200, 2000 # hard coded for now
-    padX = 'same'
-    padY = 'valid'
-
-    localinput = Input(shape=(int(loclinpt),1), dtype='float32', name='localinput') 
-
-    x = Conv1D(kernel_size=5, filters=16, padding=padX, activation='relu', input_shape=(loclinpt,1))(localinput)
-    x = Conv1D(kernel_size=5, filters=16, padding=padX, activation='relu')(x)
-
-    x = MaxPooling1D(pool_size=7, strides=2, padding=padX)(x)
-
-    x = Conv1D(kernel_size=5, filters=32, padding=padX, activation='relu')(x)
-    x = Conv1D(kernel_size=5, filters=32, padding=padX, activation='relu')(x)
-
-    x = MaxPooling1D(pool_size=7, strides=2, padding=padX)(x)
-
-    # -----------------------------------------------------------------------------
-    globalinput = Input(shape=(int(globlinpt),1), dtype='float32', name='globalinput')
-
-    y = Conv1D(kernel_size=5, filters=16, padding=padY, activation='relu', input_shape=(globlinpt,1))(globalinput)
-    y = Conv1D(kernel_size=5, filters=16, padding=padY, activation='relu')(y)
-
-    y = MaxPooling1D(pool_size=5, strides=2, padding=padY)(y)
-
-    y = Conv1D(kernel_size=5, filters=32, padding=padY, activation='relu')(y)
-    y = Conv1D(kernel_size=5, filters=32, padding=padY, activation='relu')(y)
-
-    y = MaxPooling1D(pool_size=5, strides=2, padding=padY)(y)
-
-    y = Conv1D(kernel_size=5, filters=64, padding=padY, activation='relu')(y)
-    y = Conv1D(kernel_size=5, filters=64, padding=padY, activation='relu')(y)
-
-    y = MaxPooling1D(pool_size=5, strides=2, padding=padY)(y)
-
-    y = Conv1D(kernel_size=5, filters=128, padding=padY, activation='relu')(y)
-    y = Conv1D(kernel_size=5, filters=128, padding=padY, activation='relu')(y)
-
-    y = MaxPooling1D(pool_size=5, strides=2, padding=padY)(y)
-
-    y = Conv1D(kernel_size=5, filters=256, padding=padY, activation='relu')(y)
-    y = Conv1D(kernel_size=5, filters=256, padding=padY, activation='relu')(y)
-
-    y = MaxPooling1D(pool_size=5, strides=2, padding=padY)(y)
     
-    """
-    print('shape test:', tf.keras.backend.shape(y))
-    modldummy = Model(inputs=[localinput, globalinput], outputs=[y])
-    print()
-    modldummy.summary()
-
-    print('shape test:', tf.keras.backend.shape(x))
-    modldummy = Model(inputs=[localinput, globalinput], outputs=[x])
-    print()
-    modldummy.summary()
-    """
-
-    # ------------------------------------------------------------------------------
-    z = keras.layers.concatenate([x, y])
-    z = Flatten()(z)
-    # ------------------------------------------------------------------------------
-
-    z = Dense(512, activation='relu')(z)
-    z = Dense(512, activation='relu')(z)
-    z = Dense(512, activation='relu')(z)
-    z = Dense(512, activation='relu')(z)
-
-    # ------------------------------------------------------------------------------
-    
-    finllayr = Dense(1, activation='sigmoid', name='finl')(z)
-
-    # ------------------------------------------------------------------------------
-    modlfinl = Model(inputs=[localinput, globalinput], outputs=[finllayr])
-
-    modlfinl.compile(loss='binary_crossentropy', optimizer='sgd', metrics=['accuracy'])
-    # modlfinl.summary()
-    return modlfinl
+    return modlspec.bild_modl(modlspec.retr_specexonet(paperloclinpt, papergloblinpt))
 
 def reduced():
-    loclinpt, globlinpt = 200, 2000 # hard coded for now
-    padX = 'same'
-    padY = 'same'
-
-    localinput = Input(shape=(int(loclinpt),1), dtype='float32', name='localinput') 
-
-    x = Conv1D(kernel_size=5, filters=16, padding=padX, activation='relu', input_shape=(loclinpt,1))(localinput)
-
-    x = MaxPooling1D(pool_size=2, strides=2, padding=padX)(x)
-
-    x = Conv1D(kernel_size=5, filters=16, padding=padX, activation='relu')(x)
-
-    x = GlobalMaxPool1D()(x)
-
-    # -----------------------------------------------------------------------------
-    globalinput = Input(shape=(int(globlinpt),1), dtype='float32', name='globalinput')
-
-    y = Conv1D(kernel_size=5, filters=16, padding=padY, activation='relu', input_shape=(globlinpt,1))(globalinput)
-
-    y = MaxPooling1D(pool_size=2, strides=2, padding=padY)(y)
-
-    y = Conv1D(kernel_size=5, filters=16, padding=padY, activation='relu')(y)
-
-    y = MaxPooling1D(pool_size=2, strides=2, padding=padY)(y)
-
-    y = Conv1D(kernel_size=5, filters=32, padding=padY, activation='relu')(y)
-
-    y = GlobalMaxPool1D()(y)
-
-
-    
-    # print('shape test:', tf.keras.backend.shape(y))
-    modldummy = Model(inputs=[localinput, globalinput], outputs=[y])
-    print()
-    modldummy.summary()
-
-    print()
-
-    # print('shape test:', tf.keras.backend.shape(x))
-    modldummy = Model(inputs=[localinput, globalinput], outputs=[x])
-    print()
-    modldummy.summary()
-    
-    # ------------------------------------------------------------------------------
-    z = keras.layers.concatenate([x, y])
-
     
-    # ------------------------------------------------------------------------------
-
-    z = Dense(1, activation='relu')(z)
-
-    # ------------------------------------------------------------------------------
-    finllayr = Dense(1, activation='sigmoid', name='finl')(z)
-
-    # ------------------------------------------------------------------------------
-    modlfinl = Model(inputs=[localinput, globalinput], outputs=[finllayr])
-
-    modlfinl.compile(loss='binary_crossentropy', optimizer='sgd', metrics=['accuracy'])
-
-    return modlfinl
+    return modlspec.bild_modl(modlspec.retr_specreduced(paperloclinpt, papergloblinpt))
 
 
 # these need to have the same name but path has ()
@@ -281,6 +154,7 @@ def gen_mockdata(datatype):
     'here' : mockdata generated in exopmain;
     'ete6' : data from ete6 (still pulled from exopmain);
     'tess' : data from TESS (pulled from exopmain);
+    'flbn' : nothing to do, the binned views are simulated directly in gen_binned;
 
     Saves the input data as a .npz file
     
@@ -330,6 +204,23 @@ def gen_binned(path_namer, datatype):
     Saves local, global, and output to three separate .dat files 
     """
 
+    # simulate the local and global views directly in phase space for datatype 'flbn'
+    # dept is the relative flux during the transit
+    if datatype == 'flbn':
+        phaslocl, phasglob, inptloclfold, inptglobfold, outp, dictpara = mockdata.retr_datamockflbn(numbplan=numbplan, numbnois=numbnois, \
+                                                        numbtime=numbtime, numbbinslocl=localtimebins, numbbinsglob=globaltimebins, \
+                                                        dictdist={'dept': ['fixd', 1. - dept], 'nois': ['fixd', nois]})
+        
+        np.savetxt(pathsavefoldLocl, inptloclfold)
+        np.savetxt(pathsavefoldGlob, inptglobfold)
+        np.savetxt(pathsavefoldoutp, outp)
+
+        print('Writing local folded to %s...' % pathsavefoldLocl)
+        print('Writing global folded to %s...' % pathsavefoldGlob)
+        print('Writing output to %s...' % pathsavefoldoutp)
+
+        return None
+
 
     # load data based on type
     if datatype == 'here':
@@ -4,7 +4,7 @@ from tqdm import tqdm, trange
 import numpy as np
 
 from keras.models import Model, load_model
-from keras.callbacks import ModelCheckpoint, TensorBoard
+from keras.callbacks import TensorBoard
 
 import sklearn
 from sklearn.metrics import confusion_matrix, roc_auc_score
@@ -26,6 +26,13 @@ from exop.main import retr_datamock, retr_datatess
 
 from models import exonet, reduced
 
+from predlog import callpredlog, read_predlog, retr_boolpredlog, retr_matrconf, retr_metrmatrconf, retr_auc
+
+from checstor import callchecstor, conv_h5fl, load_chec, retr_epoclast, compact_stor_back
+
+import mani
+import ingefits
+
 import pickle
 import re
 
@@ -61,9 +68,23 @@ modl = reduced
 
 overwrite = True
 
+# Boolean flag to rebuild the binned views even if the curves have not changed since they were last built (see mani)
+overwritebinn = False
+
+# Boolean flag to pull the curves from retr_datatess again even if the light-curve files have not changed since they were cached
+overwritedata = False
+
 l1_param = 0.1
 l2_param = 0.1
 
+# checkpoint retention
+## number of checkpoints with the best validation accuracy to keep
+numbchecbest = 3
+## keep every n-th epoch
+numbchecpernd = 10
+## number of latest checkpoints to keep
+numbcheclast = 1
+
 loclsize = 200
 globsize = 2000
 # -----------------------------------------------------------------------------------
@@ -74,6 +95,9 @@ globsize = 2000
 points_thresh = 100
 thresh = np.linspace(0.2, 0.9, points_thresh)
 
+# log the per-epoch scores of the training data samples in addition to those of the test data samples
+boolpredlogtran = False
+
 
 # -----------------------------------------------------------------------------------
 
@@ -104,58 +128,134 @@ def takeClosest(myList, myNumber):
     else:
        return before
 
+def retr_binncurv(flux, phas, loclinptbins=loclsize, globinptbins=globsize):
+    """
+    Returns the local and global views of a folded curve and their phases
+    """
+
+    # assert((phas == np.sort(phas)).all())
+
+    newZero = takeClosest(phas,0)
+    midpoint = np.where(phas == newZero)[0][0]
+
+    indices = range(int(midpoint-loclinptbins/2),int(midpoint+loclinptbins/2))
+
+    # POTENTIALLY DEALING WITH UNBINNED LIGHT CURVES
+
+    inptlocl = flux.take(indices)
+    inptglob = flux[::int(len(flux)/globinptbins)][:globinptbins]
+
+    xlocl = phas.take(indices)
+    xglob = phas[::int(len(flux)/globinptbins)][:globinptbins]
+
+    return inptlocl, inptglob, xlocl, xglob
+
+
 # locl and glob binning
 def gen_binned(fluxes, phases, loclinptbins=loclsize, globinptbins=globsize, save=True):
     
     pathsave = os.environ['EXOP_DATA_PATH'] + '/tess/locl_v_glob.pickle'
 
+    # the binned views are keyed by the content hashes of their curves and the binning in the manifest, so that only the views of
+    # the new or changed curves are rebuilt and merged with those of the existing artifact
+    pathmani = os.environ['EXOP_DATA_PATH'] + '/tess/mani.json'
+    dictmani = mani.read_mani(pathmani)
+    listhashcurv = [mani.retr_hasharry([fluxes[k], phases[k], loclinptbins, globinptbins]) for k in range(len(fluxes))]
+    hashinpt = mani.retr_hasharry([np.array(listhashcurv)])
+
 
     numbdata = len(fluxes)
 
 
-    if not os.path.exists(pathsave) or overwrite:
+    if not mani.retr_boolartfcurr(dictmani, pathsave, hashinpt) or overwritebinn:
+        # rows of the views of the existing artifact, indexed by the content hashes of their curves
+        dictindxprev = {}
+        if not overwritebinn and pathsave in dictmani['artf'] and 'listhashcurv' in dictmani['artf'][pathsave] and \
+                                                                        mani.retr_boolstatcurr(dictmani['artf'][pathsave], pathsave):
+            objtfile = open(pathsave, 'rb')
+            print ('Reading from %s...' % pathsave)
+            listdataprev = pickle.load(objtfile)
+            objtfile.close()
+            for k, hashcurv in enumerate(dictmani['artf'][pathsave]['listhashcurv']):
+                dictindxprev[hashcurv] = k
+
         # holder np arrays
         inptloclfold = np.empty((numbdata, loclinptbins))
         inptglobfold = np.empty((numbdata, globinptbins))
         
         xfoldlocl = np.empty((numbdata, loclinptbins))
         xfoldglob = np.empty((numbdata, globinptbins))
+        listdata = [inptloclfold, inptglobfold, xfoldlocl, xfoldglob]
+
+        indxcurvnews = [k for k in range(numbdata) if not listhashcurv[k] in dictindxprev]
+        indxcurvprev = [k for k in range(numbdata) if listhashcurv[k] in dictindxprev]
+        if len(indxcurvprev) > 0:
+            indxrowsprev = [dictindxprev[listhashcurv[k]] for k in indxcurvprev]
+            for data, dataprev in zip(listdata, listdataprev):
+                data[indxcurvprev, :] = dataprev[indxrowsprev, :]
 
         # let our runner know what is happening :)
-        print("\nGenerating binned")
+        print("\nGenerating binned views of %d new or changed curves, reusing %d" % (len(indxcurvnews), len(indxcurvprev)))
 
 
-        # for each curve in the inpt space
-        for k in trange(numbdata):
+        # for each new or changed curve in the inpt space
+        for k in tqdm(indxcurvnews):
             
-            # assert((phases[k] == np.sort(phases[k])).all())
-            
-            newZero = takeClosest(phases[k],0)
-            midpoint = np.where(phases[k] == newZero)[0][0]
-            
-            indices = range(int(midpoint-loclinptbins/2),int(midpoint+loclinptbins/2))
+            listbinn = retr_binncurv(fluxes[k], phases[k], loclinptbins, globinptbins)
+            for data, binn in zip(listdata, listbinn):
+                data[k,:] = binn
 
-            # POTENTIALLY DEALING WITH UNBINNED LIGHT CURVES
+        print ('Writing to %s...' % pathsave)
+        objtfile = open(pathsave, 'wb')
+        pickle.dump(listdata, objtfile, protocol=pickle.HIGHEST_PROTOCOL)
+        objtfile.close()
 
-            inptloclfold[k,:] = fluxes[k].take(indices)
-            # print(fluxes[k][::int(fluxes[k]/globinptbins)][:globinptbins])
-            inptglobfold[k,:] = fluxes[k][::int(len(fluxes[k])/globinptbins)][:globinptbins]
+        mani.writ_artf(dictmani, pathsave, hashinpt)
+        dictmani['artf'][pathsave]['listhashcurv'] = listhashcurv
+        mani.writ_mani(pathmani, dictmani)
+
+
+    else:
+        objtfile = open(pathsave, 'rb')
+        print ('Reading from %s...' % pathsave)
+        listdata = pickle.load(objtfile)
+        objtfile.close()
 
-            xfoldlocl[k,:] = phases[k].take(indices)
-            xfoldglob[k,:] = phases[k][::int(len(fluxes[k])/globinptbins)][:globinptbins]
+    return listdata
 
-            if k < 10:
-                # print("Where values are NaNs:", np.where(np.isnan(fluxes[k].take(indices))))
-                pass
 
-        listdata = [inptloclfold, inptglobfold, xfoldlocl, xfoldglob]
+def retr_datatesscach():
+    """
+    Returns the folded curves, labels and legends of the TESS data set, which are pulled from retr_datatess and cached as an
+    artifact of the manifest for later runs
+
+    The cache is keyed by the light-curve files recorded in the manifest of the ingested store and by the quality bitmask. The
+    new and changed files are first ingested incrementally (see ingefits.inge_fitsincr), such that the curves are pulled again
+    when a new sector arrives, and gen_binned then bins only the new or changed curves.
+    """
+
+    pathdatafits = os.environ['EXOP_DATA_PATH'] + '/tess/fits/'
+    pathstor = os.environ['EXOP_DATA_PATH'] + '/tess/stor/'
+    if os.path.isdir(pathdatafits):
+        ingefits.inge_fitsincr(pathdatafits, pathstor)
+
+    pathsave = os.environ['EXOP_DATA_PATH'] + '/tess/datatess.pickle'
+    pathmani = os.environ['EXOP_DATA_PATH'] + '/tess/mani.json'
+    dictmani = mani.read_mani(pathmani)
+    hashinpt = mani.retr_hashmani(mani.read_mani(pathstor + mani.strgmani))
+
+    if not mani.retr_boolartfcurr(dictmani, pathsave, hashinpt) or overwritedata:
+        phases, fluxes, labels, legd, _, _ = retr_datatess(True, boolplot=False)
+        listdata = [phases, fluxes, labels, legd]
 
         print ('Writing to %s...' % pathsave)
         objtfile = open(pathsave, 'wb')
         pickle.dump(listdata, objtfile, protocol=pickle.HIGHEST_PROTOCOL)
         objtfile.close()
 
-
+        # the pickle is not hashed, since its modification is detected from its size and modification time
+        mani.writ_artf(dictmani, pathsave, hashinpt, boolhash=False)
+        mani.writ_mani(pathmani, dictmani)
     else:
         objtfile = open(pathsave, 'rb')
         print ('Reading from %s...' % pathsave)
@@ -246,15 +346,21 @@ def inpt_before_train(locl, glob, loclx, globx, legd, labl, num_graphs=10, save=
 
 
 
-def train_2inpt_model(model, epochs, locl, glob, labls, callbacks_list, init_epoch=0, disp=True):
-
+def train_2inpt_model(model, epochs, locl, glob, labls, callbacks_list, numbdatatest, init_epoch=0, disp=True):
+    """
+    Trains the model on all but the first numbdatatest data samples, which are the test data samples used for the validation
+    (and logged by callpredlog)
+    """
 
     inptL1 = locl[:,:,None]
     inptG1 = glob[:,:,None]
     outp1 = labls
 
+    inpttest = [inptL1[:numbdatatest], inptG1[:numbdatatest]]
+    inpttran = [inptL1[numbdatatest:], inptG1[numbdatatest:]]
 
-    hist = model.fit([inptL1, inptG1], outp1, epochs=epochs, validation_split=fractest, verbose=1, callbacks=callbacks_list, initial_epoch=init_epoch)
+    hist = model.fit(inpttran, outp1[numbdatatest:], epochs=epochs, validation_data=(inpttest, outp1[:numbdatatest]), verbose=1, \
+                                                                                    callbacks=callbacks_list, initial_epoch=init_epoch)
     
     if disp:
         print(hist.history)
@@ -268,31 +374,21 @@ def train_2inpt_model(model, epochs, locl, glob, labls, callbacks_list, init_epo
 # also include the [EXOP_] path here!!!
 pathsavematr = os.environ['EXOP_DATA_PATH'] + '/tess/matr/' + '{}'.format(str(modl.__name__)) + '.pickle'
 
+# folder of the per-epoch prediction log
+pathpredlog = os.environ['EXOP_DATA_PATH'] + '/tess/predlog/' + '{}/'.format(str(modl.__name__))
 
 
-def matr_2inpt(model, locl, glob, labls, modl):
-    
-
-    if not os.path.exists(pathsavematr) or overwrite:
-        #implement a lot of printing in this
-
-        numbdatatest = int(fractest * len(locl))
-
-
-        # separate the training from the testing
-        inpttestL = locl[:numbdatatest, :]
-        inpttranL = locl[numbdatatest:, :]
-
-        inpttestG = glob[:numbdatatest, :]
-        inpttranG = glob[numbdatatest:, :]
-
-        outptest = labls[:numbdatatest]
-        outptran = labls[numbdatatest:]
 
+def matr_2inpt(modl):
+    """
+    Calculates the metrics and confusion matrices for each epoch and threshold from the per-epoch prediction log
+    """
 
-        numbepoc = len(os.listdir(os.environ['EXOP_DATA_PATH']+'/tess/models/{}/'.format(str(modl.__name__))))
-        indxepoc = np.arange(numbepoc)
+    if not os.path.exists(pathsavematr) or overwrite:
 
+        # the number of epochs is the number of logged epochs
+        epoc, scortest, labltest = read_predlog(pathpredlog, 'test')
+        numbepoc = epoc.size
 
         # initialize the matrix holding all metric values
         # INDEX 1: which epoch
@@ -308,79 +404,17 @@ def matr_2inpt(model, locl, glob, labls, modl):
         # INDEX 4: train [0] test [1]
         conf_matr_vals = np.zeros((numbepoc, len(thresh), 4, 2))
 
+        conf_matr_vals[:, :, :, 1] = retr_matrconf(scortest, labltest, thresh)
+        
+        if retr_boolpredlog(pathpredlog, 'tran'):
+            epoctran, scortran, labltran = read_predlog(pathpredlog, 'tran')
+            if np.array_equal(epoctran, epoc):
+                conf_matr_vals[:, :, :, 0] = retr_matrconf(scortran, labltran, thresh)
+                metr[:, :, :, 0] = retr_metrmatrconf(conf_matr_vals[:, :, :, 0])
+        
+        metr[:, :, :, 1] = retr_metrmatrconf(conf_matr_vals[:, :, :, 1])
 
-        for epoc in tqdm(indxepoc):
-
-            # train and then test 
-            for i in range(2):
-                # i == 0 -> train
-                # i == 1 -> test
-
-                if i == 0:
-                    inptL = inpttranL
-                    inptG = inpttranG
-                    outp = outptran
-                    
-                    inptL = inptL[:, :, None]
-                    inptG = inptG[:, :, None]
-
-                    
-
-                    
-                else:
-                    inptL = inpttestL
-                    inptG = inpttestG
-                    outp = outptest
-                    
-                    inptL = inptL[:, :, None]
-                    inptG = inptG[:, :, None]
-
-                    
-
-
-                    # only now, within the testing parameters, we test against a range of threshold values
-                    for threshold in range(len(thresh)):
-
-                        outppred = (model.predict([inptL, inptG]) > thresh[threshold]).astype(int)
-
-                        matrconf = confusion_matrix(outp, outppred)
-
-                        if matrconf.size == 1:
-                            matrconftemp = np.copy(matrconf)
-                            matrconf = np.empty((2,2))
-                            matrconf[0,0] = matrconftemp
-
-                        if threshold == len(thresh) or threshold == 0 or threshold == len(thresh)/2:
-                            print('\nMatrconf: ', matrconf)
-
-                        trne = matrconf[0,0]
-                        flpo = matrconf[0,1]
-                        flne = matrconf[1,0]
-                        trpo = matrconf[1,1]
-                        
-                        # update conf matrix holder
-                        conf_matr_vals[epoc, threshold, 0, i] = trne
-                        conf_matr_vals[epoc, threshold, 1, i] = flpo
-                        conf_matr_vals[epoc, threshold, 2, i] = flne
-                        conf_matr_vals[epoc, threshold, 3, i] = trpo
-
-
-                        # update metr with only viable data (test for positive values)
-                        if float(trpo + flpo) > 0:
-                            metr[epoc, threshold, 0, i] = trpo / float(trpo + flpo) # precision
-                        else:
-                            pass
-
-                        if float(trpo+flpo+trne) != 0:
-                            metr[epoc, threshold, 1, i] = float(trpo + trne)/(trpo + flpo + trne) # accuracy
-                        else:
-                            pass
-
-                        if float(trpo + flne) > 0:
-                            metr[epoc, threshold, 2, i] = trpo / float(trpo + flne) # recall
-                        else:
-                            pass 
-
+        print('\nMatrconf at the middle threshold of the last epoch: ', conf_matr_vals[-1, int(len(thresh) / 2), :, 1])
 
         listdata = [metr, conf_matr_vals]
 
@@ -405,33 +439,20 @@ def matr_2inpt(model, locl, glob, labls, modl):
 
 
 # graphs prec vs recal 
-def graph_PvR(model, locl, glob, labl, metr, modl):
-
-
-    numbdatatest = int(fractest * len(locl))
+def graph_PvR(metr, modl):
 
     # TEMP: ONLY USING THE TEST DATA
-    inptL = locl[:numbdatatest,:,None]
-    inptG = glob[:numbdatatest,:,None]
-    outp = labl
-
-    y_pred = model.predict([inptL, inptG])
-    print('model predict: ', y_pred)
-    y_real = outp[:numbdatatest]
-    print('real vals: ', y_real)
-    try:
-        auc = roc_auc_score(y_real, y_pred)
-    except:
-        print('y_pred is bad :(')
-        auc = 0.
+    # AUC of the last logged epoch
+    epoc, scortest, labltest = read_predlog(pathpredlog, 'test')
+    auc = retr_auc(scortest[-1, :], labltest)[0]
 
     textbox = r'$\mathrm{AUC}=%.8f$' % (auc, )
-        """'\n'.join((
-        # r'$\mathrm{Signal:Noise}=%.2f$' % (dept/nois, ),
-        # r'$\mathrm{Gaussian Standard Deviation}=%.2f$' % (auc, ),
-        'Properties',
-        r'$\mathrm{AUC}=%.8f$' % (auc, ))) # ,
-        # r'$\mathrm{Depth}=%.4f$' % (dept, )))"""
+    """'\n'.join((
+    # r'$\mathrm{Signal:Noise}=%.2f$' % (dept/nois, ),
+    # r'$\mathrm{Gaussian Standard Deviation}=%.2f$' % (auc, ),
+    'Properties',
+    r'$\mathrm{AUC}=%.8f$' % (auc, ))) # ,
+    # r'$\mathrm{Depth}=%.4f$' % (dept, )))"""
     
 
 
@@ -439,7 +460,7 @@ def graph_PvR(model, locl, glob, labl, metr, modl):
     fig, axis = plt.subplots(constrained_layout=True, figsize=(12,6))
 
 
-    numbepoc = len(os.listdir(os.environ['EXOP_DATA_PATH'] + 'tess/models/{}/'.format(str(modl.__name__))))
+    numbepoc = metr.shape[0]
     indxepoc = np.arange(numbepoc)
 
 
@@ -496,12 +517,12 @@ def graph_PvR(model, locl, glob, labl, metr, modl):
 # -----------------------------------------------------------------------------------
 
 
-def graph_conf(model, locl, glob, labl, conf):
+def graph_conf(conf):
 
 
     fig, axis = plt.subplots(2, 2, constrained_layout=True, figsize=(12,6))
 
-    numbepoc = len(os.listdir(os.environ['EXOP_DATA_PATH'] + '/tess/models/{}/'.format(str(modl.__name__))))
+    numbepoc = conf.shape[0]
     indxepoc = np.arange(numbepoc)
 
     print("Graphing inpt based on conf_matr") 
@@ -559,7 +580,7 @@ def main(run=True, graph=True):
     
     # data pull
 
-    phases, fluxes, labels, legd, _, _ = retr_datatess(True, boolplot=False)
+    phases, fluxes, labels, legd = retr_datatesscach()
 
     # local and global
     loclF, globF, loclPhas, globPhas = gen_binned(fluxes, phases)
@@ -580,55 +601,64 @@ def main(run=True, graph=True):
     if not os.path.exists(os.environ['EXOP_DATA_PATH'] + '/tess/plot/PvR/'):
         os.makedirs(os.environ['EXOP_DATA_PATH'] + '/tess/plot/PvR/')
 
-    # load the most previous weights from last training (could make this its own function)
-    try:
-        weights_list = [weights for weights in os.listdir(os.environ['EXOP_DATA_PATH'] + '/tess/models/{}/'.format(modl.__name__))]
-    
+    pathchec = os.environ['EXOP_DATA_PATH'] + '/tess/models/{}/'.format(modl.__name__)
 
-        if len(weights_list) > 0:
-            last_epoch = max(weights_list)
-        else:
-            last_epoch = 0
-    
-    except:
-        weights_list = []
-        last_epoch = 0
+    # convert full HDF5 models left by earlier runs into weight-only checkpoints
+    conv_h5fl(pathchec)
 
     prevMax = 0
 
     # initialize model
     model = modl(loclsize, globsize, l1_param, l2_param)
     
-    # something here does not work, won't load prev model correctly :(
-    try:
-        model.load_weights(os.environ['EXOP_DATA_PATH'] + '/tess/models/{}/'.format(modl.__name__) + last_epoch)
+    # load the most previous weights from last training
+    last_epoch = retr_epoclast(pathchec)
+    if last_epoch is not None:
+        load_chec(pathchec, epoc=last_epoch, modl=model)
         print("Loading previous model's weights")
-
-        
-        regex = re.compile(r'\d+')
-        prevMax = int(regex.findall(last_epoch)[0])
-
-    except:
+        prevMax = last_epoch + 1
+    else:
         print("Fresh, new model")
 
-    modlpath = os.environ['EXOP_DATA_PATH'] + 'tess/models/{}/'.format(str(modl.__name__)) + '-{epoch:03d}' + '.h5'
-    checkpoint = ModelCheckpoint(modlpath, monitor='val_acc', verbose=1, save_best_only=False, save_weights_only=False, mode='max')
+    checkpoint = callchecstor(pathchec, monitor='val_acc', strgmode='max', numbbest=numbchecbest, numbpernd=numbchecpernd, numblast=numbcheclast)
     tens_board = TensorBoard(log_dir='logs/{}/{}'.format(modl.__name__,time.time()))
     callbacks_list = [checkpoint, tens_board]  
 
     if run:
+        # log the scores of each epoch so that the metrics can later be calculated without the model
+        # the first numbdatatest data samples are the test data samples of both the log and the training
+        numbdatatest = int(fractest * len(loclF))
+        if boolpredlogtran:
+            inptpredtran = [loclF[numbdatatest:, :, None], globF[numbdatatest:, :, None]]
+            lablpredtran = labels[numbdatatest:]
+        else:
+            inptpredtran = None
+            lablpredtran = None
+        predlog = callpredlog(pathpredlog, [loclF[:numbdatatest, :, None], globF[:numbdatatest, :, None]], labels[:numbdatatest], \
+                                                            inpttran=inptpredtran, labltran=lablpredtran, boolover=(prevMax == 0))
+        callbacks_list.append(predlog)
+
         # need a conditional to check the shape of the model -- if two-input: use this function
-        train_2inpt_model(model, numbepoc, loclF, globF, labels, callbacks_list, init_epoch=prevMax)
+        train_2inpt_model(model, numbepoc, loclF, globF, labels, callbacks_list, numbdatatest, init_epoch=prevMax)
+
+        # compact the checkpoint stores of all models in the background while the metrics are calculated and plotted
+        objtproc = compact_stor_back(os.environ['EXOP_DATA_PATH'] + '/tess/models/', numbbest=numbchecbest, numbpernd=numbchecpernd, \
+                                                                                                        numblast=numbcheclast)
+    else:
+        objtproc = None
 
     if graph:
          # sample relevance graphs
         inpt_before_train(loclF, globF, loclPhas, globPhas, legd, labels, save=False)
     
-    metr, conf = matr_2inpt(model, loclF, globF, labels, modl)
+    metr, conf = matr_2inpt(modl)
 
     if graph:
-        graph_conf(model, loclF, globF, labels, conf)
-        graph_PvR(model, loclF, globF, labels, metr, modl)
+        graph_conf(conf)
+        graph_PvR(metr, modl)
+
+    if objtproc is not None:
+        objtproc.join()
 
 
 if __name__ == "__main__":
@@ -671,7 +701,6 @@ MODEL:
     l1 l2
 
     allow different model input sizes
-"""
-=======
+
 NO MORE SAVE WEIGHTS --> SAVE MODEL WHOLE (WE ARE LOSING METADATA)
 """
@@ -3,6 +3,8 @@ from keras.models import Sequential
 from keras.layers import Dense, Dropout, Conv1D
 import tensorflow as tf
 
+import modlspec
+
 """
 Want:
     Give locl/global
@@ -49,10 +51,20 @@ def con1(modl, numbdimslayr, numbtime, fracdrop=0, strgLayr='init', activation='
 
 
 def parallel(datalocl, numblayrlocl, locllayr, loclfracdrop, dataglbl, numblayrglob, glbllayr, glblfracdrop, numblayrmerg):
+    """
+    Returns a fully-connected model with parallel local and global branches, merged by numblayrmerg layers
+
+    datalocl, dataglbl: local and global input data, whose second axes give the sizes of the inputs
+    locllayr, glbllayr: number of dimensions of the layers of the branches
+    """
 
-    locl = Sequential()
-    glbl = Sequential()
+    spec = {}
+    spec['listbran'] = [ \
+                        {'strg': 'localinput', 'shap': [int(datalocl.shape[1])], \
+                                                'listlayr': modlspec.retr_listlayrdens(numblayrlocl, locllayr, fracdrop=loclfracdrop)}, \
+                        {'strg': 'globalinput', 'shap': [int(dataglbl.shape[1])], \
+                                                'listlayr': modlspec.retr_listlayrdens(numblayrglob, glbllayr, fracdrop=glblfracdrop)}, \
+                       ]
+    spec['listlayrhead'] = modlspec.retr_listlayrdens(numblayrmerg, max(locllayr, glbllayr)) + [modlspec.retr_layrfinl()]
 
-    if numblocllayr > 2:
-        for k in range(numblocllayr - 2):
-            gdat.appdfcon(fracdrop, strglayr='medi')
\ No newline at end of file
+    return modlspec.retr_modl(spec)